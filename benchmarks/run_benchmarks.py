@@ -0,0 +1,262 @@
+import argparse
+import concurrent.futures
+import datetime
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import AlgorumQuantClient.algorum_types
+import gapup_quant_strategy
+import golden_crossover_quant_strategy
+import index_futures_trend_quant_strategy
+import local_backtest_engine
+import local_indicator_evaluator
+import rsi_quant_strategy
+import support_resistance_quant_strategy
+import synthetic_market
+import trend_reversal_quant_strategy
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+START_DATE = datetime.date(2021, 3, 1)
+
+
+# LocalIndicatorEvaluator plus deterministic stand-ins for trend and support_resistance, which only the remote
+# evaluator computes. They are recomputed once per completed candle and give the strategies signals to act on.
+class StubIndicatorEvaluator(local_indicator_evaluator.LocalIndicatorEvaluator):
+    def __init__(self, create_indicator_request, candle_loader=None):
+        super(StubIndicatorEvaluator, self).__init__(create_indicator_request, candle_loader)
+        self.CandleCount = 0
+        self.Cache = {}
+
+    def complete(self, candle):
+        super(StubIndicatorEvaluator, self).complete(candle)
+        self.CandleCount += 1
+
+    def last_closes(self, count: int):
+        return list(itertools.islice(reversed(self.Closes), count))[::-1]
+
+    def cached(self, key, compute):
+        cached = self.Cache.get(key)
+
+        if cached is None or cached[0] != self.CandleCount:
+            cached = (self.CandleCount, compute())
+            self.Cache[key] = cached
+
+        return cached[1]
+
+    # (direction, strength): 1 up or 2 down over the last `period` candles, strength is the net count of moves
+    def trend(self, period: float):
+        def compute():
+            closes = self.last_closes(int(period) + 1)
+
+            if len(closes) <= period:
+                return 0, 0
+
+            net = sum(1 if b > a else (-1 if b < a else 0) for a, b in zip(closes, closes[1:]))
+            return (1 if closes[-1] >= closes[0] else 2), abs(net)
+
+        return self.cached(('TREND', period), compute)
+
+    # (support, support score, resistance, resistance score) from the low and high close of the last `period` candles
+    def support_resistance(self, period: float, level: float, backtrack_candles: float):
+        def compute():
+            closes = self.last_closes(int(period))
+
+            if len(closes) < period:
+                return 0.0, 0, 0.0, 0
+
+            support = min(closes)
+            resistance = max(closes)
+            support_score = sum(1 for close in closes if close <= support * 1.002)
+            resistance_score = sum(1 for close in closes if close >= resistance * 0.998)
+            return support, support_score, resistance, resistance_score
+
+        return self.cached(('SR', period, level, backtrack_candles), compute)
+
+
+def stock_ticks(scenario, days, seed):
+    symbol = AlgorumQuantClient.algorum_types.TradeSymbol(AlgorumQuantClient.algorum_types.SymbolType.Stock,
+                                                          'TATAMOTORS')
+    return synthetic_market.SyntheticMarket(scenario, 400.0, seed=seed).ticks(symbol, START_DATE, days)
+
+
+# Same symbols as IndexFuturesTrendQuantStrategy subscribes to. The strategy compares the last tick of either symbol
+# with the fill price of its order, so both follow the same path to keep a basis from triggering every exit.
+def index_futures_ticks(scenario, days, seed):
+    index_symbol = AlgorumQuantClient.algorum_types.TradeSymbol(
+        AlgorumQuantClient.algorum_types.SymbolType.OptionsStock,
+        'NIFTY 50',
+        AlgorumQuantClient.algorum_types.FNOPeriodType.Monthly,
+        0, 0,
+        AlgorumQuantClient.algorum_types.OptionType.Unspecified,
+        0, 0)
+    futures_symbol = AlgorumQuantClient.algorum_types.TradeSymbol(
+        AlgorumQuantClient.algorum_types.SymbolType.FuturesIndex,
+        'NIFTY',
+        AlgorumQuantClient.algorum_types.FNOPeriodType.Monthly,
+        0, 0,
+        AlgorumQuantClient.algorum_types.OptionType.Unspecified,
+        0, 0)
+
+    return synthetic_market.merge_ticks(
+        synthetic_market.SyntheticMarket(scenario, 15000.0, seed=seed).ticks(index_symbol, START_DATE, days),
+        synthetic_market.SyntheticMarket(scenario, 15000.0, seed=seed).ticks(futures_symbol, START_DATE, days))
+
+
+BENCHMARKS = {
+    'golden_crossover': (golden_crossover_quant_strategy.GoldenCrossoverQuantStrategy,
+                         synthetic_market.MarketScenario.Trend, stock_ticks),
+    'trend_reversal': (trend_reversal_quant_strategy.TrendReversalQuantStrategy,
+                       synthetic_market.MarketScenario.Trend, stock_ticks),
+    'support_resistance': (support_resistance_quant_strategy.SupportResistanceQuantStrategy,
+                           synthetic_market.MarketScenario.SupportBounce, stock_ticks),
+    'rsi': (rsi_quant_strategy.RSIQuantStrategy,
+            synthetic_market.MarketScenario.RsiDip, stock_ticks),
+    'gapup': (gapup_quant_strategy.GapUpQuantStrategy,
+              synthetic_market.MarketScenario.GapUp, stock_ticks),
+    'index_futures_trend': (index_futures_trend_quant_strategy.IndexFuturesTrendQuantStrategy,
+                            synthetic_market.MarketScenario.Trend, index_futures_ticks)
+}
+
+
+# Runs one benchmark, in a process of its own so that peak memory figures are not shared between strategies. The
+# first replay is timed; the second one runs under tracemalloc, which slows it down too much to time.
+def run_benchmark(name: str, days: int, seed: int):
+    (strategy_class, scenario, tick_source) = BENCHMARKS[name]
+    ticks = tick_source(scenario, days, seed)
+    market = synthetic_market.SyntheticMarket(scenario, ticks[0].LTP, seed=seed + 1)
+
+    def evaluator_factory(create_indicator_request):
+        return StubIndicatorEvaluator(create_indicator_request, market.candle_loader)
+
+    engine = local_backtest_engine.LocalBacktestEngine(strategy_class, ticks, evaluator_factory)
+    timed = engine.run()
+
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    traced = engine.run()
+    blocks_after = sys.getallocatedblocks()
+    (traced_current, traced_peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    peak_rss = None
+
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak_rss = peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+    return {
+        'Name': name,
+        'Strategy': strategy_class.__name__,
+        'Scenario': scenario,
+        'Ticks': timed.TickCount,
+        'Orders': len(timed.Orders),
+        'PL': timed.Stats['PL'] if timed.Stats is not None else None,
+        'Seconds': timed.ElapsedSeconds,
+        'TicksPerSecond': timed.TickCount / timed.ElapsedSeconds,
+        # Heap blocks and traced bytes still allocated after the replay, per tick: growth that is never released
+        'RetainedBlocksPerTick': (blocks_after - blocks_before) / traced.TickCount,
+        'RetainedBytesPerTick': traced_current / traced.TickCount,
+        'PeakTracedBytes': traced_peak,
+        'PeakRssBytes': peak_rss
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+# Percent change against a baseline result file for the figures where a change means a regression
+def compare(results, baseline):
+    baseline_results = {result['Name']: result for result in baseline['Results']}
+    changes = {}
+
+    for result in results:
+        previous = baseline_results.get(result['Name'])
+
+        if previous is None:
+            continue
+
+        changes[result['Name']] = {
+            key: (result[key] - previous[key]) * 100.0 / previous[key]
+            for key in ('TicksPerSecond', 'RetainedBytesPerTick', 'PeakTracedBytes')
+            if previous.get(key) and result.get(key) is not None
+        }
+
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replays synthetic ticks through the sample strategies')
+    parser.add_argument('--days', type=int, default=10, help='trading sessions of ticks per benchmark')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--only', nargs='*', choices=sorted(BENCHMARKS), help='benchmarks to run (default all)')
+    parser.add_argument('--output', default='-', help='JSON result file, - for stdout')
+    parser.add_argument('--baseline', help='earlier JSON result file to compare against')
+    parser.add_argument('--tolerance', type=float, default=10.0,
+                        help='exit with status 1 when ticks/sec drops or peak memory grows by more than this percent')
+    args = parser.parse_args()
+
+    results = []
+
+    for name in args.only or list(BENCHMARKS):
+        # A fresh process per benchmark, started with spawn so that it does not inherit the parent heap
+        with concurrent.futures.ProcessPoolExecutor(
+                1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            result = executor.submit(run_benchmark, name, args.days, args.seed).result()
+
+        results.append(result)
+        print('%-20s %8d ticks %12.0f ticks/s %8.2f blocks/tick %10.0f peak KB' % (
+            name, result['Ticks'], result['TicksPerSecond'], result['RetainedBlocksPerTick'],
+            result['PeakTracedBytes'] / 1024.0), file=sys.stderr)
+
+    report = {
+        'Commit': git_commit(),
+        'Python': platform.python_version(),
+        'Platform': platform.platform(),
+        'Timestamp': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'Days': args.days,
+        'Seed': args.seed,
+        'Results': results
+    }
+
+    regressed = False
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            report['Changes'] = compare(results, json.load(f))
+
+        for name, changes in report['Changes'].items():
+            if changes.get('TicksPerSecond', 0.0) < -args.tolerance or \
+                    changes.get('PeakTracedBytes', 0.0) > args.tolerance:
+                print('Regression in ' + name + ': ' + json.dumps(changes), file=sys.stderr)
+                regressed = True
+
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
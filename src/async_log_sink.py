@@ -0,0 +1,150 @@
+import queue
+import threading
+import time
+import traceback
+
+import AlgorumQuantClient.algorum_types
+
+_STOP = object()
+
+
+# Takes log records off the tick thread. log() only queues the level, the format string and its arguments; a
+# background worker applies the % formatting, prints the records (when echo is on) and ships them to the engine,
+# joining consecutive records of the same level into a single client.log call. A batch is sent once batch_size records
+# are waiting or flush_interval seconds after its first record.
+#
+# The queue holds at most max_records records. When it is full a record is dropped, unless block_when_full is set, and
+# the number of dropped records is reported with the next batch. A record with level None is printed but not sent,
+# which replaces the print-only lines of the strategies. flush() waits until everything queued so far has been
+# shipped; close() flushes and stops the worker. ship_inline() flushes and then ships every later record on the
+# calling thread, for the last records of a backtest, which have to reach the engine before the client closes the
+# connection.
+class AsyncLogSink(object):
+    def __init__(self, client, echo: bool = True, max_records: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 0.25, block_when_full: bool = False):
+        self.Client = client
+        self.Echo = echo
+        self.BatchSize = batch_size
+        self.FlushInterval = flush_interval
+        self.BlockWhenFull = block_when_full
+        self.Queue = queue.Queue(max_records)
+        self.Dropped = 0
+        self.DroppedLock = threading.Lock()
+        self.Inline = False
+        self.Closed = False
+        self.Worker = threading.Thread(target=self.run, name='async-log-sink', daemon=True)
+        self.Worker.start()
+
+    def log(self, log_level, message: str, *args):
+        if self.Closed:
+            return
+
+        if self.Inline:
+            self.ship_safely([(log_level, message, args)])
+            return
+
+        if self.BlockWhenFull:
+            self.Queue.put((log_level, message, args))
+            return
+
+        try:
+            self.Queue.put_nowait((log_level, message, args))
+        except queue.Full:
+            with self.DroppedLock:
+                self.Dropped += 1
+
+    def info(self, message: str, *args):
+        self.log(AlgorumQuantClient.algorum_types.LogLevel.Information, message, *args)
+
+    def echo(self, message: str, *args):
+        self.log(None, message, *args)
+
+    def flush(self):
+        if self.Worker.is_alive():
+            self.Queue.join()
+
+    def ship_inline(self):
+        self.flush()
+        self.Inline = True
+
+    def close(self):
+        if self.Closed:
+            return
+
+        self.Closed = True
+        self.Queue.put(_STOP)
+        self.Worker.join()
+
+    def run(self):
+        while True:
+            records = [self.Queue.get()]
+            deadline = time.monotonic() + self.FlushInterval
+
+            while len(records) < self.BatchSize and records[-1] is not _STOP:
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    break
+
+                try:
+                    records.append(self.Queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self.ship_safely(records)
+
+            for _ in records:
+                self.Queue.task_done()
+
+            if records[-1] is _STOP:
+                return
+
+    def ship_safely(self, records):
+        try:
+            self.ship(records)
+        except Exception:
+            print(traceback.format_exc())
+
+    def ship(self, records):
+        echo_lines = []
+        batch_level = None
+        batch_lines = []
+
+        with self.DroppedLock:
+            dropped = self.Dropped
+            self.Dropped = 0
+
+        if dropped > 0:
+            records = [(AlgorumQuantClient.algorum_types.LogLevel.Warning,
+                        'Log queue full, dropped %s log records', (dropped,))] + records
+
+        for record in records:
+            if record is _STOP:
+                continue
+
+            (log_level, message, args) = record
+
+            if args:
+                try:
+                    message = message % args
+                except Exception:
+                    message = message + ' ' + repr(args)
+
+            if self.Echo:
+                echo_lines.append(message)
+
+            if log_level is None:
+                continue
+
+            if log_level != batch_level and len(batch_lines) > 0:
+                self.Client.log(batch_level, '\n'.join(batch_lines))
+                batch_lines = []
+
+            batch_level = log_level
+            batch_lines.append(message)
+
+        if len(batch_lines) > 0:
+            self.Client.log(batch_level, '\n'.join(batch_lines))
+
+        if len(echo_lines) > 0:
+            print('\n'.join(echo_lines))
@@ -0,0 +1,79 @@
+import datetime
+
+import AlgorumQuantClient.algorum_types
+import candle_aggregator
+
+
+class BarSchedule(object):
+    def __init__(self, timeframe: candle_aggregator.Timeframe, callback):
+        self.Timeframe = timeframe
+        self.Callback = callback
+        self.Start = None
+        self.End = None
+
+
+class TimerSchedule(object):
+    def __init__(self, interval: float, callback):
+        self.Interval = interval
+        self.Callback = callback
+        self.Due = None
+
+
+# Runs callbacks on tick time rather than on every tick, so it behaves the same in backtesting (where tick time runs
+# far ahead of the wall clock) and in live trading:
+#
+#     on_bar(candle_period, period_span, callback)   callback(tick_data, bar_start) on the first tick of every bar,
+#                                                    bar_start being the epoch of the bar that just closed (None on
+#                                                    the first tick seen)
+#     on_timer(interval, callback)                   callback(tick_data) on the first tick and then on the first tick
+#                                                    at least interval seconds after the previous call
+#
+# Bars are those of candle_aggregator.Timeframe, so a bar closes on the same tick as the candle of an indicator
+# evaluator with that candle period, and the evaluator already holds the closed candle when the callback runs. Bar
+# callbacks run before timer callbacks. update() compares the tick epoch with the earliest due time and does nothing
+# else until a tick reaches it; ticks older than the last one due never run anything.
+class BarScheduler(object):
+    def __init__(self, session_open: datetime.time = candle_aggregator.SESSION_OPEN):
+        self.SessionOpen = session_open
+        self.Bars = []
+        self.Timers = []
+        self.NextDue = -1
+
+    def on_bar(self, candle_period: str, period_span: int, callback) -> BarSchedule:
+        bar = BarSchedule(candle_aggregator.Timeframe(candle_period, period_span, self.SessionOpen, 0), callback)
+        self.Bars.append(bar)
+        self.NextDue = -1
+        return bar
+
+    def on_timer(self, interval: float, callback) -> TimerSchedule:
+        timer = TimerSchedule(interval, callback)
+        self.Timers.append(timer)
+        self.NextDue = -1
+        return timer
+
+    def update(self, tick_data: AlgorumQuantClient.algorum_types.TickData):
+        epoch = tick_data.Epoch
+
+        if epoch >= self.NextDue:
+            self.run(tick_data, epoch)
+
+    def run(self, tick_data: AlgorumQuantClient.algorum_types.TickData, epoch: int):
+        next_due = float('inf')
+
+        for bar in self.Bars:
+            if bar.End is None or epoch >= bar.End:
+                closed = bar.Start
+                bar.Start = bar.Timeframe.candle_start(epoch)
+                bar.End = bar.Start + bar.Timeframe.CandleSeconds
+                bar.Callback(tick_data, closed)
+
+            next_due = min(next_due, bar.End)
+
+        for timer in self.Timers:
+            if timer.Due is None or epoch >= timer.Due:
+                timer.Due = epoch + timer.Interval
+                timer.Callback(tick_data)
+
+            next_due = min(next_due, timer.Due)
+
+        self.NextDue = next_due
@@ -0,0 +1,130 @@
+import collections
+import datetime
+
+import AlgorumQuantClient.algorum_types
+import session_calendar
+import tick_timestamp
+
+CANDLE_SECONDS = {
+    AlgorumQuantClient.algorum_types.CandlePeriod.Second: 1,
+    AlgorumQuantClient.algorum_types.CandlePeriod.Minute: 60,
+    AlgorumQuantClient.algorum_types.CandlePeriod.Day: tick_timestamp.SECONDS_PER_DAY
+}
+
+# Intraday candles are counted from the session open
+SESSION_OPEN = session_calendar.SESSION_OPEN
+SESSION_CLOSE = session_calendar.SESSION_CLOSE
+SESSION_SECONDS = session_calendar.SESSION_SECONDS
+
+
+class Candle(object):
+    def __init__(self, bucket, open_price, high, low, close, volume=0.0):
+        self.Bucket = bucket
+        self.Open = open_price
+        self.High = high
+        self.Low = low
+        self.Close = close
+        self.Volume = volume
+
+
+# Candles of one CandlePeriod and PeriodSpan. Intraday candles start at the session open of their day and every
+# candle_seconds after it, and never reach into the next session: a tick from a later day always starts a new candle,
+# even when the last candle of the previous session was cut short by the close. Day candles cover period_span calendar
+# days. A candle's Bucket is the epoch of its start, and it completes (listeners are called, History is appended) when
+# the first tick of a later candle arrives; late ticks are folded into the current candle.
+class Timeframe(object):
+    def __init__(self, candle_period: str, period_span: int = 1, session_open: datetime.time = SESSION_OPEN,
+                 history: int = 1000):
+        self.CandlePeriod = candle_period
+        self.PeriodSpan = period_span
+        self.CandleSeconds = CANDLE_SECONDS[candle_period] * period_span
+        self.Daily = candle_period == AlgorumQuantClient.algorum_types.CandlePeriod.Day
+        self.SessionOpen = session_calendar.time_seconds(session_open)
+        self.History = collections.deque(maxlen=history)
+        self.Listeners = []
+        self.Current = None
+        self.Previous = None
+
+    def candle_start(self, epoch: int) -> int:
+        if self.Daily:
+            return epoch - epoch % self.CandleSeconds
+
+        session_open = epoch - epoch % tick_timestamp.SECONDS_PER_DAY + self.SessionOpen
+        return session_open + (epoch - session_open) // self.CandleSeconds * self.CandleSeconds
+
+    def add(self, epoch: int, price: float, volume: float = 0.0):
+        candle = self.Current
+
+        if candle is not None and epoch < candle.Bucket + self.CandleSeconds:
+            if price > candle.High:
+                candle.High = price
+            elif price < candle.Low:
+                candle.Low = price
+
+            candle.Close = price
+            candle.Volume += volume
+            return
+
+        if candle is not None:
+            self.complete(candle)
+
+        self.Current = Candle(self.candle_start(epoch), price, price, price, price, volume)
+
+    def complete(self, candle: Candle):
+        self.Previous = candle
+        self.History.append(candle)
+
+        for listener in self.Listeners:
+            listener(candle)
+
+    def reset(self):
+        self.History.clear()
+        self.Current = None
+        self.Previous = None
+
+
+# Builds the candles of any number of timeframes from the ticks of one symbol in a single pass, with constant work per
+# tick and timeframe:
+#
+#     aggregator = CandleAggregator()
+#     minute = aggregator.add_timeframe(CandlePeriod.Minute, 1)
+#     aggregator.add_timeframe(CandlePeriod.Minute, 5, on_five_minute_candle)
+#     daily = aggregator.add_timeframe(CandlePeriod.Day, 1)
+#     ...
+#     aggregator.add_tick(tick_data)
+#
+# Asking for a timeframe that already exists returns it (with the listener added), so several consumers share one.
+# A timeframe added mid-stream starts with the next tick.
+class CandleAggregator(object):
+    def __init__(self, session_open: datetime.time = SESSION_OPEN):
+        self.SessionOpen = session_open
+        self.Timeframes = {}
+        self.TimeframeList = []
+
+    def add_timeframe(self, candle_period: str, period_span: int = 1, listener=None, history: int = 1000):
+        timeframe = self.Timeframes.get((candle_period, period_span))
+
+        if timeframe is None:
+            timeframe = Timeframe(candle_period, period_span, self.SessionOpen, history)
+            self.Timeframes[(candle_period, period_span)] = timeframe
+            self.TimeframeList.append(timeframe)
+
+        if listener is not None:
+            timeframe.Listeners.append(listener)
+
+        return timeframe
+
+    def timeframe(self, candle_period: str, period_span: int = 1) -> Timeframe:
+        return self.Timeframes.get((candle_period, period_span))
+
+    def add_tick(self, tick_data: AlgorumQuantClient.algorum_types.TickData):
+        epoch = tick_timestamp.stamp(tick_data).Epoch
+        price = tick_data.LTP
+        volume = tick_data.LTQ or 0.0
+
+        for timeframe in self.TimeframeList:
+            timeframe.add(epoch, price, volume)
+
+    def reset(self):
+        for timeframe in self.TimeframeList:
+            timeframe.reset()
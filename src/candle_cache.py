@@ -0,0 +1,246 @@
+import datetime
+import os
+import re
+import tempfile
+import threading
+
+import numpy
+
+import candle_aggregator
+import tick_timestamp
+
+# Columns of a cached candle row
+EPOCH, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+
+
+def symbol_key(symbol) -> str:
+    parts = [getattr(symbol, 'SymbolType', None), symbol.Ticker, getattr(symbol, 'FNOPeriodType', None),
+             getattr(symbol, 'FNOMonth', None), getattr(symbol, 'FNOWeek', None), getattr(symbol, 'OptionType', None),
+             getattr(symbol, 'OptionValue', None)]
+    return re.sub(r'[^A-Za-z0-9.-]+', '_', '-'.join(str(part) for part in parts if part is not None))
+
+
+# Persistent candle store for preloading indicator evaluators, shared by every backtest that points at the same
+# directory. Candles are kept per symbol, candle period and session day in <directory>/<symbol>/<period>-<span>/
+# <YYYY-MM-DD>.npy as rows of (epoch, open, high, low, close, volume), and a day is complete once written: later
+# requests for it never go back to the fetcher. Days with no candles (holidays) are stored empty. Weekends are skipped
+# and days from today on are fetched but not stored, as they can still change.
+#
+# Missing days of a request are merged into runs of consecutive session days and every run is fetched with one call
+# to fetcher(symbol, candle_period, period_span, start, end), which returns (epoch, open, high, low, close, volume)
+# rows for start <= time < end. Files are written to a temporary name and renamed, so parallel backtests share the
+# cache safely (at worst fetching a day twice). Reading a day marks it as recently used; once the cache holds more
+# than max_bytes the least recently used days are deleted until it is back under 90% of it.
+#
+# A CandleCache is a candle_loader for LocalIndicatorEvaluator: load() takes the same arguments and returns the last
+# candle_count (open, high, low, close) candles before preload_end_time.
+class CandleCache(object):
+    MaxLookbackDays = 730
+
+    def __init__(self, fetcher, directory: str = None, max_bytes: int = 256 * 1024 * 1024):
+        if directory is None:
+            directory = os.path.join(os.path.expanduser('~'), '.cache', 'algorum', 'candles')
+
+        self.Fetcher = fetcher
+        self.Directory = directory
+        self.MaxBytes = max_bytes
+        self.Size = None
+        self.Hits = 0
+        self.Misses = 0
+        self.Fetches = 0
+        self.Lock = threading.Lock()
+
+    # Passed to the worker processes of parallel backtests, each of which gets its own lock
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['Lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.Lock = threading.Lock()
+
+    def day_path(self, symbol, candle_period: str, period_span: int, day: datetime.date) -> str:
+        return os.path.join(self.Directory, symbol_key(symbol), '%s-%d' % (candle_period, period_span),
+                            day.isoformat() + '.npy')
+
+    def read(self, path: str):
+        try:
+            rows = numpy.load(path)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return rows
+
+    def write(self, path: str, rows: numpy.ndarray):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        (fd, temp_path) = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                numpy.save(f, rows)
+
+            # Rewriting a cached range replaces the old file, so only the growth counts towards the cache size
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+            raise
+
+        with self.Lock:
+            if self.Size is None:
+                self.Size = self.scan_size()
+            else:
+                self.Size += os.path.getsize(path) - previous_size
+
+            if self.Size > self.MaxBytes:
+                self.evict()
+
+    def files(self):
+        for root, dirs, names in os.walk(self.Directory):
+            for name in names:
+                if name.endswith('.npy'):
+                    yield os.path.join(root, name)
+
+    def scan_size(self) -> int:
+        size = 0
+
+        for path in self.files():
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+
+        return size
+
+    def evict(self):
+        entries = []
+
+        for path in self.files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        size = sum(entry[1] for entry in entries)
+        target = self.MaxBytes * 0.9
+
+        for (mtime, file_size, path) in entries:
+            if size <= target:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+            size -= file_size
+
+        self.Size = size
+
+    # Candle rows of session days start.date() to end.date(), restricted to start <= time < end
+    def candles(self, symbol, candle_period: str, period_span: int, start: datetime.datetime,
+                end: datetime.datetime) -> numpy.ndarray:
+        days = []
+        day = start.date()
+
+        while day <= end.date():
+            if day.weekday() < 5:
+                days.append(day)
+
+            day += datetime.timedelta(days=1)
+
+        by_day = {}
+        missing = []
+
+        for day in days:
+            rows = self.read(self.day_path(symbol, candle_period, period_span, day))
+
+            if rows is None:
+                missing.append(day)
+                self.Misses += 1
+            else:
+                by_day[day] = rows
+                self.Hits += 1
+
+        for run in self.runs(missing):
+            by_day.update(self.fetch(symbol, candle_period, period_span, run))
+
+        parts = [by_day[day] for day in days if len(by_day.get(day, ())) > 0]
+
+        if len(parts) == 0:
+            return numpy.zeros((0, 6))
+
+        rows = numpy.concatenate(parts)
+        epochs = rows[:, EPOCH]
+        return rows[(epochs >= tick_timestamp.to_epoch(start)) & (epochs < tick_timestamp.to_epoch(end))]
+
+    # Splits days into runs of consecutive session days
+    @staticmethod
+    def runs(days):
+        run = []
+
+        for day in days:
+            if len(run) > 0 and (day - run[-1]).days > (3 if run[-1].weekday() == 4 else 1):
+                yield run
+                run = []
+
+            run.append(day)
+
+        if len(run) > 0:
+            yield run
+
+    def fetch(self, symbol, candle_period: str, period_span: int, days):
+        start = datetime.datetime.combine(days[0], datetime.time())
+        end = datetime.datetime.combine(days[-1] + datetime.timedelta(days=1), datetime.time())
+        rows = numpy.array(list(self.Fetcher(symbol, candle_period, period_span, start, end)),
+                           dtype=numpy.float64).reshape(-1, 6)
+        self.Fetches += 1
+
+        day_index = (rows[:, EPOCH] // tick_timestamp.SECONDS_PER_DAY).astype(numpy.int64)
+        today = datetime.date.today()
+        by_day = {}
+
+        for day in days:
+            ordinal = tick_timestamp.to_epoch(datetime.datetime.combine(day, datetime.time())) // \
+                tick_timestamp.SECONDS_PER_DAY
+            day_rows = rows[day_index == ordinal]
+            by_day[day] = day_rows
+
+            if day < today:
+                self.write(self.day_path(symbol, candle_period, period_span, day), day_rows)
+
+        return by_day
+
+    # candle_loader interface of LocalIndicatorEvaluator
+    def load(self, symbol, candle_period: str, period_span: int, candle_count: int,
+             preload_end_time: datetime.datetime):
+        candle_seconds = candle_aggregator.CANDLE_SECONDS[candle_period] * period_span
+        candles_per_day = max(1, candle_aggregator.SESSION_SECONDS // candle_seconds)
+        lookback_days = (candle_count // candles_per_day + 1) * 7 // 5 + 3
+
+        while True:
+            start = datetime.datetime.combine(preload_end_time.date() - datetime.timedelta(days=lookback_days),
+                                              datetime.time())
+            rows = self.candles(symbol, candle_period, period_span, start, preload_end_time)
+
+            if len(rows) >= candle_count or lookback_days >= self.MaxLookbackDays:
+                break
+
+            lookback_days = min(lookback_days * 2, self.MaxLookbackDays)
+
+        return [tuple(row) for row in rows[-candle_count:, OPEN:VOLUME].tolist()] if candle_count > 0 else []
+
+    def __call__(self, symbol, candle_period: str, period_span: int, candle_count: int,
+                 preload_end_time: datetime.datetime):
+        return self.load(symbol, candle_period, period_span, candle_count, preload_end_time)
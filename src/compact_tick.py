@@ -0,0 +1,116 @@
+import datetime
+import sys
+import threading
+
+import AlgorumQuantClient.algorum_types
+import tick_timestamp
+
+
+# Interns symbols by ticker into small integer ids, the way SymbolUniverse keys its slots. The first symbol object seen
+# for a ticker is the one handed back for the id. Ids are only valid within the process; persisted ticks carry the
+# ticker instead.
+class SymbolTable(object):
+    def __init__(self):
+        self.Ids = {}
+        self.Symbols = []
+        self.Lock = threading.Lock()
+
+    def intern(self, symbol) -> int:
+        symbol_id = self.Ids.get(symbol.Ticker)
+
+        if symbol_id is None:
+            with self.Lock:
+                symbol_id = self.Ids.get(symbol.Ticker)
+
+                if symbol_id is None:
+                    symbol_id = len(self.Symbols)
+                    self.Symbols.append(symbol)
+                    self.Ids[sys.intern(symbol.Ticker)] = symbol_id
+
+        return symbol_id
+
+    # Id of a ticker read back from persisted state; a ticker not seen in this process gets a bare symbol
+    def intern_ticker(self, ticker: str) -> int:
+        symbol_id = self.Ids.get(ticker)
+
+        if symbol_id is None:
+            symbol_id = self.intern(AlgorumQuantClient.algorum_types.TradeSymbol(Ticker=ticker))
+
+        return symbol_id
+
+    def symbol(self, symbol_id: int):
+        return self.Symbols[symbol_id]
+
+    def ticker(self, symbol_id: int) -> str:
+        return self.Symbols[symbol_id].Ticker
+
+
+SYMBOLS = SymbolTable()
+
+
+# Fixed-size tick record for the tick fields of a strategy State (CurrentTick, IdxCurrentTick, ...). It keeps the epoch
+# seconds, prices and the interned symbol id instead of the dict-backed TickData with its timestamp strings, datetime
+# objects and per-tick symbol. Symbol, Timestamp, Date, DateTime and TickDate are derived on access, so callers that
+# read those attributes work unchanged, and to_tick_data() builds a full TickData when one is needed.
+class CompactTick(object):
+    __slots__ = ('SymbolId', 'Epoch', 'LTP', 'LTQ', 'Bid', 'Ask', 'OpenInterest', 'LastTick')
+
+    def __init__(self, symbol_id: int, epoch: int, ltp: float, ltq: float = 0.0, bid: float = 0.0, ask: float = 0.0,
+                 open_interest: float = 0.0, last_tick: bool = False):
+        self.SymbolId = symbol_id
+        self.Epoch = epoch
+        self.LTP = ltp
+        self.LTQ = ltq
+        self.Bid = bid
+        self.Ask = ask
+        self.OpenInterest = open_interest
+        self.LastTick = last_tick
+
+    @staticmethod
+    def from_tick(tick_data):
+        if isinstance(tick_data, CompactTick) or tick_data is None:
+            return tick_data
+
+        tick_timestamp.stamp(tick_data)
+        return CompactTick(SYMBOLS.intern(tick_data.Symbol), tick_data.Epoch, tick_data.LTP, tick_data.LTQ,
+                           tick_data.Bid, tick_data.Ask, tick_data.OpenInterest, tick_data.LastTick)
+
+    @property
+    def Symbol(self):
+        return SYMBOLS.symbol(self.SymbolId)
+
+    @property
+    def DateTime(self) -> datetime.datetime:
+        return tick_timestamp.from_epoch(self.Epoch)
+
+    @property
+    def TickDate(self) -> datetime.date:
+        return self.DateTime.date()
+
+    @property
+    def Timestamp(self) -> str:
+        return self.DateTime.strftime('%Y-%m-%dT%H:%M:%S')
+
+    @property
+    def Date(self) -> str:
+        return self.DateTime.strftime('%Y-%m-%d')
+
+    def to_tick_data(self) -> AlgorumQuantClient.algorum_types.TickData:
+        tick_data = AlgorumQuantClient.algorum_types.TickData(
+            self.Symbol, self.Date, self.Timestamp, self.LTP, self.LTQ, self.Bid, self.Ask, self.LastTick,
+            self.OpenInterest)
+        tick_data.Epoch = self.Epoch
+        tick_data.DateTime = self.DateTime
+        tick_data.TickDate = tick_data.DateTime.date()
+        return tick_data
+
+    def __getstate__(self):
+        return (SYMBOLS.ticker(self.SymbolId), self.Epoch, self.LTP, self.LTQ, self.Bid, self.Ask, self.OpenInterest,
+                self.LastTick)
+
+    def __setstate__(self, state):
+        (ticker, self.Epoch, self.LTP, self.LTQ, self.Bid, self.Ask, self.OpenInterest, self.LastTick) = state
+        self.SymbolId = SYMBOLS.intern_ticker(ticker)
+
+    def __repr__(self):
+        return 'CompactTick(%s, %s, %s)' % (SYMBOLS.ticker(self.SymbolId), self.Timestamp, self.LTP)
@@ -1,128 +1,174 @@
 import datetime
-import threading
+import functools
+import time
 import traceback
 import uuid
 
 import AlgorumQuantClient.quant_client
 import AlgorumQuantClient.algorum_types
-import jsonpickle
+import async_log_sink
+import bar_scheduler
+import compact_tick
+import latency_histogram
+import order_store
+import progress_reporter
+import risk_engine
+import session_calendar
+import state_journal
+import strategy_event_loop
+import symbol_universe
+import tick_timestamp
 
 
 class GapUpQuantStrategy(AlgorumQuantClient.quant_client.QuantEngineClient):
     Capital = 100000
     Leverage = 1  # 1x Leverage on Capital
+    GapUpPercent = 0.50
+    TakeProfitPercent = 0.25
+    StopLossPercent = 0.25
+    Tickers = ['TATAMOTORS']
 
     class State(object):
         def __init__(self):
             self.Bought = False
-            self.LastTick = None
             self.CurrentTick = None
-            self.Orders = []
+            self.Orders = order_store.OrderStore()
             self.CurrentOrderId = None
             self.CurrentOrder = None
             self.CrossBelowObj = None
             self.DayChanged = False
 
-    def __init__(self, url, apikey, launchmode, sid, user_id, trace_ws=False):
+    def __init__(self, url, apikey, launchmode, sid, user_id, trace_ws=False, tickers=None):
         try:
             # Pass constructor arguments to base class
             super(GapUpQuantStrategy, self).__init__(url, apikey, launchmode, sid, user_id, trace_ws)
 
-            # Load any saved state
-            state_json_str = self.get_data("state")
+            # Log records are formatted and shipped to the engine off the tick thread
+            self.LogSink = async_log_sink.AsyncLogSink(self)
 
-            if state_json_str is not None:
-                self.State = jsonpickle.decode(state_json_str)
+            # Backtest progress is published at a coarse cadence rather than on every tick
+            self.Progress = progress_reporter.ProgressReporter(self)
 
-            if self.State is None or launchmode == AlgorumQuantClient.algorum_types.StrategyLaunchMode.Backtesting:
-                self.State = GapUpQuantStrategy.State()
-                self.State.Orders = []
-                self.State.CrossBelowObj = AlgorumQuantClient.algorum_types.CrossBelow()
-                self.State.DayChanged = False
+            # Per-stage tick-to-order and order update latencies, see latency_histogram
+            self.Latency = latency_histogram.LatencyRecorder(type(self).__name__ + ' ' + sid)
 
-            self.StateLock = threading.RLock()
+            # Pre-trade limits, shared with the other live strategies of this process
+            self.Risk = risk_engine.for_client(self)
+
+            # on_tick and on_order_update run one at a time on the worker of the event loop, which is the
+            # only writer of the state
+            self.Events = strategy_event_loop.StrategyEventLoop(self)
 
             # Subscribe for our symbol data
             # For India users
-            self.symbol = AlgorumQuantClient.algorum_types.TradeSymbol(
-                AlgorumQuantClient.algorum_types.SymbolType.Stock,
-                'TATAMOTORS')
+            if tickers is None:
+                tickers = self.Tickers
 
             # For USA users
-            # self.symbol = AlgorumQuantClient.algorum_types.TradeSymbol(
-            #     AlgorumQuantClient.algorum_types.SymbolType.Stock,
-            #     'SPY')
+            # tickers = ['SPY']
 
-            symbols = [self.symbol]
+            symbols = [AlgorumQuantClient.algorum_types.TradeSymbol(
+                AlgorumQuantClient.algorum_types.SymbolType.Stock,
+                ticker) for ticker in tickers]
             self.subscribe_symbols(symbols)
 
-            # Create indicator evaluator, which will be automatically synchronized with the real time or backtesting
-            # data that is streaming into this algo
-            self.evaluator = self.create_indicator_evaluator(
-                AlgorumQuantClient.algorum_types.CreateIndicatorRequest(
-                    self.symbol,
-                    AlgorumQuantClient.algorum_types.CandlePeriod.Day,
-                    1))
+            # Session times and holidays, classifying every tick with a single comparison
+            self.Calendar = session_calendar.for_client(self)
+
+            # Every symbol gets its own state slot, indicator evaluator and session clock
+            self.Universe = symbol_universe.SymbolUniverse()
+
+            for symbol in symbols:
+                # Load any saved state
+                journal = state_journal.StateJournal(self, symbol_universe.state_key(symbol.Ticker, len(symbols)))
+                state = journal.load()
+
+                if state is None or launchmode == AlgorumQuantClient.algorum_types.StrategyLaunchMode.Backtesting:
+                    state = GapUpQuantStrategy.State()
+                    state.Orders = order_store.OrderStore()
+                    state.CrossBelowObj = AlgorumQuantClient.algorum_types.CrossBelow()
+                    state.DayChanged = False
+
+                # Create indicator evaluator, which will be automatically synchronized with the real time or
+                # backtesting data that is streaming into this algo
+                evaluator = self.create_indicator_evaluator(
+                    AlgorumQuantClient.algorum_types.CreateIndicatorRequest(
+                        symbol,
+                        AlgorumQuantClient.algorum_types.CandlePeriod.Day,
+                        1))
+
+                clock = self.Calendar.clock()
+
+                if state.CurrentTick is not None:
+                    clock.resume(state.CurrentTick.Epoch)
+
+                slot = symbol_universe.SymbolSlot(symbol, state, evaluator, journal, clock,
+                                                  bar_scheduler.BarScheduler())
+                slot.Scheduler.on_timer(60, functools.partial(self.log_status, slot))
+                clock.on_day_change(functools.partial(self.on_day_change, slot))
+                self.Universe.add(slot)
+
+            # The first symbol stays reachable through the single symbol attributes
+            self.symbol = self.Universe.Primary.Symbol
+            self.State = self.Universe.Primary.State
+            self.StateJournal = self.Universe.Primary.StateJournal
+            self.evaluator = self.Universe.Primary.Evaluator
         except Exception:
-            print(traceback.format_exc())
+            # Left for run_strategy, which fails the run rather than trade a strategy that never started
+            self.InitError = traceback.format_exc()
+            print(self.InitError)
             self.log(AlgorumQuantClient.algorum_types.LogLevel.Error, traceback.format_exc())
 
     # This method is called on each tick for the subscribed symbols
     def on_tick(self, tick_data):
         try:
-            prev_tick = self.State.CurrentTick
-            self.State.CurrentTick = tick_data
-
-            day_changed = False
-
-            if prev_tick is not None:
-                tick_day = datetime.datetime.strptime(tick_data.Timestamp,
-                                                      AlgorumQuantClient.quant_client.QuantEngineClient.get_date_format(
-                                                          tick_data.Timestamp)).day
-                prev_tick_day = datetime.datetime.strptime(prev_tick.Timestamp,
-                                                           AlgorumQuantClient.quant_client.QuantEngineClient.get_date_format(
-                                                               prev_tick.Timestamp)).day
-                day_changed = tick_day > prev_tick_day
-
-            if prev_tick is None or \
-                    (not self.State.DayChanged and day_changed and not self.State.Bought):
-                self.State.DayChanged = True
-
-            yesterday_high = self.Evaluator.prev_high()
-            yesterday_low = self.Evaluator.prev_low()
-            yesterday_close = self.Evaluator.prev_close()
-            today_open = self.Evaluator.open()
-
-            if self.State.LastTick is not None and (
-                    datetime.datetime.strptime(tick_data.Timestamp,
-                                               AlgorumQuantClient.quant_client.QuantEngineClient.get_date_format(
-                                                   tick_data.Timestamp)) -
-                    datetime.datetime.strptime(self.State.LastTick.Timestamp,
-                                               AlgorumQuantClient.quant_client.QuantEngineClient.get_date_format(
-                                                   self.State.LastTick.Timestamp))).total_seconds() < 60:
-                pass
-            else:
-                msg = str(tick_data.Timestamp) + ',' + str(tick_data.LTP) + \
-                      ', yh ' + str(yesterday_high) + ', yl ' + str(yesterday_low) + \
-                      ', yc ' + str(yesterday_close) + ', to ' + str(today_open)
-                print(msg)
-                self.log(AlgorumQuantClient.algorum_types.LogLevel.Information, msg)
-                self.State.LastTick = tick_data
-
-            if 0 < yesterday_high <= today_open and yesterday_close > 0 and \
-                    today_open >= (yesterday_close + (yesterday_close * 0.50 / 100)) and \
-                    self.State.DayChanged and \
-                    not self.State.Bought and \
-                    self.State.CurrentOrderId is None:
-
-                self.State.DayChanged = False
-                self.State.CurrentOrderId = uuid.uuid4().hex
+            tick_started = time.perf_counter_ns()
+            tick_timestamp.stamp(tick_data)
+            stage_started = self.Latency.lap('tick.parse', tick_started)
+
+            slot = self.Universe.get(tick_data.Symbol.Ticker)
+
+            if slot is None:
+                return
+
+            state = slot.State
+
+            state.CurrentTick = compact_tick.CompactTick.from_tick(tick_data)
+            slot.Clock.update(tick_data)
+
+            yesterday_high = slot.Evaluator.prev_high()
+            yesterday_low = slot.Evaluator.prev_low()
+            yesterday_close = slot.Evaluator.prev_close()
+            today_open = slot.Evaluator.open()
+
+            stage_started = self.Latency.lap('tick.indicators', stage_started)
+
+            slot.Scheduler.update(tick_data)
+
+            entry_signal = 0 < yesterday_high <= today_open and yesterday_close > 0 and \
+                    today_open >= (yesterday_close + (yesterday_close * self.GapUpPercent / 100)) and \
+                    state.DayChanged and \
+                    not state.Bought and \
+                    state.CurrentOrderId is None
+            exit_signal = not entry_signal and state.CurrentOrder is not None and \
+                    ((tick_data.LTP - state.CurrentOrder.AveragePrice >= (
+                            state.CurrentOrder.AveragePrice * (self.StopLossPercent / 100))) or
+                     (state.CurrentOrder.AveragePrice - tick_data.LTP >= (
+                             state.CurrentOrder.AveragePrice * (self.TakeProfitPercent / 100)))) and \
+                    state.Bought
+
+            stage_started = self.Latency.lap('tick.decision', stage_started)
+
+            if entry_signal:
+
+                state.DayChanged = False
+                state.CurrentOrderId = uuid.uuid4().hex
                 place_order_request = AlgorumQuantClient.algorum_types.PlaceOrderRequest()
                 place_order_request.OrderType = AlgorumQuantClient.algorum_types.OrderType.Market
                 place_order_request.Price = tick_data.LTP
                 place_order_request.Quantity = \
-                    (GapUpQuantStrategy.Capital / tick_data.LTP) * GapUpQuantStrategy.Leverage
-                place_order_request.Symbol = self.symbol
+                    (self.Capital / len(self.Universe) / tick_data.LTP) * self.Leverage
+                place_order_request.Symbol = slot.Symbol
                 place_order_request.Timestamp = tick_data.Timestamp
 
                 if self.LaunchMode == AlgorumQuantClient.algorum_types.StrategyLaunchMode.Backtesting:
@@ -131,100 +177,177 @@ class GapUpQuantStrategy(AlgorumQuantClient.quant_client.QuantEngineClient):
                     place_order_request.TradeExchange = AlgorumQuantClient.algorum_types.TradeExchange.NSE
 
                 place_order_request.OrderDirection = AlgorumQuantClient.algorum_types.OrderDirection.Sell
-                place_order_request.Tag = self.State.CurrentOrderId
+                place_order_request.Tag = state.CurrentOrderId
                 place_order_request.SlippageType = AlgorumQuantClient.algorum_types.SlippageType.TIME
                 place_order_request.Slippage = 1000
 
-                self.place_order(place_order_request)
-                self.set_data("state", self.State)
-
-                msg = 'Placed sell (short) order for ' + str(
-                    place_order_request.Quantity) + ' units of ' + self.symbol.Ticker + \
-                      ' at price (approx) ' + str(tick_data.LTP) + ', ' + str(tick_data.Timestamp)
-                print(msg)
-                self.log(AlgorumQuantClient.algorum_types.LogLevel.Information, msg)
-            else:
-                if self.State.CurrentOrder is not None and \
-                        ((tick_data.LTP - self.State.CurrentOrder.AveragePrice >= (
-                                self.State.CurrentOrder.AveragePrice * (0.25 / 100))) or
-                         (self.State.CurrentOrder.AveragePrice - tick_data.LTP >= (
-                                 self.State.CurrentOrder.AveragePrice * (0.25 / 100)))) and self.State.Bought:
-                    qty = self.State.CurrentOrder.FilledQuantity
-
-                    self.State.CurrentOrderId = uuid.uuid4().hex
-                    place_order_request = AlgorumQuantClient.algorum_types.PlaceOrderRequest()
-                    place_order_request.OrderType = AlgorumQuantClient.algorum_types.OrderType.Market
-                    place_order_request.Price = tick_data.LTP
-                    place_order_request.Quantity = qty
-                    place_order_request.Symbol = self.symbol
-                    place_order_request.Timestamp = tick_data.Timestamp
-
-                    if self.LaunchMode == AlgorumQuantClient.algorum_types.StrategyLaunchMode.Backtesting:
-                        place_order_request.TradeExchange = AlgorumQuantClient.algorum_types.TradeExchange.PAPER
-                    else:
-                        place_order_request.TradeExchange = AlgorumQuantClient.algorum_types.TradeExchange.NSE
+                stage_started = self.Latency.lap('order.build', stage_started)
+                rejection = self.Risk.check(place_order_request)
+                stage_started = self.Latency.lap('order.risk', stage_started)
+
+                if rejection is None:
+                    slot.OrderManager.track(place_order_request)
+
+                    try:
+                        self.place_order(place_order_request)
+                    except Exception:
+                        # The order never went out, so nothing will release what the checks reserved for it
+                        self.Risk.release(place_order_request.Tag)
+                        slot.OrderManager.discard(place_order_request.Tag)
+                        state.CurrentOrderId = None
+                        raise
+
+                    stage_started = self.Latency.lap('order.place', stage_started)
+                    self.Latency.record('tick.to_order', stage_started - tick_started)
+                    slot.StateJournal.save(state)
+                    stage_started = self.Latency.lap('order.persist', stage_started)
+
+                    self.LogSink.info('Placed sell (short) order for %s units of %s at price (approx) %s, %s',
+                                      place_order_request.Quantity, slot.Symbol.Ticker, tick_data.LTP,
+                                      tick_data.Timestamp)
+                else:
+                    state.CurrentOrderId = None
+                    self.LogSink.info('Risk check rejected %s order for %s units of %s: %s',
+                                      place_order_request.OrderDirection, place_order_request.Quantity,
+                                      slot.Symbol.Ticker, rejection)
+            elif exit_signal:
+                qty = abs(slot.OrderManager.position(slot.Symbol.Ticker))
+
+                state.CurrentOrderId = uuid.uuid4().hex
+                place_order_request = AlgorumQuantClient.algorum_types.PlaceOrderRequest()
+                place_order_request.OrderType = AlgorumQuantClient.algorum_types.OrderType.Market
+                place_order_request.Price = tick_data.LTP
+                place_order_request.Quantity = qty
+                place_order_request.Symbol = slot.Symbol
+                place_order_request.Timestamp = tick_data.Timestamp
+
+                if self.LaunchMode == AlgorumQuantClient.algorum_types.StrategyLaunchMode.Backtesting:
+                    place_order_request.TradeExchange = AlgorumQuantClient.algorum_types.TradeExchange.PAPER
+                else:
+                    place_order_request.TradeExchange = AlgorumQuantClient.algorum_types.TradeExchange.NSE
 
-                    place_order_request.TriggerPrice = tick_data.LTP
-                    place_order_request.OrderDirection = AlgorumQuantClient.algorum_types.OrderDirection.Buy
-                    place_order_request.Tag = self.State.CurrentOrderId
-                    place_order_request.SlippageType = AlgorumQuantClient.algorum_types.SlippageType.TIME
-                    place_order_request.Slippage = 1000
+                place_order_request.TriggerPrice = tick_data.LTP
+                place_order_request.OrderDirection = AlgorumQuantClient.algorum_types.OrderDirection.Buy
+                place_order_request.Tag = state.CurrentOrderId
+                place_order_request.SlippageType = AlgorumQuantClient.algorum_types.SlippageType.TIME
+                place_order_request.Slippage = 1000
 
-                    self.place_order(place_order_request)
-                    self.set_data("state", self.State)
+                stage_started = self.Latency.lap('order.build', stage_started)
+                rejection = self.Risk.check(place_order_request)
+                stage_started = self.Latency.lap('order.risk', stage_started)
+
+                if rejection is None:
+                    slot.OrderManager.track(place_order_request)
+
+                    try:
+                        self.place_order(place_order_request)
+                    except Exception:
+                        # The order never went out, so nothing will release what the checks reserved for it
+                        self.Risk.release(place_order_request.Tag)
+                        slot.OrderManager.discard(place_order_request.Tag)
+                        state.CurrentOrderId = None
+                        raise
+
+                    stage_started = self.Latency.lap('order.place', stage_started)
+                    self.Latency.record('tick.to_order', stage_started - tick_started)
+                    slot.StateJournal.save(state)
+                    stage_started = self.Latency.lap('order.persist', stage_started)
+
+                    self.LogSink.info('Placed buy (short) order for %s units of %s at price (approx) %s, %s', qty,
+                                      slot.Symbol.Ticker, tick_data.LTP, tick_data.Timestamp)
+                else:
+                    state.CurrentOrderId = None
+                    self.LogSink.info('Risk check rejected %s order for %s units of %s: %s',
+                                      place_order_request.OrderDirection, place_order_request.Quantity,
+                                      slot.Symbol.Ticker, rejection)
 
-                    msg = 'Placed buy (short) order for ' + str(qty) + ' units of ' + self.symbol.Ticker + \
-                          ' at price (approx) ' + str(tick_data.LTP) + ', ' + str(tick_data.Timestamp)
-                    print(msg)
-                    self.log(AlgorumQuantClient.algorum_types.LogLevel.Information, msg)
+            self.Latency.lap('tick.total', tick_started)
 
             if self.LaunchMode == AlgorumQuantClient.algorum_types.StrategyLaunchMode.Backtesting:
-                self.send_progress_async(tick_data)
+                self.Progress.update(tick_data)
         except Exception:
             self.log(AlgorumQuantClient.algorum_types.LogLevel.Error, traceback.format_exc())
 
     # This method is called on order updates, once the place_order method is called
     def on_order_update(self, order: AlgorumQuantClient.algorum_types.Order):
         try:
-            if order.Status == AlgorumQuantClient.algorum_types.OrderStatus.Completed:
-                self.StateLock.acquire()
-                self.State.Orders.append(order)
-                self.StateLock.release()
-
-                if order.OrderDirection == AlgorumQuantClient.algorum_types.OrderDirection.Sell:
-                    self.State.Bought = True
-                    self.State.CurrentOrder = order
-                    msg = 'Order Id ' + order.OrderId + ' Sold (short) ' + \
-                          str(order.FilledQuantity) + ' units of ' + order.Symbol.Ticker + ' at price ' + \
-                          str(order.AveragePrice)
-                    print(msg)
-                    self.log(AlgorumQuantClient.algorum_types.LogLevel.Information, msg)
+            update_started = time.perf_counter_ns()
+            self.Risk.on_order_update(order)
+            slot = self.Universe.get(order.Symbol.Ticker)
+
+            if slot is None:
+                return
+
+            state = slot.State
+            managed = slot.OrderManager.update(order)
+
+            if managed is None:
+                return
+
+            state.Orders.append(order)
+
+            if managed.Status in order_store.TERMINAL_STATUSES:
+
+                if managed.FilledQuantity > 0:
+                    if order.OrderDirection == AlgorumQuantClient.algorum_types.OrderDirection.Sell:
+                        state.CurrentOrder = order
+                        self.LogSink.info('Order Id %s Sold (short) %s units of %s at price %s', order.OrderId,
+                                          order.FilledQuantity, order.Symbol.Ticker, order.AveragePrice)
+                    else:
+                        self.LogSink.info('Order Id %s Bought (short) %s units of %s at price %s', order.OrderId,
+                                          order.FilledQuantity, order.Symbol.Ticker, order.AveragePrice)
+
+                    # A partly filled exit leaves the rest of the position open
+                    state.Bought = slot.OrderManager.position(order.Symbol.Ticker) < 0
+
+                    if not state.Bought:
+                        state.CurrentOrder = None
                 else:
-                    self.State.Bought = False
-                    self.State.CurrentOrder = None
-                    msg = 'Order Id ' + order.OrderId + ' Bought (short) ' + \
-                          str(order.FilledQuantity) + ' units of ' + order.Symbol.Ticker + ' at price ' + \
-                          str(order.AveragePrice)
-                    print(msg)
-                    self.log(AlgorumQuantClient.algorum_types.LogLevel.Information, msg)
-
-                self.State.CurrentOrderId = None
-                stats = self.get_stats(self.State.CurrentTick)
+                    self.LogSink.info('Order Id %s for %s units of %s %s: %s', order.OrderId, order.Quantity,
+                                      order.Symbol.Ticker, order.Status, order.StatusMessage)
+
+                if order.Tag == state.CurrentOrderId:
+                    state.CurrentOrderId = None
+
+                stage_started = self.Latency.lap('update.state', update_started)
+                stats = self.get_stats(state.CurrentTick)
+                stage_started = self.Latency.lap('update.stats', stage_started)
                 self.publish_stats(stats)
+                self.Latency.lap('update.publish', stage_started)
 
                 for k, v in stats.items():
-                    print('Key: ' + str(k) + ', Value: ' + str(v))
+                    self.LogSink.echo('Key: %s, Value: %s', k, v)
+            elif managed.LastFill > 0:
+                self.LogSink.info('Order Id %s filled %s of %s units of %s at price %s', order.OrderId,
+                                  managed.FilledQuantity, managed.Quantity, order.Symbol.Ticker, order.AveragePrice)
 
-            self.set_data("state", self.State)
+            slot.StateJournal.save(state)
+            self.Latency.lap('update.total', update_started)
         except Exception:
             self.log(AlgorumQuantClient.algorum_types.LogLevel.Error, traceback.format_exc())
 
+    # Called by the session clock of a slot with the first tick of every day
+    def on_day_change(self, slot, tick_data, session, previous):
+        state = slot.State
+
+        if previous is None or (not state.DayChanged and not state.Bought):
+            state.DayChanged = True
+
+    # Status line of a slot, once a minute of tick time
+    def log_status(self, slot, tick_data):
+        evaluator = slot.Evaluator
+        self.LogSink.info('%s,%s, yh %s, yl %s, yc %s, to %s', tick_data.Timestamp, tick_data.LTP,
+                          evaluator.prev_high(), evaluator.prev_low(), evaluator.prev_close(), evaluator.open())
+
     def backtest(self, backtest_request: AlgorumQuantClient.algorum_types.BacktestRequest):
+        self.Calendar.precompute(backtest_request.StartDate, backtest_request.EndDate)
+
         try:
             # Preload candles for this strategy
-            self.evaluator.preload_candles(3, backtest_request.StartDate - datetime.timedelta(days=1),
-                                           backtest_request.ApiKey,
-                                           backtest_request.ApiSecretKey)
+            for slot in self.Universe:
+                slot.Evaluator.preload_candles(3, backtest_request.StartDate - datetime.timedelta(days=1),
+                                               backtest_request.ApiKey,
+                                               backtest_request.ApiSecretKey)
 
             AlgorumQuantClient.quant_client.QuantEngineClient.backtest(self, backtest_request)
         except AlgorumQuantClient.algorum_types.AlgorumException as ex:
@@ -235,36 +358,28 @@ class GapUpQuantStrategy(AlgorumQuantClient.quant_client.QuantEngineClient):
         stats_map = None
 
         try:
-            stats_map = {"Capital": GapUpQuantStrategy.Capital, "Order Count": len(self.State.Orders)}
-
-            buy_val = 0.0
-            sell_val = 0.0
-            buy_qty = 0.0
-            sell_qty = 0.0
-
-            for order in self.State.Orders:
-                if (order.Status == AlgorumQuantClient.algorum_types.OrderStatus.Completed) and \
-                        (order.OrderDirection == AlgorumQuantClient.algorum_types.OrderDirection.Buy) and \
-                        order.Symbol.Ticker == tick_date.Symbol.Ticker:
-                    buy_val += order.FilledQuantity * order.AveragePrice
-                    buy_qty += order.FilledQuantity
-
-                if (order.Status == AlgorumQuantClient.algorum_types.OrderStatus.Completed) and \
-                        (order.OrderDirection == AlgorumQuantClient.algorum_types.OrderDirection.Sell) and \
-                        order.Symbol.Ticker == tick_date.Symbol.Ticker:
-                    sell_val += order.FilledQuantity * order.AveragePrice
-                    sell_qty += order.FilledQuantity
-
-            if buy_qty < sell_qty:
-                buy_val += (sell_qty - buy_qty) * tick_date.LTP
-
-            pl = sell_val - buy_val
+            stats_map = {"Capital": self.Capital, "Order Count": 0, "Unfilled Orders": 0}
+            pl = 0.0
+
+            for slot in self.Universe:
+                (filled, unfilled) = slot.OrderManager.order_counts(slot.Symbol.Ticker)
+                stats_map["Order Count"] += filled
+                stats_map["Unfilled Orders"] += unfilled
+
+                if slot.Symbol.Ticker == tick_date.Symbol.Ticker:
+                    ltp = tick_date.LTP
+                elif slot.State.CurrentTick is not None:
+                    ltp = slot.State.CurrentTick.LTP
+                else:
+                    ltp = 0.0
+
+                pl += slot.OrderManager.profit(slot.Symbol.Ticker, ltp)
+
             stats_map['PL'] = pl
-            stats_map['Portfolio Value'] = GapUpQuantStrategy.Capital + pl
+            stats_map['Portfolio Value'] = self.Capital + pl
 
-            self.log(AlgorumQuantClient.algorum_types.LogLevel.Information, "PL: " + str(pl))
-            self.log(AlgorumQuantClient.algorum_types.LogLevel.Information,
-                     "Portfolio Value: " + str(stats_map['Portfolio Value']))
+            self.LogSink.info('PL: %s', pl)
+            self.LogSink.info('Portfolio Value: %s', stats_map['Portfolio Value'])
 
         except Exception:
             self.log(AlgorumQuantClient.algorum_types.LogLevel.Error, traceback.format_exc())
@@ -1,46 +1,78 @@
 import datetime
-import threading
+import time
 import traceback
 import uuid
 
 import AlgorumQuantClient.quant_client
 import AlgorumQuantClient.algorum_types
-import jsonpickle
+import async_log_sink
+import bar_scheduler
+import compact_tick
+import latency_histogram
+import order_manager
+import order_store
+import progress_reporter
+import risk_engine
+import session_calendar
+import state_journal
+import strategy_event_loop
+import tick_timestamp
 
 
 class IndexFuturesTrendQuantStrategy(AlgorumQuantClient.quant_client.QuantEngineClient):
     Capital = 100000
     Leverage = 3  # 3x Leverage on Capital
+    TrendPeriod = 60
+    TrendStrength = 10
+    ProfitPoints = 10
+    StopLossPoints = 20
+    TradingWindowStart = datetime.time(9, 30)
+    TradingWindowEnd = datetime.time(15, 0)
     DIRECTION_UP = 1
     DIRECTION_DOWN = 2
 
     class State(object):
         def __init__(self):
             self.Bought = False
-            self.LastTick = None
             self.CurrentTick = None
             self.IdxCurrentTick = None
             self.PrevTick = None
-            self.Orders = []
+            self.Orders = order_store.OrderStore()
             self.CurrentOrderId = None
             self.CurrentOrder = None
             self.ProcessingOrder = False
+            self.DayChanged = False
 
     def __init__(self, url, apikey, launchmode, sid, user_id, trace_ws=False):
         try:
             # Pass constructor arguments to base class
             super(IndexFuturesTrendQuantStrategy, self).__init__(url, apikey, launchmode, sid, user_id, trace_ws)
 
-            # Load any saved state
-            state_json_str = self.get_data("state")
+            # Log records are formatted and shipped to the engine off the tick thread
+            self.LogSink = async_log_sink.AsyncLogSink(self)
+
+            # Backtest progress is published at a coarse cadence rather than on every tick
+            self.Progress = progress_reporter.ProgressReporter(self)
+
+            # Per-stage tick-to-order and order update latencies, see latency_histogram
+            self.Latency = latency_histogram.LatencyRecorder(type(self).__name__ + ' ' + sid)
 
-            if state_json_str is not None:
-                self.State = jsonpickle.decode(state_json_str)
+            # Pre-trade limits, shared with the other live strategies of this process
+            self.Risk = risk_engine.for_client(self)
+
+            # Load any saved state
+            self.StateJournal = state_journal.StateJournal(self, 'state')
+            self.State = self.StateJournal.load()
 
             if self.State is None or launchmode == AlgorumQuantClient.algorum_types.StrategyLaunchMode.Backtesting:
                 self.State = IndexFuturesTrendQuantStrategy.State()
 
-            self.StateLock = threading.RLock()
+            # Orders are tracked outside the State and rebuilt from its order history
+            self.OrderManager = order_manager.OrderManager.from_orders(self.State.Orders)
+
+            # on_tick and on_order_update run one at a time on the worker of the event loop, which is the
+            # only writer of the state
+            self.Events = strategy_event_loop.StrategyEventLoop(self)
 
             # Subscribe for our symbol data
             # For India users
@@ -65,6 +97,18 @@ class IndexFuturesTrendQuantStrategy(AlgorumQuantClient.quant_client.QuantEngine
             symbols = [self.symbol, self.symbolCurrentMonth]
             self.subscribe_symbols(symbols)
 
+            # Day changes and the trading window are classified by a session clock, once per boundary
+            self.Calendar = session_calendar.for_client(self)
+            self.Clock = self.Calendar.clock(self.TradingWindowStart, self.TradingWindowEnd)
+            self.Clock.on_day_change(self.on_day_change)
+
+            if self.State.CurrentTick is not None:
+                self.Clock.resume(self.State.CurrentTick.Epoch)
+
+            # Once a minute status line
+            self.Scheduler = bar_scheduler.BarScheduler()
+            self.Scheduler.on_timer(60, self.log_status)
+
             # Create indicator evaluator, which will be automatically synchronized with the real time or backtesting
             # data that is streaming into this algo
             self.evaluator = self.create_indicator_evaluator(
@@ -73,73 +117,49 @@ class IndexFuturesTrendQuantStrategy(AlgorumQuantClient.quant_client.QuantEngine
                     AlgorumQuantClient.algorum_types.CandlePeriod.Minute,
                     1))
         except Exception:
-            print(traceback.format_exc())
+            # Left for run_strategy, which fails the run rather than trade a strategy that never started
+            self.InitError = traceback.format_exc()
+            print(self.InitError)
             self.log(AlgorumQuantClient.algorum_types.LogLevel.Error, traceback.format_exc())
 
     # This method is called on each tick for the subscribed symbols
     def on_tick(self, tick_data):
         try:
-            prev_tick = self.State.CurrentTick
+            tick_started = time.perf_counter_ns()
+            tick_timestamp.stamp(tick_data)
+            stage_started = self.Latency.lap('tick.parse', tick_started)
 
             if AlgorumQuantClient.algorum_types.is_symbol_equal(tick_data.Symbol, self.symbolCurrentMonth):
-                self.State.CurrentTick = tick_data
+                self.State.CurrentTick = compact_tick.CompactTick.from_tick(tick_data)
             else:
-                self.State.IdxCurrentTick = tick_data
+                self.State.IdxCurrentTick = compact_tick.CompactTick.from_tick(tick_data)
 
             if self.State.CurrentTick is None or self.State.IdxCurrentTick is None:
                 return
 
-            day_changed = False
+            self.Clock.update(tick_data)
 
-            if prev_tick is not None:
-                tick_day = datetime.datetime.strptime(tick_data.Timestamp,
-                                                      AlgorumQuantClient.quant_client.QuantEngineClient.get_date_format(
-                                                          tick_data.Timestamp)).day
-                prev_tick_day = datetime.datetime.strptime(prev_tick.Timestamp,
-                                                           AlgorumQuantClient.quant_client.QuantEngineClient.get_date_format(
-                                                               prev_tick.Timestamp)).day
-                day_changed = tick_day > prev_tick_day
+            # Get the trend
+            (direction, strength) = self.evaluator.trend(self.TrendPeriod)
 
-            if prev_tick is None or \
-                    (not self.State.DayChanged and day_changed and not self.State.Bought):
-                self.State.DayChanged = True
-                self.Evaluator.clear_candles()
+            stage_started = self.Latency.lap('tick.indicators', stage_started)
 
-            # Get the trend
-            (direction, strength) = self.Evaluator.trend(60)
-
-            if self.State.LastTick is not None and (
-                    datetime.datetime.strptime(tick_data.Timestamp,
-                                               AlgorumQuantClient.quant_client.QuantEngineClient.get_date_format(
-                                                   tick_data.Timestamp)) -
-                    datetime.datetime.strptime(self.State.LastTick.Timestamp,
-                                               AlgorumQuantClient.quant_client.QuantEngineClient.get_date_format(
-                                                   self.State.LastTick.Timestamp))).total_seconds() < 60:
-                pass
-            else:
-                msg = str(tick_data.Timestamp) + ',' + str(tick_data.LTP) + ', d ' \
-                      + str(direction) + ', s ' + str(strength)
-                print(msg)
-                self.log(AlgorumQuantClient.algorum_types.LogLevel.Information, msg)
-                self.State.LastTick = tick_data
-
-            idx_tick_hour = datetime.datetime.strptime(self.State.IdxCurrentTick.Timestamp,
-                                                       AlgorumQuantClient.quant_client.QuantEngineClient.get_date_format(
-                                                           self.State.IdxCurrentTick.Timestamp)).hour
-
-            tick_hour = datetime.datetime.strptime(self.State.CurrentTick.Timestamp,
-                                                       AlgorumQuantClient.quant_client.QuantEngineClient.get_date_format(
-                                                           self.State.CurrentTick.Timestamp)).hour
-
-            tick_minute = datetime.datetime.strptime(self.State.CurrentTick.Timestamp,
-                                                       AlgorumQuantClient.quant_client.QuantEngineClient.get_date_format(
-                                                           self.State.CurrentTick.Timestamp)).minute
-
-            if direction == IndexFuturesTrendQuantStrategy.DIRECTION_DOWN and strength >= 10 and \
-                    9 <= idx_tick_hour <= 14 and \
-                    ((tick_hour >= 9 and tick_minute >= 30) or tick_hour >= 10) and \
+            self.Scheduler.update(tick_data)
+
+            entry_signal = direction == IndexFuturesTrendQuantStrategy.DIRECTION_DOWN and \
+                    strength >= self.TrendStrength and \
+                    self.Clock.InWindow and \
                     not self.State.Bought and \
-                    self.State.CurrentOrderId is None:
+                    self.State.CurrentOrderId is None
+            exit_signal = not entry_signal and self.State.CurrentOrder is not None and \
+                    not self.State.ProcessingOrder and \
+                    (tick_data.LTP - self.State.CurrentOrder.AveragePrice >= self.ProfitPoints or
+                     self.State.CurrentOrder.AveragePrice - tick_data.LTP >= self.StopLossPoints) and \
+                    self.State.Bought
+
+            stage_started = self.Latency.lap('tick.decision', stage_started)
+
+            if entry_signal:
 
                 self.State.DayChanged = False
                 self.State.ProcessingOrder = True
@@ -149,7 +169,7 @@ class IndexFuturesTrendQuantStrategy(AlgorumQuantClient.quant_client.QuantEngine
                 place_order_request.OrderType = AlgorumQuantClient.algorum_types.OrderType.Market
                 place_order_request.Price = tick_data.LTP
                 place_order_request.Quantity = \
-                    (IndexFuturesTrendQuantStrategy.Capital / tick_data.LTP) * IndexFuturesTrendQuantStrategy.Leverage
+                    (self.Capital / tick_data.LTP) * self.Leverage
                 place_order_request.Symbol = self.symbol
                 place_order_request.Timestamp = tick_data.Timestamp
 
@@ -163,95 +183,167 @@ class IndexFuturesTrendQuantStrategy(AlgorumQuantClient.quant_client.QuantEngine
                 place_order_request.SlippageType = AlgorumQuantClient.algorum_types.SlippageType.TIME
                 place_order_request.Slippage = 1000
 
-                self.place_order(place_order_request)
-                self.set_data("state", self.State)
+                stage_started = self.Latency.lap('order.build', stage_started)
+                rejection = self.Risk.check(place_order_request)
+                stage_started = self.Latency.lap('order.risk', stage_started)
+
+                if rejection is None:
+                    self.OrderManager.track(place_order_request)
+
+                    try:
+                        self.place_order(place_order_request)
+                    except Exception:
+                        # The order never went out, so nothing will release what the checks reserved for it
+                        self.Risk.release(place_order_request.Tag)
+                        self.OrderManager.discard(place_order_request.Tag)
+                        self.State.CurrentOrderId = None
+                        self.State.ProcessingOrder = False
+                        raise
+
+                    stage_started = self.Latency.lap('order.place', stage_started)
+                    self.Latency.record('tick.to_order', stage_started - tick_started)
+                    self.StateJournal.save(self.State)
+                    stage_started = self.Latency.lap('order.persist', stage_started)
+
+                    self.LogSink.info('Placed buy order for %s units of %s at price (approx) %s, %s',
+                                      place_order_request.Quantity, self.symbol.Ticker, tick_data.LTP,
+                                      tick_data.Timestamp)
+                else:
+                    self.State.CurrentOrderId = None
+                    self.State.ProcessingOrder = False
+                    self.LogSink.info('Risk check rejected %s order for %s units of %s: %s',
+                                      place_order_request.OrderDirection, place_order_request.Quantity,
+                                      self.symbol.Ticker, rejection)
+            elif exit_signal:
 
-                msg = 'Placed buy order for ' + str(place_order_request.Quantity) + ' units of ' + self.symbol.Ticker + \
-                      ' at price (approx) ' + str(tick_data.LTP) + ', ' + str(tick_data.Timestamp)
-                print(msg)
-                self.log(AlgorumQuantClient.algorum_types.LogLevel.Information, msg)
-            else:
-                if self.State.CurrentOrder is not None and \
-                        not self.State.ProcessingOrder and \
-                        (tick_data.LTP - self.State.CurrentOrder.AveragePrice >= 10 or
-                         self.State.CurrentOrder.AveragePrice - tick_data.LTP >= 20) and \
-                        self.State.Bought:
-
-                    self.State.ProcessingOrder = True
-
-                    qty = self.State.CurrentOrder.FilledQuantity
-
-                    self.State.CurrentOrderId = uuid.uuid4().hex
-                    place_order_request = AlgorumQuantClient.algorum_types.PlaceOrderRequest()
-                    place_order_request.OrderType = AlgorumQuantClient.algorum_types.OrderType.Market
-                    place_order_request.Price = tick_data.LTP
-                    place_order_request.Quantity = qty
-                    place_order_request.Symbol = self.symbol
-                    place_order_request.Timestamp = tick_data.Timestamp
-
-                    if self.LaunchMode == AlgorumQuantClient.algorum_types.StrategyLaunchMode.Backtesting:
-                        place_order_request.TradeExchange = AlgorumQuantClient.algorum_types.TradeExchange.PAPER
-                    else:
-                        place_order_request.TradeExchange = AlgorumQuantClient.algorum_types.TradeExchange.NSE
+                self.State.ProcessingOrder = True
 
-                    place_order_request.TriggerPrice = tick_data.LTP
-                    place_order_request.OrderDirection = AlgorumQuantClient.algorum_types.OrderDirection.Sell
-                    place_order_request.Tag = self.State.CurrentOrderId
-                    place_order_request.SlippageType = AlgorumQuantClient.algorum_types.SlippageType.TIME
-                    place_order_request.Slippage = 1000
+                qty = self.OrderManager.position(self.symbol.Ticker)
 
-                    self.place_order(place_order_request)
-                    self.set_data("state", self.State)
+                self.State.CurrentOrderId = uuid.uuid4().hex
+                place_order_request = AlgorumQuantClient.algorum_types.PlaceOrderRequest()
+                place_order_request.OrderType = AlgorumQuantClient.algorum_types.OrderType.Market
+                place_order_request.Price = tick_data.LTP
+                place_order_request.Quantity = qty
+                place_order_request.Symbol = self.symbol
+                place_order_request.Timestamp = tick_data.Timestamp
+
+                if self.LaunchMode == AlgorumQuantClient.algorum_types.StrategyLaunchMode.Backtesting:
+                    place_order_request.TradeExchange = AlgorumQuantClient.algorum_types.TradeExchange.PAPER
+                else:
+                    place_order_request.TradeExchange = AlgorumQuantClient.algorum_types.TradeExchange.NSE
+
+                place_order_request.TriggerPrice = tick_data.LTP
+                place_order_request.OrderDirection = AlgorumQuantClient.algorum_types.OrderDirection.Sell
+                place_order_request.Tag = self.State.CurrentOrderId
+                place_order_request.SlippageType = AlgorumQuantClient.algorum_types.SlippageType.TIME
+                place_order_request.Slippage = 1000
+
+                stage_started = self.Latency.lap('order.build', stage_started)
+                rejection = self.Risk.check(place_order_request)
+                stage_started = self.Latency.lap('order.risk', stage_started)
+
+                if rejection is None:
+                    self.OrderManager.track(place_order_request)
+
+                    try:
+                        self.place_order(place_order_request)
+                    except Exception:
+                        # The order never went out, so nothing will release what the checks reserved for it
+                        self.Risk.release(place_order_request.Tag)
+                        self.OrderManager.discard(place_order_request.Tag)
+                        self.State.CurrentOrderId = None
+                        self.State.ProcessingOrder = False
+                        raise
+
+                    stage_started = self.Latency.lap('order.place', stage_started)
+                    self.Latency.record('tick.to_order', stage_started - tick_started)
+                    self.StateJournal.save(self.State)
+                    stage_started = self.Latency.lap('order.persist', stage_started)
+
+                    self.LogSink.info('Placed sell order for %s units of %s at price (approx) %s, %s', qty,
+                                      self.symbol.Ticker, tick_data.LTP, tick_data.Timestamp)
+                else:
+                    self.State.CurrentOrderId = None
+                    self.State.ProcessingOrder = False
+                    self.LogSink.info('Risk check rejected %s order for %s units of %s: %s',
+                                      place_order_request.OrderDirection, place_order_request.Quantity,
+                                      self.symbol.Ticker, rejection)
 
-                    msg = 'Placed sell order for ' + str(qty) + ' units of ' + self.symbol.Ticker + \
-                          ' at price (approx) ' + str(tick_data.LTP) + ', ' + str(tick_data.Timestamp)
-                    print(msg)
-                    self.log(AlgorumQuantClient.algorum_types.LogLevel.Information, msg)
+            self.Latency.lap('tick.total', tick_started)
 
             if self.LaunchMode == AlgorumQuantClient.algorum_types.StrategyLaunchMode.Backtesting:
-                self.send_progress_async(tick_data)
+                self.Progress.update(tick_data)
         except Exception:
             self.log(AlgorumQuantClient.algorum_types.LogLevel.Error, traceback.format_exc())
 
     # This method is called on order updates, once the place_order method is called
     def on_order_update(self, order: AlgorumQuantClient.algorum_types.Order):
         try:
-            if order.Status == AlgorumQuantClient.algorum_types.OrderStatus.Completed:
-                self.StateLock.acquire()
-                self.State.Orders.append(order)
-                self.StateLock.release()
-
-                if order.OrderDirection == AlgorumQuantClient.algorum_types.OrderDirection.Buy:
-                    self.State.Bought = True
-                    self.State.CurrentOrder = order
-                    msg = 'Order Id ' + order.OrderId + ' Bought ' + \
-                          str(order.FilledQuantity) + ' units of ' + order.Symbol.Ticker + ' at price ' + \
-                          str(order.AveragePrice)
-                    print(msg)
-                    self.log(AlgorumQuantClient.algorum_types.LogLevel.Information, msg)
+            update_started = time.perf_counter_ns()
+            self.Risk.on_order_update(order)
+            managed = self.OrderManager.update(order)
+
+            if managed is None:
+                return
+
+            self.State.Orders.append(order)
+
+            if managed.Status in order_store.TERMINAL_STATUSES:
+
+                if managed.FilledQuantity > 0:
+                    if order.OrderDirection == AlgorumQuantClient.algorum_types.OrderDirection.Buy:
+                        self.State.CurrentOrder = order
+                        self.LogSink.info('Order Id %s Bought %s units of %s at price %s', order.OrderId,
+                                          order.FilledQuantity, order.Symbol.Ticker, order.AveragePrice)
+                    else:
+                        self.LogSink.info('Order Id %s Sold %s units of %s at price %s', order.OrderId,
+                                          order.FilledQuantity, order.Symbol.Ticker, order.AveragePrice)
+
+                    # A partly filled exit leaves the rest of the position open
+                    self.State.Bought = self.OrderManager.position(order.Symbol.Ticker) > 0
+
+                    if not self.State.Bought:
+                        self.State.CurrentOrder = None
                 else:
-                    self.State.Bought = False
-                    self.State.CurrentOrder = None
-                    msg = 'Order Id ' + order.OrderId + ' Sold ' + \
-                          str(order.FilledQuantity) + ' units of ' + order.Symbol.Ticker + ' at price ' + \
-                          str(order.AveragePrice)
-                    print(msg)
-                    self.log(AlgorumQuantClient.algorum_types.LogLevel.Information, msg)
+                    self.LogSink.info('Order Id %s for %s units of %s %s: %s', order.OrderId, order.Quantity,
+                                      order.Symbol.Ticker, order.Status, order.StatusMessage)
 
-                self.State.ProcessingOrder = False
+                if order.Tag == self.State.CurrentOrderId:
+                    self.State.CurrentOrderId = None
+                    self.State.ProcessingOrder = False
 
-                self.State.CurrentOrderId = None
+                stage_started = self.Latency.lap('update.state', update_started)
                 stats = self.get_stats(self.State.CurrentTick)
+                stage_started = self.Latency.lap('update.stats', stage_started)
                 self.publish_stats(stats)
+                self.Latency.lap('update.publish', stage_started)
 
                 for k, v in stats.items():
-                    print('Key: ' + str(k) + ', Value: ' + str(v))
+                    self.LogSink.echo('Key: %s, Value: %s', k, v)
+            elif managed.LastFill > 0:
+                self.LogSink.info('Order Id %s filled %s of %s units of %s at price %s', order.OrderId,
+                                  managed.FilledQuantity, managed.Quantity, order.Symbol.Ticker, order.AveragePrice)
 
-            self.set_data("state", self.State)
+            self.StateJournal.save(self.State)
+            self.Latency.lap('update.total', update_started)
         except Exception:
             self.log(AlgorumQuantClient.algorum_types.LogLevel.Error, traceback.format_exc())
 
+    # Called by the session clock with the first tick of every day
+    def on_day_change(self, tick_data, session, previous):
+        if previous is None or (not self.State.DayChanged and not self.State.Bought):
+            self.State.DayChanged = True
+            self.evaluator.clear_candles()
+
+    # Status line, once a minute of tick time
+    def log_status(self, tick_data):
+        (direction, strength) = self.evaluator.trend(self.TrendPeriod)
+        self.LogSink.info('%s,%s, d %s, s %s', tick_data.Timestamp, tick_data.LTP, direction, strength)
+
     def backtest(self, backtest_request: AlgorumQuantClient.algorum_types.BacktestRequest):
+        self.Calendar.precompute(backtest_request.StartDate, backtest_request.EndDate)
+
         # Preload the indicator evaluator with 200 candles
         self.evaluator.preload_candles(200, backtest_request.StartDate, backtest_request.ApiKey,
                                        backtest_request.ApiSecretKey)
@@ -262,36 +354,14 @@ class IndexFuturesTrendQuantStrategy(AlgorumQuantClient.quant_client.QuantEngine
         stats_map = None
 
         try:
-            stats_map = {"Capital": IndexFuturesTrendQuantStrategy.Capital, "Order Count": len(self.State.Orders)}
-
-            buy_val = 0.0
-            sell_val = 0.0
-            buy_qty = 0.0
-            sell_qty = 0.0
-
-            for order in self.State.Orders:
-                if (order.Status == AlgorumQuantClient.algorum_types.OrderStatus.Completed) and \
-                        (order.OrderDirection == AlgorumQuantClient.algorum_types.OrderDirection.Buy) and \
-                        order.Symbol.Ticker == tick_date.Symbol.Ticker:
-                    buy_val += order.FilledQuantity * order.AveragePrice
-                    buy_qty += order.FilledQuantity
-
-                if (order.Status == AlgorumQuantClient.algorum_types.OrderStatus.Completed) and \
-                        (order.OrderDirection == AlgorumQuantClient.algorum_types.OrderDirection.Sell) and \
-                        order.Symbol.Ticker == tick_date.Symbol.Ticker:
-                    sell_val += order.FilledQuantity * order.AveragePrice
-                    sell_qty += order.FilledQuantity
-
-            if sell_qty < buy_qty:
-                sell_val += (buy_qty - sell_qty) * tick_date.LTP
-
-            pl = sell_val - buy_val
+            (filled, unfilled) = self.OrderManager.order_counts(tick_date.Symbol.Ticker)
+            stats_map = {"Capital": self.Capital, "Order Count": filled, "Unfilled Orders": unfilled}
+            pl = self.OrderManager.profit(tick_date.Symbol.Ticker, tick_date.LTP)
             stats_map['PL'] = pl
-            stats_map['Portfolio Value'] = IndexFuturesTrendQuantStrategy.Capital + pl
+            stats_map['Portfolio Value'] = self.Capital + pl
 
-            self.log(AlgorumQuantClient.algorum_types.LogLevel.Information, "PL: " + str(pl))
-            self.log(AlgorumQuantClient.algorum_types.LogLevel.Information,
-                     "Portfolio Value: " + str(stats_map['Portfolio Value']))
+            self.LogSink.info('PL: %s', pl)
+            self.LogSink.info('Portfolio Value: %s', stats_map['Portfolio Value'])
 
         except Exception:
             self.log(AlgorumQuantClient.algorum_types.LogLevel.Error, traceback.format_exc())
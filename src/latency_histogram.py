@@ -0,0 +1,161 @@
+import threading
+import time
+import weakref
+
+# Log-linear bucketing in the style of HdrHistogram: values below 2 ** SUB_BUCKET_BITS nanoseconds get a bucket each,
+# every higher power of two range is split into 2 ** (SUB_BUCKET_BITS - 1) equal buckets, so a recorded value is
+# off by less than 1 / 2 ** (SUB_BUCKET_BITS - 1) (under 1.6%) of itself. Buckets cover up to 2 ** MAX_VALUE_BITS ns.
+SUB_BUCKET_BITS = 7
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1
+MAX_VALUE_BITS = 40
+BUCKET_COUNT = (MAX_VALUE_BITS - SUB_BUCKET_BITS + 2) * SUB_BUCKET_HALF
+
+
+def bucket_index(value: int) -> int:
+    if value < SUB_BUCKET_COUNT:
+        return value if value > 0 else 0
+
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return min((shift << (SUB_BUCKET_BITS - 1)) + (value >> shift), BUCKET_COUNT - 1)
+
+
+# Highest value that falls in the bucket
+def bucket_value(index: int) -> int:
+    if index < SUB_BUCKET_COUNT:
+        return index
+
+    shift = index // SUB_BUCKET_HALF - 1
+    return ((index - shift * SUB_BUCKET_HALF + 1) << shift) - 1
+
+
+class LatencyHistogram(object):
+    def __init__(self):
+        self.Counts = [0] * BUCKET_COUNT
+        self.Count = 0
+        self.Total = 0
+        self.Min = None
+        self.Max = 0
+
+    def record(self, nanos: int):
+        self.Counts[bucket_index(nanos)] += 1
+        self.Count += 1
+        self.Total += nanos
+
+        if self.Min is None or nanos < self.Min:
+            self.Min = nanos
+
+        if nanos > self.Max:
+            self.Max = nanos
+
+    def percentile(self, percent: float) -> int:
+        if self.Count == 0:
+            return 0
+
+        rank = max(1, int(self.Count * percent / 100.0 + 0.5))
+        seen = 0
+
+        for index, count in enumerate(self.Counts):
+            seen += count
+
+            if seen >= rank:
+                return min(bucket_value(index), self.Max)
+
+        return self.Max
+
+    def merge(self, other):
+        for index, count in enumerate(other.Counts):
+            if count:
+                self.Counts[index] += count
+
+        self.Count += other.Count
+        self.Total += other.Total
+        self.Max = max(self.Max, other.Max)
+
+        if other.Min is not None and (self.Min is None or other.Min < self.Min):
+            self.Min = other.Min
+
+    # Summary in microseconds
+    def summary(self):
+        return {
+            'Count': self.Count,
+            'Min': (self.Min or 0) / 1000.0,
+            'Mean': (self.Total / self.Count / 1000.0) if self.Count > 0 else 0.0,
+            'P50': self.percentile(50) / 1000.0,
+            'P90': self.percentile(90) / 1000.0,
+            'P99': self.percentile(99) / 1000.0,
+            'P99.9': self.percentile(99.9) / 1000.0,
+            'Max': self.Max / 1000.0
+        }
+
+
+# One histogram per named stage of a strategy. Stages are timed back to back with lap(), which records the time since
+# `started` and returns the current perf_counter_ns reading as the start of the next stage:
+#
+#     started = time.perf_counter_ns()
+#     ...
+#     started = self.Latency.lap('tick.indicators', started)
+#
+# Recording takes a few hundred nanoseconds and never blocks; dump() and format_table() can be called at any time
+# from another thread.
+class LatencyRecorder(object):
+    def __init__(self, name: str = None, enabled: bool = True):
+        self.Name = name
+        self.Enabled = enabled
+        self.Histograms = {}
+
+        with _recorders_lock:
+            _recorders.add(self)
+
+    def histogram(self, stage: str) -> LatencyHistogram:
+        histogram = self.Histograms.get(stage)
+
+        if histogram is None:
+            histogram = self.Histograms.setdefault(stage, LatencyHistogram())
+
+        return histogram
+
+    def record(self, stage: str, nanos: int):
+        if self.Enabled:
+            self.histogram(stage).record(nanos)
+
+    def lap(self, stage: str, started: int) -> int:
+        now = time.perf_counter_ns()
+
+        if self.Enabled:
+            self.histogram(stage).record(now - started)
+
+        return now
+
+    def reset(self):
+        self.Histograms = {}
+
+    # Stage -> summary in microseconds
+    def dump(self):
+        return {stage: histogram.summary() for stage, histogram in list(self.Histograms.items())}
+
+    def format_table(self):
+        lines = ['%-18s %10s %10s %10s %10s %10s %10s' % ('Stage (us)', 'Count', 'P50', 'P90', 'P99', 'P99.9',
+                                                           'Max')]
+
+        for stage, summary in sorted(self.dump().items()):
+            lines.append('%-18s %10d %10.1f %10.1f %10.1f %10.1f %10.1f' % (
+                stage, summary['Count'], summary['P50'], summary['P90'], summary['P99'], summary['P99.9'],
+                summary['Max']))
+
+        if self.Name is not None:
+            lines.insert(0, self.Name)
+
+        return '\n'.join(lines)
+
+
+_recorders = weakref.WeakSet()
+_recorders_lock = threading.Lock()
+
+
+# Latency tables of every recorder created in this process, e.g. for a signal handler
+def format_all():
+    with _recorders_lock:
+        recorders = list(_recorders)
+
+    return '\n\n'.join(recorder.format_table() for recorder in recorders)
@@ -0,0 +1,286 @@
+import contextlib
+import csv
+import datetime
+import functools
+import os
+import time
+import uuid
+
+import AlgorumQuantClient.quant_client
+import AlgorumQuantClient.algorum_types
+import jsonpickle
+
+import local_indicator_evaluator
+import tick_store
+import tick_timestamp
+
+
+# Loads recorded ticks from a CSV or Parquet file. Expected columns are Timestamp and LTP, optionally LTQ, Bid, Ask,
+# OpenInterest and Ticker. symbols is either a single TradeSymbol (all rows belong to it) or a dict of
+# Ticker -> TradeSymbol for files holding several symbols.
+def load_ticks(path: str, symbols):
+    if path.endswith('.parquet') or path.endswith('.pq'):
+        try:
+            import pandas
+        except ImportError:
+            raise ImportError('Reading parquet tick files requires pandas and pyarrow')
+
+        rows = pandas.read_parquet(path).to_dict('records')
+    else:
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+
+    ticks = []
+
+    for row in rows:
+        if isinstance(symbols, dict):
+            symbol = symbols[row['Ticker']]
+        else:
+            symbol = symbols
+
+        timestamp = row['Timestamp']
+
+        if not isinstance(timestamp, str):
+            timestamp = timestamp.strftime('%Y-%m-%dT%H:%M:%S')
+
+        ticks.append(AlgorumQuantClient.algorum_types.TickData(
+            symbol,
+            timestamp[0:10],
+            timestamp,
+            float(row['LTP']),
+            float(row.get('LTQ') or 0),
+            float(row.get('Bid') or 0),
+            float(row.get('Ask') or 0),
+            False,
+            float(row.get('OpenInterest') or 0)))
+
+    return ticks
+
+
+# Ticks from start_date up to and including end_date (either may be None)
+def select_ticks(ticks, start_date: datetime.datetime = None, end_date: datetime.datetime = None):
+    if start_date is None and end_date is None:
+        return ticks
+
+    start_epoch = tick_timestamp.to_epoch(start_date) if start_date is not None else None
+    end_epoch = tick_timestamp.to_epoch(end_date) if end_date is not None else None
+
+    if isinstance(ticks, tick_store.TickSequence):
+        return ticks.between(start_epoch, end_epoch)
+
+    return [t for t in ticks
+            if (start_epoch is None or tick_timestamp.stamp(t).Epoch >= start_epoch) and
+            (end_epoch is None or tick_timestamp.stamp(t).Epoch <= end_epoch)]
+
+
+# Replaces the websocket transport of QuantEngineClient with in-process equivalents. It is mixed in ahead of a
+# strategy class by LocalBacktestEngine, so the strategy code runs unmodified while every call it makes to the
+# engine (state, logging, indicators, orders) is served locally.
+class LocalQuantEngineMixin(object):
+    LocalEvaluatorFactory = None
+    LocalSlippageBps = 0.0
+
+    # Ticks and order updates already come one at a time from the replay loop, see strategy_event_loop
+    InlineEvents = True
+
+    def initialize(self):
+        self.ws = None
+        self.LocalData = {}
+        self.LocalEvaluators = []
+        self.LocalPendingOrders = []
+        self.LocalFilledOrders = []
+        self.LocalLastPrices = {}
+        self.LocalStats = None
+        self.SubscribedSymbols = []
+
+    def execute_async(self, algorum_websocket_message):
+        return AlgorumQuantClient.algorum_types.AlgorumWebsocketMessage(
+            algorum_websocket_message.Name,
+            AlgorumQuantClient.algorum_types.AlgorumMessageType.Response,
+            algorum_websocket_message.CorId,
+            'null', None)
+
+    def send_async(self, algorum_websocket_message):
+        pass
+
+    def log(self, log_level: str, message: str):
+        pass
+
+    def publish_stats(self, stats):
+        self.LocalStats = stats
+
+    def set_data(self, key: str, value):
+        self.LocalData[key] = value
+
+    def get_data(self, key: str):
+        value = self.LocalData.get(key)
+
+        if value is None:
+            return None
+
+        return jsonpickle.decode(jsonpickle.encode(value, False))
+
+    def subscribe_symbols(self, symbols):
+        self.SubscribedSymbols.extend(symbols)
+
+    def get_holidays(self, exchange):
+        return []
+
+    def create_indicator_evaluator(self, create_indicator_request):
+        if self.LocalEvaluatorFactory is None:
+            raise Exception('Local backtest engine has no indicator evaluator factory')
+
+        self.Evaluator = self.LocalEvaluatorFactory(create_indicator_request)
+        self.LocalEvaluators.append(self.Evaluator)
+        return self.Evaluator
+
+    def place_order(self, place_order_request):
+        order_id = uuid.uuid4().hex
+        self.LocalPendingOrders.append((order_id, place_order_request))
+        return order_id
+
+    def cancel_order(self, order_id: str) -> bool:
+        for pending in self.LocalPendingOrders:
+            if pending[0] == order_id:
+                self.LocalPendingOrders.remove(pending)
+                return True
+
+        return False
+
+    def send_progress_async(self, tick_data):
+        if tick_data.LastTick:
+            self.stop_event.set()
+
+    def fill_pending_orders(self, tick_data):
+        pending_orders = self.LocalPendingOrders
+        self.LocalPendingOrders = []
+
+        for order_id, request in pending_orders:
+            price = self.LocalLastPrices.get(request.Symbol.Ticker, request.Price)
+
+            if request.OrderDirection == AlgorumQuantClient.algorum_types.OrderDirection.Buy:
+                price = price * (1 + self.LocalSlippageBps / 10000)
+            else:
+                price = price * (1 - self.LocalSlippageBps / 10000)
+
+            order = AlgorumQuantClient.algorum_types.Order(
+                OrderId=order_id,
+                Tag=request.Tag,
+                Symbol=request.Symbol,
+                OrderDirection=request.OrderDirection,
+                OrderType=request.OrderType,
+                Exchange=request.TradeExchange,
+                Status=AlgorumQuantClient.algorum_types.OrderStatus.Completed,
+                Quantity=request.Quantity,
+                FilledQuantity=request.Quantity,
+                PendingQuantity=0.0,
+                Price=request.Price,
+                AveragePrice=price,
+                OrderTimestamp=tick_data.Timestamp,
+                ExchangeTimestamp=tick_data.Timestamp,
+                LastTick=tick_data)
+
+            self.LocalFilledOrders.append(order)
+            self.on_order_update(order)
+
+
+class LocalBacktestResult(object):
+    def __init__(self, strategy, orders, stats, tick_count, elapsed_seconds):
+        self.Strategy = strategy
+        self.Orders = orders
+        self.Stats = stats
+        self.TickCount = tick_count
+        self.ElapsedSeconds = elapsed_seconds
+
+
+# Replays recorded ticks (a list of TickData or a tick_store.TickSequence) through an unmodified strategy class at
+# CPU speed. Orders are filled as PAPER market orders at the last traded price of the order symbol (plus optional
+# slippage in basis points) right after the on_tick call that placed them, and delivered back through on_order_update.
+# Indicator evaluators come from evaluator_factory, which is called with the CreateIndicatorRequest and defaults to the
+# in-process LocalIndicatorEvaluator, preloaded from candle_loader (e.g. a candle_cache.CandleCache) when one is given.
+class LocalBacktestEngine(object):
+    def __init__(self, strategy_class, ticks, evaluator_factory=None,
+                 slippage_bps=0.0, sid='local-backtest', user_id='local', quiet=True, candle_loader=None):
+        if evaluator_factory is None:
+            evaluator_factory = functools.partial(local_indicator_evaluator.LocalIndicatorEvaluator,
+                                                  candle_loader=candle_loader)
+
+        self.StrategyClass = strategy_class
+        self.Ticks = ticks
+        self.EvaluatorFactory = evaluator_factory
+        self.SlippageBps = slippage_bps
+        self.Sid = sid
+        self.UserId = user_id
+        self.Quiet = quiet
+
+    def create_strategy(self):
+        local_class = type('Local' + self.StrategyClass.__name__,
+                           (LocalQuantEngineMixin, self.StrategyClass),
+                           {
+                               'LocalEvaluatorFactory': staticmethod(self.EvaluatorFactory),
+                               'LocalSlippageBps': self.SlippageBps
+                           })
+
+        return local_class(None, None, AlgorumQuantClient.algorum_types.StrategyLaunchMode.Backtesting,
+                           self.Sid, self.UserId)
+
+    def backtest_request(self, start_date: datetime.datetime, end_date: datetime.datetime):
+        return AlgorumQuantClient.algorum_types.BacktestRequest(
+            start_date, end_date, self.Sid, None, None, None, None, None, 60,
+            AlgorumQuantClient.algorum_types.BrokeragePlatform.NorthEast,
+            self.StrategyClass.Capital)
+
+    def run(self, start_date: datetime.datetime = None, end_date: datetime.datetime = None):
+        ticks = select_ticks(self.Ticks, start_date, end_date)
+
+        if len(ticks) == 0:
+            raise Exception('No ticks to replay')
+
+        if start_date is None:
+            start_date = tick_timestamp.stamp(ticks[0]).DateTime
+
+        if end_date is None:
+            end_date = tick_timestamp.stamp(ticks[-1]).DateTime
+
+        with contextlib.ExitStack() as stack:
+            if self.Quiet:
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+
+            return self.replay(ticks, start_date, end_date)
+
+    def replay(self, ticks, start_date, end_date):
+        strategy = self.create_strategy()
+        strategy.backtest(self.backtest_request(start_date, end_date))
+
+        evaluators = {}
+
+        for evaluator in strategy.LocalEvaluators:
+            evaluators.setdefault(evaluator.Symbol.Ticker, []).append(evaluator)
+
+        last_prices = strategy.LocalLastPrices
+        last_index = len(ticks) - 1
+        started = time.perf_counter()
+
+        for (index, tick_data) in enumerate(ticks):
+            tick_data.LastTick = index == last_index
+            tick_timestamp.stamp(tick_data)
+            ticker = tick_data.Symbol.Ticker
+            last_prices[ticker] = tick_data.LTP
+
+            for evaluator in evaluators.get(ticker, ()):
+                evaluator.add_tick(tick_data)
+
+            strategy.on_tick(tick_data)
+
+            if strategy.LocalPendingOrders:
+                strategy.fill_pending_orders(tick_data)
+
+        elapsed = time.perf_counter() - started
+        stats = strategy.get_stats(tick_data)
+
+        log_sink = getattr(strategy, 'LogSink', None)
+
+        if log_sink is not None:
+            log_sink.close()
+
+        return LocalBacktestResult(strategy, strategy.LocalFilledOrders, stats, len(ticks), elapsed)
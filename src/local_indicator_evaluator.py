@@ -0,0 +1,171 @@
+import collections
+
+import AlgorumQuantClient.algorum_types
+import candle_aggregator
+
+CANDLE_SECONDS = candle_aggregator.CANDLE_SECONDS
+Candle = candle_aggregator.Candle
+
+
+class EmaIndicator(object):
+    def __init__(self, period):
+        self.Period = int(period)
+        self.Alpha = 2.0 / (self.Period + 1)
+        self.Count = 0
+        self.Sum = 0.0
+        self.Value = 0.0
+
+    def add(self, close: float):
+        self.Count += 1
+
+        if self.Count < self.Period:
+            self.Sum += close
+        elif self.Count == self.Period:
+            self.Value = (self.Sum + close) / self.Period
+        else:
+            self.Value += self.Alpha * (close - self.Value)
+
+
+# Wilder's RSI: the first average gain/loss is the simple average of `period` close to close changes, later ones are
+# smoothed with a 1 / period weight
+class RsiIndicator(object):
+    def __init__(self, period):
+        self.Period = int(period)
+        self.Count = 0
+        self.PrevClose = None
+        self.AvgGain = 0.0
+        self.AvgLoss = 0.0
+        self.Value = 0.0
+
+    def add(self, close: float):
+        prev_close = self.PrevClose
+        self.PrevClose = close
+
+        if prev_close is None:
+            return
+
+        change = close - prev_close
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+        self.Count += 1
+
+        if self.Count < self.Period:
+            self.AvgGain += gain
+            self.AvgLoss += loss
+            return
+
+        if self.Count == self.Period:
+            self.AvgGain = (self.AvgGain + gain) / self.Period
+            self.AvgLoss = (self.AvgLoss + loss) / self.Period
+        else:
+            self.AvgGain = (self.AvgGain * (self.Period - 1) + gain) / self.Period
+            self.AvgLoss = (self.AvgLoss * (self.Period - 1) + loss) / self.Period
+
+        total = self.AvgGain + self.AvgLoss
+
+        if total == 0:
+            self.Value = 50.0
+        else:
+            self.Value = 100.0 * self.AvgGain / total
+
+
+# In-process replacement for RemoteIndicatorEvaluator. Ticks are fed through add_tick into a CandleAggregator, which
+# builds the candles of the requested CandlePeriod and PeriodSpan; indicators are computed on completed candle closes,
+# a candle completing when the first tick of a later candle arrives. Every indicator keeps a running state that is
+# updated once per completed candle, so reading it on every tick costs a dict lookup. An indicator first requested
+# after candles have completed is caught up from the last MaxHistory closes. timeframe() adds other candle periods to
+# the same aggregator, so a strategy can read 5 minute or daily candles next to its own without another evaluator.
+#
+# preload_candles has no engine to fetch from; it feeds the candles returned by candle_loader(symbol, candle_period,
+# period_span, candle_count, preload_end_time), an iterable of (open, high, low, close), and is a no-op without one.
+class LocalIndicatorEvaluator(object):
+    MaxHistory = 10000
+
+    def __init__(self, create_indicator_request: AlgorumQuantClient.algorum_types.CreateIndicatorRequest,
+                 candle_loader=None):
+        self.Symbol = create_indicator_request.Symbol
+        self.CandlePeriod = create_indicator_request.CandlePeriod
+        self.PeriodSpan = create_indicator_request.PeriodSpan
+        self.CandleSeconds = CANDLE_SECONDS[self.CandlePeriod] * self.PeriodSpan
+        self.CandleLoader = candle_loader
+        self.Indicators = {}
+        self.Closes = collections.deque(maxlen=self.MaxHistory)
+        self.PreloadedCandle = None
+        self.Aggregator = candle_aggregator.CandleAggregator()
+        self.Timeframe = self.Aggregator.add_timeframe(self.CandlePeriod, self.PeriodSpan, self.complete, 0)
+
+    @property
+    def CurrentCandle(self):
+        return self.Timeframe.Current
+
+    @property
+    def PreviousCandle(self):
+        return self.Timeframe.Previous or self.PreloadedCandle
+
+    def add_tick(self, tick_data: AlgorumQuantClient.algorum_types.TickData):
+        self.Aggregator.add_tick(tick_data)
+
+    def timeframe(self, candle_period: str, period_span: int = 1, listener=None, history: int = 1000):
+        return self.Aggregator.add_timeframe(candle_period, period_span, listener, history)
+
+    def complete(self, candle: Candle):
+        self.Closes.append(candle.Close)
+
+        for indicator in self.Indicators.values():
+            indicator.add(candle.Close)
+
+    def register(self, key, indicator):
+        for close in self.Closes:
+            indicator.add(close)
+
+        self.Indicators[key] = indicator
+        return indicator
+
+    def clear_candles(self):
+        self.Indicators = {}
+        self.Closes.clear()
+        self.PreloadedCandle = None
+        self.Aggregator.reset()
+
+    def preload_candles(self, candle_count: int, preload_end_time, api_key: str, api_secret_key: str):
+        if self.CandleLoader is None:
+            return
+
+        candles = self.CandleLoader(self.Symbol, self.CandlePeriod, self.PeriodSpan, candle_count, preload_end_time)
+        self.preload(candles)
+
+    def preload(self, candles):
+        for (open_price, high, low, close) in candles:
+            self.PreloadedCandle = Candle(None, open_price, high, low, close)
+            self.complete(self.PreloadedCandle)
+
+    def ema(self, period: float):
+        indicator = self.Indicators.get(('EMA', period))
+
+        if indicator is None:
+            indicator = self.register(('EMA', period), EmaIndicator(period))
+
+        return indicator.Value
+
+    def rsi(self, period: float):
+        indicator = self.Indicators.get(('RSI', period))
+
+        if indicator is None:
+            indicator = self.register(('RSI', period), RsiIndicator(period))
+
+        return indicator.Value
+
+    def open(self):
+        return self.CurrentCandle.Open if self.CurrentCandle is not None else 0.0
+
+    def prev_open(self):
+        return self.PreviousCandle.Open if self.PreviousCandle is not None else 0.0
+
+    def prev_high(self):
+        return self.PreviousCandle.High if self.PreviousCandle is not None else 0.0
+
+    def prev_low(self):
+        return self.PreviousCandle.Low if self.PreviousCandle is not None else 0.0
+
+    def prev_close(self):
+        return self.PreviousCandle.Close if self.PreviousCandle is not None else 0.0
@@ -1,7 +1,8 @@
 import datetime
+import functools
 import os
+import signal
 import traceback
-import uuid
 
 import AlgorumQuantClient.algorum_types
 import golden_crossover_quant_strategy
@@ -10,10 +11,94 @@ import support_resistance_quant_strategy
 import rsi_quant_strategy
 import gapup_quant_strategy
 import index_futures_trend_quant_strategy
+import latency_histogram
+import risk_engine
+import strategy_supervisor
+
+STRATEGIES = {
+    'golden_crossover': golden_crossover_quant_strategy.GoldenCrossoverQuantStrategy,
+    'trend_reversal': trend_reversal_quant_strategy.TrendReversalQuantStrategy,
+    'support_resistance': support_resistance_quant_strategy.SupportResistanceQuantStrategy,
+    'rsi': rsi_quant_strategy.RSIQuantStrategy,
+    'gapup': gapup_quant_strategy.GapUpQuantStrategy,
+    'index_futures_trend': index_futures_trend_quant_strategy.IndexFuturesTrendQuantStrategy
+}
+
+
+# Runs one strategy until it exits. Raises when it fails, so that the supervisor can restart it. A strategy has only
+# finished when its backtest reached 100% or the engine told it to stop; client.wait() also returns when the
+# connection drops. Strategy constructors log their own errors and leave them in InitError, which fails the run.
+def run_strategy(strategy_class, url, apikey, launchmode, sid, user_id,
+                 bk_api_key, bk_api_secret_key, client_code, password, two_factor_auth, sampling_time,
+                 brokerage_platform, start_date, end_date):
+    strategy_url = url + '?sid=' + sid + '&apiKey=' + apikey + '&launchMode=' + launchmode
+    print('URL: ' + strategy_url)
+
+    client = strategy_class(
+        strategy_url,
+        apikey,
+        launchmode,
+        sid,
+        user_id
+    )
 
-if __name__ == '__main__':
-    client = None
+    try:
+        if getattr(client, 'InitError', None) is not None:
+            raise RuntimeError('Strategy ' + sid + ' failed to start')
+
+        strategy_supervisor.watch_stop(client)
+
+        # Backtesting mode
+        if launchmode == AlgorumQuantClient.algorum_types.StrategyLaunchMode.Backtesting:
+            backtestRequest = AlgorumQuantClient.algorum_types.BacktestRequest(
+                start_date, end_date, sid, bk_api_key, bk_api_secret_key,
+                client_code, password, two_factor_auth, sampling_time, brokerage_platform,
+                strategy_class.Capital)
+            client.backtest(backtestRequest)
+        else:
+            tradingRequest = AlgorumQuantClient.algorum_types.TradingRequest(
+                bk_api_key, bk_api_secret_key,
+                client_code, password, two_factor_auth, sampling_time, brokerage_platform,
+                strategy_class.Capital)
+            client.start_trading(tradingRequest)
 
+        client.wait()
+
+        if not client.StopRequested and \
+                not (launchmode == AlgorumQuantClient.algorum_types.StrategyLaunchMode.Backtesting and
+                     client.ProgressPercent >= 100):
+            raise RuntimeError('Strategy ' + sid + ' disconnected before it finished')
+    except Exception:
+        error = traceback.format_exc()
+
+        # The connection to the engine may be what failed
+        try:
+            client.log(AlgorumQuantClient.algorum_types.LogLevel.Error, error)
+        except Exception:
+            print(error)
+
+        raise
+    finally:
+        # A constructor that failed part-way leaves some of these unset
+        events = getattr(client, 'Events', None)
+
+        if events is not None:
+            # Let the event loop run what is still queued before the latencies are printed
+            events.close()
+            print('Event loop: ' + str(events.stats()))
+
+        if getattr(client, 'Latency', None) is not None:
+            print(client.Latency.format_table())
+
+        if getattr(client, 'Risk', None) is not None:
+            print('Risk engine: ' + str(client.Risk.snapshot()))
+
+        # Ship whatever is still queued in the log sink before the strategy goes away
+        if getattr(client, 'LogSink', None) is not None:
+            client.LogSink.close()
+
+
+if __name__ == '__main__':
     try:
         if 'url' in os.environ:
             url = os.environ['url']
@@ -91,20 +176,6 @@ if __name__ == '__main__':
         else:
             sampling_time = 60
 
-        url += '?sid=' + sid + '&apiKey=' + apikey + '&launchMode=' + launchmode
-
-        print('URL: ' + url)
-        print('User Id: ' + user_id)
-
-        # Golden crossover quant strategy
-        client = golden_crossover_quant_strategy.GoldenCrossoverQuantStrategy(
-            url,
-            apikey,
-            launchmode,
-            sid,
-            user_id
-        )
-
         if 'brokeragePlatform' in os.environ:
             brokerage_platform = os.environ['brokeragePlatform']
         else:
@@ -113,6 +184,9 @@ if __name__ == '__main__':
         if brokerage_platform is None or brokerage_platform == '':
             brokerage_platform = AlgorumQuantClient.algorum_types.BrokeragePlatform.NorthEast
 
+        startDate = None
+        endDate = None
+
         # Backtesting mode
         if launchmode == AlgorumQuantClient.algorum_types.StrategyLaunchMode.Backtesting:
             if 'startDate' in os.environ:
@@ -131,23 +205,51 @@ if __name__ == '__main__':
             if endDate is None or endDate == '':
                 endDate = datetime.datetime.strptime('01-04-2021', '%d-%m-%Y')
 
-            backtestRequest = AlgorumQuantClient.algorum_types.BacktestRequest(
-                startDate, endDate, sid, bk_api_key, bk_api_secret_key,
-                client_code, password, two_factor_auth, sampling_time, brokerage_platform,
-                golden_crossover_quant_strategy.GoldenCrossoverQuantStrategy.Capital)
-            client.backtest(backtestRequest)
+        # Comma separated names of the strategies to run, e.g. 'rsi,gapup,support_resistance'
+        if 'strategies' in os.environ:
+            strategy_names = os.environ['strategies']
         else:
-            tradingRequest = AlgorumQuantClient.algorum_types.TradingRequest(
-                bk_api_key, bk_api_secret_key,
-                client_code, password, two_factor_auth, sampling_time, brokerage_platform,
-                golden_crossover_quant_strategy.GoldenCrossoverQuantStrategy.Capital)
-            client.start_trading(tradingRequest)
+            strategy_names = None
+
+        if strategy_names is None or strategy_names == '':
+            strategy_names = 'golden_crossover'
+
+        strategy_names = [name.strip() for name in strategy_names.split(',')]
+
+        if 'maxRestarts' in os.environ:
+            max_restarts = int(os.environ['maxRestarts'])
+        else:
+            max_restarts = 3
+
+        # Pre-trade limits of the live strategies of this process, e.g. maxGrossExposure=300000 (see risk_engine)
+        risk_engine.configure(risk_engine.RiskLimits.from_environ(os.environ))
+
+        print('User Id: ' + user_id)
+
+        # kill -USR1 <pid> prints the stage latency histograms of every running strategy
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: print(latency_histogram.format_all()))
+
+        supervisor = strategy_supervisor.StrategySupervisor(max_restarts)
+
+        for name in strategy_names:
+            # Every strategy needs its own strategy id when several of them share this process
+            if len(strategy_names) == 1:
+                strategy_sid = sid
+            else:
+                strategy_sid = sid + '-' + name
+
+            supervisor.add(name, functools.partial(
+                run_strategy, STRATEGIES[name], url, apikey, launchmode, strategy_sid, user_id,
+                bk_api_key, bk_api_secret_key, client_code, password, two_factor_auth, sampling_time,
+                brokerage_platform, startDate, endDate))
+
+        statuses = supervisor.run()
+
+        for name, status in statuses.items():
+            print('Strategy ' + name + ' exited with status ' + status)
 
-        client.wait()
         print('Main strategy thread exited')
     except Exception:
         print(traceback.format_exc())
 
-        if client is not None:
-            client.log(AlgorumQuantClient.algorum_types.LogLevel.Error, traceback.format_exc())
-
@@ -0,0 +1,546 @@
+import argparse
+import asyncio
+import base64
+import datetime
+import hashlib
+import json
+import struct
+import time
+import urllib.parse
+import uuid
+
+import AlgorumQuantClient.algorum_types
+import candle_cache
+import latency_histogram
+import local_indicator_evaluator
+import synthetic_market
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+
+# Minimal RFC 6455 server side framing: the handshake, masked client frames (with fragmentation, ping and close) and
+# unmasked server frames. Enough for the websocket-client connection QuantEngineClient opens.
+def handshake_response(key: str) -> bytes:
+    accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+    return ('HTTP/1.1 101 Switching Protocols\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            'Sec-WebSocket-Accept: ' + accept + '\r\n\r\n').encode()
+
+
+def encode_frame(payload: bytes, opcode: int = OPCODE_TEXT) -> bytes:
+    length = len(payload)
+
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+
+    return header + payload
+
+
+def unmask(payload: bytes, mask: bytes) -> bytes:
+    length = len(payload)
+
+    if length == 0:
+        return payload
+
+    key = (mask * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, 'little') ^ int.from_bytes(key, 'little')).to_bytes(length, 'little')
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    (first, second) = await reader.readexactly(2)
+    length = second & 0x7F
+
+    if length == 126:
+        (length,) = struct.unpack('!H', await reader.readexactly(2))
+    elif length == 127:
+        (length,) = struct.unpack('!Q', await reader.readexactly(8))
+
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+
+    if mask is not None:
+        payload = unmask(payload, mask)
+
+    return bool(first & 0x80), first & 0x0F, payload
+
+
+class EngineStats(object):
+    def __init__(self):
+        self.TicksSent = 0
+        self.TicksAcked = 0
+        self.OrdersPlaced = 0
+        self.OrdersFilled = 0
+        self.Requests = {}
+        self.TickAckLatency = latency_histogram.LatencyHistogram()
+        self.RequestLatency = latency_histogram.LatencyHistogram()
+
+
+# One connected strategy. Requests are answered in arrival order; ticks are streamed by a separate task at the
+# configured rate, keeping at most max_in_flight ticks unacknowledged, and fills are sent fill_latency seconds after
+# place_order. Indicator evaluators run in the server on the ticks it streams, so an indicator query answers for
+# the candles up to the last tick sent.
+class EngineSession(object):
+    def __init__(self, engine, reader, writer, sid):
+        self.Engine = engine
+        self.Reader = reader
+        self.Writer = writer
+        self.Sid = sid
+        self.CorId = 0
+        self.Symbols = []
+        self.Evaluators = {}
+        self.EvaluatorsByTicker = {}
+        self.LastPrices = {}
+        self.LastTickDict = None
+        self.InFlight = {}
+        self.AckEvent = asyncio.Event()
+        self.PendingOrders = {}
+        self.StreamTask = None
+        self.Stats = EngineStats()
+        self.Closed = False
+
+    def next_cor_id(self):
+        self.CorId += 1
+        return self.CorId
+
+    def send(self, name, message_type, cor_id, json_data, error=None):
+        if self.Closed:
+            return
+
+        message = json.dumps({
+            'Name': name,
+            'MessageType': message_type,
+            'CorId': cor_id,
+            'JsonData': json_data,
+            'Error': error
+        })
+        self.Writer.write(encode_frame(message.encode()))
+
+    def respond(self, message, json_data='null'):
+        self.send(message['Name'], AlgorumQuantClient.algorum_types.AlgorumMessageType.Response, message['CorId'],
+                  json_data)
+
+    async def run(self):
+        fragments = []
+
+        try:
+            while True:
+                (fin, opcode, payload) = await read_frame(self.Reader)
+
+                if opcode == OPCODE_CLOSE:
+                    self.Writer.write(encode_frame(payload[:2], OPCODE_CLOSE))
+                    break
+                elif opcode == OPCODE_PING:
+                    self.Writer.write(encode_frame(payload, OPCODE_PONG))
+                    continue
+                elif opcode == OPCODE_PONG:
+                    continue
+
+                fragments.append(payload)
+
+                if not fin:
+                    continue
+
+                message = json.loads(b''.join(fragments).decode())
+                fragments = []
+                self.dispatch(message)
+                await self.Writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.Closed = True
+
+            if self.StreamTask is not None:
+                self.StreamTask.cancel()
+
+            self.Writer.close()
+            self.Engine.report(self)
+
+    def dispatch(self, message):
+        message_type = message['MessageType']
+        name = message['Name']
+        self.Stats.Requests[name] = self.Stats.Requests.get(name, 0) + 1
+
+        if message_type == AlgorumQuantClient.algorum_types.AlgorumMessageType.Response:
+            sent = self.InFlight.pop(message['CorId'], None)
+
+            if sent is not None:
+                self.Stats.TickAckLatency.record(time.perf_counter_ns() - sent)
+                self.Stats.TicksAcked += 1
+                self.AckEvent.set()
+
+            return
+
+        if message_type == AlgorumQuantClient.algorum_types.AlgorumMessageType.Oneway:
+            if name == 'log' and self.Engine.Verbose:
+                print(self.Sid + ': ' + json.loads(message['JsonData'])['Message'])
+
+            return
+
+        started = time.perf_counter_ns()
+        handler = getattr(self, 'handle_' + name, None)
+        json_data = handler(message, json.loads(message['JsonData'] or 'null')) if handler is not None else 'null'
+
+        if json_data is not None:
+            self.respond(message, json_data)
+
+        self.Stats.RequestLatency.record(time.perf_counter_ns() - started)
+
+    def handle_sub_symbols(self, message, symbols):
+        self.Symbols.extend(symbols)
+        return 'null'
+
+    def handle_get_data(self, message, key):
+        return self.Engine.Data.get((self.Sid, key), 'null')
+
+    def handle_set_data(self, message, quant_data):
+        self.Engine.Data[(self.Sid, quant_data['Key'])] = quant_data['Value']
+        return 'null'
+
+    def handle_get_holidays(self, message, exchange):
+        return '[]'
+
+    def handle_create_indicator_evaluator(self, message, request):
+        uid = uuid.uuid4().hex
+        evaluator = self.Engine.EvaluatorFactory(AlgorumQuantClient.algorum_types.CreateIndicatorRequest(
+            AlgorumQuantClient.algorum_types.TradeSymbol(**request['Symbol']), request['CandlePeriod'],
+            request['PeriodSpan']))
+        self.Evaluators[uid] = evaluator
+        self.EvaluatorsByTicker.setdefault(request['Symbol']['Ticker'], []).append(evaluator)
+        return json.dumps(uid)
+
+    def handle_clear_indicator_candles(self, message, uid):
+        self.Evaluators[uid].clear_candles()
+        return 'null'
+
+    def handle_preload_candles(self, message, request):
+        preload_end_time = datetime.datetime.fromisoformat(request['PreloadEndTime'].rstrip('Z'))
+        self.Evaluators[request['IndicatorUid']].preload_candles(request['CandleCount'], preload_end_time, None, None)
+        return 'null'
+
+    def handle_get_indicators(self, message, request):
+        evaluator = self.Evaluators[request['IndicatorUid']]
+        return json.dumps([self.Engine.evaluate(evaluator, indicator) for indicator in request['IndicatorRequests']])
+
+    def handle_backtest(self, message, request):
+        start_date = datetime.datetime.fromisoformat(request['StartDate'].rstrip('Z')).date()
+        end_date = datetime.datetime.fromisoformat(request['EndDate'].rstrip('Z')).date()
+        days = sum(1 for offset in range((end_date - start_date).days + 1)
+                   if (start_date + datetime.timedelta(days=offset)).weekday() < 5)
+        self.start_streaming(start_date, max(1, min(days, self.Engine.Days)), True)
+        return 'null'
+
+    def handle_start_trading(self, message, request):
+        self.start_streaming(datetime.date.today(), self.Engine.Days, False)
+        return 'null'
+
+    def handle_place_order(self, message, request):
+        order_id = uuid.uuid4().hex
+        self.PendingOrders[order_id] = request
+        self.Stats.OrdersPlaced += 1
+        asyncio.get_event_loop().call_later(self.Engine.FillLatency, self.fill_order, order_id)
+        return json.dumps(order_id)
+
+    def handle_cancel_order(self, message, order_id):
+        return json.dumps(self.PendingOrders.pop(order_id, None) is not None)
+
+    def fill_order(self, order_id):
+        request = self.PendingOrders.pop(order_id, None)
+
+        if request is None or self.Closed:
+            return
+
+        timestamp = self.LastTickDict['Timestamp'] if self.LastTickDict is not None else request['Timestamp']
+        order = {
+            'OrderId': order_id,
+            'Tag': request['Tag'],
+            'Symbol': request['Symbol'],
+            'OrderDirection': request['OrderDirection'],
+            'OrderType': request['OrderType'],
+            'Exchange': request['TradeExchange'],
+            'Status': AlgorumQuantClient.algorum_types.OrderStatus.Completed,
+            'Quantity': request['Quantity'],
+            'FilledQuantity': request['Quantity'],
+            'PendingQuantity': 0.0,
+            'CancelledQuantity': 0.0,
+            'Price': request['Price'],
+            'TriggerPrice': request['TriggerPrice'],
+            'AveragePrice': self.LastPrices.get(request['Symbol']['Ticker'], request['Price']),
+            'OrderTimestamp': timestamp,
+            'ExchangeTimestamp': timestamp,
+            'SlippageType': request['SlippageType'],
+            'Slippage': request['Slippage'],
+            'Validity': request['Validity']
+        }
+        self.send('order_update', AlgorumQuantClient.algorum_types.AlgorumMessageType.Request, self.next_cor_id(),
+                  json.dumps(order))
+        self.Stats.OrdersFilled += 1
+
+    def start_streaming(self, start_date, days, backtesting):
+        if self.StreamTask is None:
+            self.StreamTask = asyncio.ensure_future(self.stream(start_date, days, backtesting))
+
+    async def stream(self, start_date, days, backtesting):
+        ticks = self.Engine.generate_ticks(self.Symbols, start_date, days)
+        rate = self.Engine.TickRate
+        max_in_flight = self.Engine.MaxInFlight
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        index = 0
+
+        while index < len(ticks) and not self.Closed:
+            window = max_in_flight - len(self.InFlight) if max_in_flight > 0 else len(ticks)
+
+            if window <= 0:
+                self.AckEvent.clear()
+                await self.AckEvent.wait()
+                continue
+
+            if rate > 0:
+                allowed = int((loop.time() - started) * rate) - index
+
+                if allowed <= 0:
+                    await asyncio.sleep(0.001)
+                    continue
+            else:
+                allowed = len(ticks)
+
+            for tick_data in ticks[index:index + min(allowed, window, 1000)]:
+                index += 1
+                self.send_tick(tick_data, backtesting and index == len(ticks))
+
+            await self.Writer.drain()
+
+        # Wait for the last acknowledgements before telling the client to stop
+        while len(self.InFlight) > 0 and not self.Closed:
+            self.AckEvent.clear()
+            await self.AckEvent.wait()
+
+        self.send('stop', AlgorumQuantClient.algorum_types.AlgorumMessageType.Request, self.next_cor_id(), 'null')
+
+    def send_tick(self, tick_data, last_tick):
+        ticker = tick_data.Symbol.Ticker
+        self.LastPrices[ticker] = tick_data.LTP
+
+        for evaluator in self.EvaluatorsByTicker.get(ticker, ()):
+            evaluator.add_tick(tick_data)
+
+        tick_dict = {
+            'Symbol': tick_data.SymbolDict,
+            'Date': tick_data.Date,
+            'Timestamp': tick_data.Timestamp,
+            'LTP': tick_data.LTP,
+            'LTQ': tick_data.LTQ,
+            'Bid': tick_data.Bid,
+            'Ask': tick_data.Ask,
+            'LastTick': last_tick,
+            'OpenInterest': tick_data.OpenInterest
+        }
+        self.LastTickDict = tick_dict
+
+        cor_id = self.next_cor_id()
+        self.InFlight[cor_id] = time.perf_counter_ns()
+        self.send('tick', AlgorumQuantClient.algorum_types.AlgorumMessageType.Request, cor_id, json.dumps(tick_dict))
+        self.Stats.TicksSent += 1
+
+
+# Local stand-in for the Algorum quant engine websocket API, for end to end load tests of the unmodified client
+# path: subscribe, tick streaming, indicators, place_order with order updates, get_data/set_data and logging.
+# Ticks come from synthetic_market for every subscribed symbol (all symbols follow the same path) and are streamed at
+# tick_rate ticks per second (0 streams as fast as the client acknowledges). Key/value data is kept in memory per
+# strategy id for the lifetime of the server, so a restarted strategy finds its state.
+#
+# Indicators are served by evaluator_factory, LocalIndicatorEvaluator by default; indicators it does not implement
+# answer 0. Its preload candles come from the synthetic market, through a candle_cache.CandleCache in
+# candle_cache_directory when one is given.
+class MockQuantEngine(object):
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, tick_rate: float = 1000, fill_latency: float = 0.0,
+                 max_in_flight: int = 1000, days: int = 5,
+                 scenario: str = synthetic_market.MarketScenario.RandomWalk, seed: int = 1,
+                 evaluator_factory=None, verbose: bool = False, candle_cache_directory: str = None):
+        self.Host = host
+        self.Port = port
+        self.TickRate = tick_rate
+        self.FillLatency = fill_latency
+        self.MaxInFlight = max_in_flight
+        self.Days = days
+        self.Market = synthetic_market.SyntheticMarket(scenario, seed=seed)
+        self.Verbose = verbose
+        self.Data = {}
+        self.Sessions = []
+        self.Server = None
+        self.CandleLoader = self.Market.candle_loader
+
+        if candle_cache_directory is not None:
+            self.CandleLoader = candle_cache.CandleCache(self.Market.candle_range, candle_cache_directory)
+
+        if evaluator_factory is None:
+            evaluator_factory = self.create_evaluator
+
+        self.EvaluatorFactory = evaluator_factory
+
+    def create_evaluator(self, create_indicator_request):
+        return local_indicator_evaluator.LocalIndicatorEvaluator(create_indicator_request, self.CandleLoader)
+
+    @staticmethod
+    def evaluate(evaluator, indicator):
+        name = indicator['Indicator']
+        params = indicator['ParamMap'] or {}
+
+        if name == 'TREND':
+            if not hasattr(evaluator, 'trend'):
+                return {'Result': 0, 'ResultMap': {'strength': 0}}
+
+            (direction, strength) = evaluator.trend(params['period'])
+            return {'Result': direction, 'ResultMap': {'strength': strength}}
+
+        if name == 'SUPPORTRESISTANCE':
+            if not hasattr(evaluator, 'support_resistance'):
+                return {'Result': 0, 'ResultMap': {'support': 0, 'supportscore': 0, 'resistance': 0,
+                                                   'resistancescore': 0}}
+
+            (support, support_score, resistance, resistance_score) = evaluator.support_resistance(
+                params['period'], params['level'], params['backtrackCandles'])
+            return {'Result': 0, 'ResultMap': {'support': support, 'supportscore': support_score,
+                                               'resistance': resistance, 'resistancescore': resistance_score}}
+
+        method = getattr(evaluator, INDICATOR_METHODS.get(name, ''), None)
+
+        if method is None:
+            return {'Result': 0}
+
+        return {'Result': method(params['period']) if 'period' in params else method()}
+
+    def generate_ticks(self, symbols, start_date, days):
+        tick_lists = []
+
+        for symbol_dict in symbols:
+            ticks = self.Market.ticks(AlgorumQuantClient.algorum_types.TradeSymbol(**symbol_dict), start_date, days)
+
+            for tick_data in ticks:
+                tick_data.SymbolDict = symbol_dict
+
+            tick_lists.append(ticks)
+
+        return synthetic_market.merge_ticks(*tick_lists)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            request = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+
+        lines = request.split('\r\n')
+        headers = {}
+
+        for line in lines[1:]:
+            if ':' in line:
+                (name, value) = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        if 'sec-websocket-key' not in headers:
+            writer.write(b'HTTP/1.1 400 Bad Request\r\n\r\n')
+            writer.close()
+            return
+
+        path = lines[0].split(' ')[1] if len(lines[0].split(' ')) > 1 else '/'
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(path).query)
+        sid = query.get('sid', ['default'])[0]
+
+        writer.write(handshake_response(headers['sec-websocket-key']))
+        session = EngineSession(self, reader, writer, sid)
+        self.Sessions.append(session)
+        print('Strategy ' + sid + ' connected')
+        await session.run()
+        print('Strategy ' + sid + ' disconnected')
+
+    def report(self, session: EngineSession):
+        stats = session.Stats
+        ack = stats.TickAckLatency.summary()
+        request = stats.RequestLatency.summary()
+        print('Strategy %s: %d ticks sent, %d acked, %d orders placed, %d filled' % (
+            session.Sid, stats.TicksSent, stats.TicksAcked, stats.OrdersPlaced, stats.OrdersFilled))
+        print('  tick ack latency (us): p50 %.1f, p99 %.1f, max %.1f' % (ack['P50'], ack['P99'], ack['Max']))
+        print('  request handling (us): p50 %.1f, p99 %.1f, count %d' % (request['P50'], request['P99'],
+                                                                        request['Count']))
+        print('  requests: ' + json.dumps(stats.Requests, sort_keys=True))
+
+    # Prints the tick throughput of every connected strategy every `interval` seconds
+    async def monitor(self, interval: float):
+        previous = {}
+
+        while True:
+            await asyncio.sleep(interval)
+
+            for session in self.Sessions:
+                if session.Closed:
+                    continue
+
+                (sent, acked) = previous.get(session, (0, 0))
+                stats = session.Stats
+                print('%s: %.0f ticks/s sent, %.0f ticks/s acked, %d in flight, ack p99 %.1f ms' % (
+                    session.Sid, (stats.TicksSent - sent) / interval, (stats.TicksAcked - acked) / interval,
+                    len(session.InFlight), stats.TickAckLatency.percentile(99) / 1e6))
+                previous[session] = (stats.TicksSent, stats.TicksAcked)
+
+    async def start(self):
+        self.Server = await asyncio.start_server(self.handle_connection, self.Host, self.Port)
+        return self.Server
+
+    async def serve_forever(self, monitor_interval: float = 5.0):
+        await self.start()
+        print('Mock quant engine listening on ws://%s:%d' % (self.Host, self.Port))
+
+        if monitor_interval > 0:
+            asyncio.ensure_future(self.monitor(monitor_interval))
+
+        async with self.Server:
+            await self.Server.serve_forever()
+
+
+INDICATOR_METHODS = {
+    'EMA': 'ema',
+    'RSI': 'rsi',
+    'OPEN': 'open',
+    'PREVOPEN': 'prev_open',
+    'PREVHIGH': 'prev_high',
+    'PREVLOW': 'prev_low',
+    'PREVCLOSE': 'prev_close'
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local mock of the Algorum quant engine websocket API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rate', type=float, default=1000, help='ticks per second per strategy, 0 for unthrottled')
+    parser.add_argument('--fill-latency', type=float, default=0.0, help='seconds from place_order to the fill')
+    parser.add_argument('--max-in-flight', type=int, default=1000, help='unacknowledged ticks, 0 for unlimited')
+    parser.add_argument('--days', type=int, default=5, help='trading sessions of ticks to stream')
+    parser.add_argument('--scenario', default=synthetic_market.MarketScenario.RandomWalk)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--monitor-interval', type=float, default=5.0)
+    parser.add_argument('--verbose', action='store_true', help='print the log messages of the strategies')
+    parser.add_argument('--candle-cache', help='directory of an on-disk cache for preload candles')
+    args = parser.parse_args()
+
+    engine = MockQuantEngine(args.host, args.port, args.rate, args.fill_latency, args.max_in_flight, args.days,
+                             args.scenario, args.seed, verbose=args.verbose,
+                             candle_cache_directory=args.candle_cache)
+
+    try:
+        asyncio.run(engine.serve_forever(args.monitor_interval))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,289 @@
+import collections
+
+import AlgorumQuantClient.algorum_types
+import order_store
+
+# Closed orders remembered, so that late or repeated updates of an order that is already done are recognised
+CLOSED_HISTORY = 256
+
+
+class ManagedOrder(object):
+    def __init__(self, tag: str, ticker: str, direction: str, quantity: float, price: float):
+        self.Tag = tag
+        self.OrderId = None
+        self.Ticker = ticker
+        self.OrderDirection = direction
+        self.Buy = direction == AlgorumQuantClient.algorum_types.OrderDirection.Buy
+        self.Quantity = quantity
+        self.Price = price
+        self.Status = AlgorumQuantClient.algorum_types.OrderStatus.Pending
+        self.StatusMessage = None
+        self.FilledQuantity = 0.0
+        self.FilledValue = 0.0
+        self.AveragePrice = 0.0
+        self.Remaining = quantity
+        self.LastFill = 0.0
+
+
+# Position of a symbol built from fills, with the average price of what is open, the profit realised by reducing it,
+# the remaining quantity of its open buy and sell orders and the number of closed orders that did and did not fill
+class SymbolPosition(object):
+    def __init__(self):
+        self.Quantity = 0.0
+        self.AveragePrice = 0.0
+        self.RealizedPL = 0.0
+        self.OpenOrders = 0
+        self.OpenBuy = 0.0
+        self.OpenSell = 0.0
+        self.FilledOrders = 0
+        self.UnfilledOrders = 0
+
+    def fill(self, buy: bool, quantity: float, price: float):
+        signed = quantity if buy else -quantity
+
+        if self.Quantity == 0 or (self.Quantity > 0) == buy:
+            self.AveragePrice = (self.AveragePrice * abs(self.Quantity) + price * quantity) / \
+                                (abs(self.Quantity) + quantity)
+            self.Quantity += signed
+            return
+
+        closed = min(quantity, abs(self.Quantity))
+        self.RealizedPL += closed * (price - self.AveragePrice) * (1 if self.Quantity > 0 else -1)
+        self.Quantity += signed
+
+        if self.Quantity == 0:
+            self.AveragePrice = 0.0
+        elif (self.Quantity > 0) == buy:
+            self.AveragePrice = price
+
+
+# Lifecycle of the orders of a strategy State. Orders are registered with track() when they are placed and found again
+# by Tag (or by OrderId, for updates without one) through hash indexes of the open orders, so every update is applied
+# in constant time however many orders are outstanding:
+#
+#     track(request)          registers an order about to be placed, as Pending
+#     discard(tag)            forgets a tracked order that could not be placed
+#     update(order)           applies an order update and returns the ManagedOrder, with LastFill set to the quantity
+#                             this update filled; None for an update of an order that is already done
+#
+# Fills are applied as the filled quantity grows, so partial fills move the position as they come in, and an order
+# leaves the open indexes once it is Completed, Cancelled or Rejected. Updates of orders that were never tracked (e.g.
+# placed before a restart) are adopted as they arrive.
+#
+# position(), average_price(), profit(), open_orders() and has_open_orders() are views for on_tick and get_stats: they
+# read the running totals of a symbol and never walk the order history.
+#
+# The manager is not persisted with the State. from_orders() rebuilds it from State.Orders, replaying the closed orders
+# and adopting the open ones, so the strategy appends every update it applies to State.Orders.
+class OrderManager(object):
+    def __init__(self):
+        self.ByTag = {}
+        self.ByOrderId = {}
+        self.Closed = collections.OrderedDict()
+        self.Positions = {}
+
+    # Closed orders up to the point where every position was last flat are taken as totals from the columns of an
+    # order_store.OrderStore (realised profit is then sell value less buy value); only the orders after it are replayed
+    @staticmethod
+    def from_orders(orders):
+        manager = OrderManager()
+        start = 0
+
+        if isinstance(orders, order_store.OrderStore):
+            start = orders.flat_rows()
+            manager.seed(orders, start)
+
+        for index in range(start, len(orders)):
+            manager.update(orders[index])
+
+        for order in list(getattr(orders, 'Open', {}).values()):
+            manager.update(order)
+
+        return manager
+
+    def seed(self, orders: order_store.OrderStore, end: int):
+        if end == 0:
+            return
+
+        for ticker in orders.tickers():
+            position = self.symbol_position(ticker)
+            (buy_value, buy_quantity, sell_value, sell_quantity) = orders.totals(ticker, end)
+            position.RealizedPL = sell_value - buy_value
+            position.FilledOrders = orders.count(ticker, filled=True, end=end)
+            position.UnfilledOrders = orders.count(ticker, filled=False, end=end)
+
+        for index in range(max(0, end - CLOSED_HISTORY), end):
+            status = order_store.TERMINAL_STATUSES[orders.Status[index]]
+
+            for key in (orders.Tag[index], orders.OrderId[index]):
+                if key is not None:
+                    self.Closed[key] = status
+
+        while len(self.Closed) > CLOSED_HISTORY:
+            self.Closed.popitem(last=False)
+
+    def symbol_position(self, ticker: str) -> SymbolPosition:
+        position = self.Positions.get(ticker)
+
+        if position is None:
+            position = SymbolPosition()
+            self.Positions[ticker] = position
+
+        return position
+
+    def track(self, request: AlgorumQuantClient.algorum_types.PlaceOrderRequest) -> ManagedOrder:
+        return self.open(request.Tag, request.Symbol.Ticker, request.OrderDirection, request.Quantity, request.Price)
+
+    def open(self, tag: str, ticker: str, direction: str, quantity: float, price: float) -> ManagedOrder:
+        managed = ManagedOrder(tag, ticker, direction, quantity, price)
+        position = self.symbol_position(ticker)
+        position.OpenOrders += 1
+
+        if managed.Buy:
+            position.OpenBuy += quantity
+        else:
+            position.OpenSell += quantity
+
+        if tag is not None:
+            self.ByTag[tag] = managed
+
+        return managed
+
+    def find(self, order: AlgorumQuantClient.algorum_types.Order) -> ManagedOrder:
+        managed = None
+
+        if order.Tag is not None:
+            managed = self.ByTag.get(order.Tag)
+
+        if managed is None and order.OrderId is not None:
+            managed = self.ByOrderId.get(order.OrderId)
+
+        return managed
+
+    def update(self, order: AlgorumQuantClient.algorum_types.Order) -> ManagedOrder:
+        managed = self.find(order)
+
+        if managed is None:
+            if (order.Tag is not None and order.Tag in self.Closed) or \
+                    (order.OrderId is not None and order.OrderId in self.Closed):
+                return None
+
+            managed = self.open(order.Tag, order.Symbol.Ticker, order.OrderDirection,
+                                order.Quantity or order.FilledQuantity, order.Price)
+
+        if managed.OrderId is None and order.OrderId is not None:
+            managed.OrderId = order.OrderId
+            self.ByOrderId[order.OrderId] = managed
+
+        position = self.Positions[managed.Ticker]
+        filled = order.FilledQuantity or 0.0
+        managed.LastFill = 0.0
+
+        if filled > managed.FilledQuantity:
+            quantity = filled - managed.FilledQuantity
+            value = filled * order.AveragePrice if order.AveragePrice else managed.FilledValue + quantity * order.Price
+            released = min(quantity, managed.Remaining)
+            position.fill(managed.Buy, quantity, (value - managed.FilledValue) / quantity)
+
+            if managed.Buy:
+                position.OpenBuy -= released
+            else:
+                position.OpenSell -= released
+
+            managed.FilledQuantity = filled
+            managed.FilledValue = value
+            managed.AveragePrice = value / filled
+            managed.Remaining -= released
+            managed.LastFill = quantity
+
+        managed.Status = order.Status
+        managed.StatusMessage = order.StatusMessage
+
+        if order.Status in order_store.TERMINAL_STATUSES:
+            self.close(managed, position)
+
+        return managed
+
+    def close(self, managed: ManagedOrder, position: SymbolPosition):
+        position.OpenOrders -= 1
+
+        if managed.Buy:
+            position.OpenBuy -= managed.Remaining
+        else:
+            position.OpenSell -= managed.Remaining
+
+        managed.Remaining = 0.0
+
+        if managed.FilledQuantity > 0:
+            position.FilledOrders += 1
+        else:
+            position.UnfilledOrders += 1
+
+        for (index, key) in ((self.ByTag, managed.Tag), (self.ByOrderId, managed.OrderId)):
+            if key is not None:
+                index.pop(key, None)
+                self.Closed[key] = managed.Status
+
+        while len(self.Closed) > CLOSED_HISTORY:
+            self.Closed.popitem(last=False)
+
+    # Forgets an order that was tracked but never placed
+    def discard(self, tag: str):
+        managed = self.ByTag.pop(tag, None)
+
+        if managed is None:
+            return
+
+        position = self.Positions[managed.Ticker]
+        position.OpenOrders -= 1
+
+        if managed.Buy:
+            position.OpenBuy -= managed.Remaining
+        else:
+            position.OpenSell -= managed.Remaining
+
+    def get(self, tag: str) -> ManagedOrder:
+        return self.ByTag.get(tag)
+
+    def position(self, ticker: str) -> float:
+        position = self.Positions.get(ticker)
+        return position.Quantity if position is not None else 0.0
+
+    def average_price(self, ticker: str) -> float:
+        position = self.Positions.get(ticker)
+        return position.AveragePrice if position is not None else 0.0
+
+    # Realised profit of the ticker plus its open position marked at price
+    def profit(self, ticker: str, price: float) -> float:
+        position = self.Positions.get(ticker)
+
+        if position is None:
+            return 0.0
+
+        return position.RealizedPL + position.Quantity * (price - position.AveragePrice)
+
+    # Returns (filled, unfilled) counts of the closed orders of the ticker
+    def order_counts(self, ticker: str):
+        position = self.Positions.get(ticker)
+
+        if position is None:
+            return 0, 0
+
+        return position.FilledOrders, position.UnfilledOrders
+
+    def has_open_orders(self, ticker: str) -> bool:
+        position = self.Positions.get(ticker)
+        return position is not None and position.OpenOrders > 0
+
+    # Returns (open buy quantity, open sell quantity) of the ticker
+    def open_quantity(self, ticker: str):
+        position = self.Positions.get(ticker)
+
+        if position is None:
+            return 0.0, 0.0
+
+        return position.OpenBuy, position.OpenSell
+
+    def open_orders(self, ticker: str = None):
+        orders = list(self.ByTag.values()) + [managed for managed in self.ByOrderId.values() if managed.Tag is None]
+        return [managed for managed in orders if ticker is None or managed.Ticker == ticker]
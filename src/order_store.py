@@ -0,0 +1,240 @@
+import array
+import datetime
+
+import numpy
+
+import AlgorumQuantClient.algorum_types
+import compact_tick
+import tick_timestamp
+
+DIRECTIONS = [AlgorumQuantClient.algorum_types.OrderDirection.Buy,
+              AlgorumQuantClient.algorum_types.OrderDirection.Sell]
+TERMINAL_STATUSES = [AlgorumQuantClient.algorum_types.OrderStatus.Completed,
+                     AlgorumQuantClient.algorum_types.OrderStatus.Cancelled,
+                     AlgorumQuantClient.algorum_types.OrderStatus.Rejected]
+
+
+def order_epoch(timestamp) -> int:
+    if isinstance(timestamp, str) and len(timestamp) >= 19:
+        return tick_timestamp.parse(timestamp)[0]
+
+    if isinstance(timestamp, datetime.datetime):
+        return tick_timestamp.to_epoch(timestamp)
+
+    return 0
+
+
+# Order history of a strategy State kept as typed columns (timestamp, symbol id, direction, filled quantity, average
+# price, status, tag and order id) instead of a list of full Order objects. It takes the place of the State.Orders
+# list: append(), extend(), len(), iteration and indexing work as before, with indexing returning a rebuilt Order that
+# carries only the stored fields. Slicing returns another OrderStore, which is what StateJournal writes into its deltas.
+#
+# Orders that are not in a terminal status (Completed, Cancelled or Rejected) are kept whole in Open, keyed by OrderId,
+# until an update in a terminal status replaces them with a row. OpenVersion changes with every change to Open.
+#
+# Symbols are interned through compact_tick.SYMBOLS; the pickled form carries tickers and plain lists so that it stays
+# small and independent of the process.
+#
+# The columns are queried vectorized: count() and totals() aggregate the rows of a ticker and status, and flat_rows()
+# finds where every position was last flat, which lets OrderManager.from_orders take the history before it as totals.
+class OrderStore(object):
+    def __init__(self, orders=None):
+        self.Epoch = array.array('q')
+        self.SymbolId = array.array('i')
+        self.Direction = array.array('b')
+        self.FilledQuantity = array.array('d')
+        self.AveragePrice = array.array('d')
+        self.Status = array.array('b')
+        self.Tag = []
+        self.OrderId = []
+        self.Open = {}
+        self.OpenVersion = 0
+
+        if orders is not None:
+            self.extend(orders)
+
+    def append(self, order):
+        if order.Status not in TERMINAL_STATUSES:
+            self.Open[order.OrderId] = order
+            self.OpenVersion += 1
+            return
+
+        if self.Open.pop(order.OrderId, None) is not None:
+            self.OpenVersion += 1
+
+        self.Epoch.append(order_epoch(order.OrderTimestamp))
+        self.SymbolId.append(compact_tick.SYMBOLS.intern(order.Symbol))
+        self.Direction.append(DIRECTIONS.index(order.OrderDirection))
+        self.FilledQuantity.append(order.FilledQuantity or 0.0)
+        self.AveragePrice.append(order.AveragePrice or 0.0)
+        self.Status.append(TERMINAL_STATUSES.index(order.Status))
+        self.Tag.append(order.Tag)
+        self.OrderId.append(order.OrderId)
+
+    def extend(self, orders):
+        if not isinstance(orders, OrderStore):
+            for order in orders:
+                self.append(order)
+
+            return
+
+        self.Epoch.extend(orders.Epoch)
+        self.SymbolId.extend(orders.SymbolId)
+        self.Direction.extend(orders.Direction)
+        self.FilledQuantity.extend(orders.FilledQuantity)
+        self.AveragePrice.extend(orders.AveragePrice)
+        self.Status.extend(orders.Status)
+        self.Tag.extend(orders.Tag)
+        self.OrderId.extend(orders.OrderId)
+
+        for order_id in self.OrderId[len(self.OrderId) - len(orders):]:
+            self.Open.pop(order_id, None)
+
+        self.Open.update(orders.Open)
+        self.OpenVersion += 1
+
+    def __len__(self):
+        return len(self.OrderId)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.order(index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.rows(*index.indices(len(self))[:2])
+
+        if index < 0:
+            index += len(self)
+
+        if index < 0 or index >= len(self):
+            raise IndexError('order index out of range')
+
+        return self.order(index)
+
+    def order(self, index: int) -> AlgorumQuantClient.algorum_types.Order:
+        timestamp = None
+
+        if self.Epoch[index] > 0:
+            timestamp = tick_timestamp.from_epoch(self.Epoch[index]).strftime('%Y-%m-%dT%H:%M:%S')
+
+        return AlgorumQuantClient.algorum_types.Order(
+            OrderId=self.OrderId[index],
+            Tag=self.Tag[index],
+            Symbol=compact_tick.SYMBOLS.symbol(self.SymbolId[index]),
+            OrderDirection=DIRECTIONS[self.Direction[index]],
+            Status=TERMINAL_STATUSES[self.Status[index]],
+            Quantity=self.FilledQuantity[index],
+            FilledQuantity=self.FilledQuantity[index],
+            PendingQuantity=0.0,
+            AveragePrice=self.AveragePrice[index],
+            OrderTimestamp=timestamp)
+
+    # Rows start to end as a new store, carrying the open orders of this one
+    def rows(self, start: int, end: int):
+        store = OrderStore()
+        store.Epoch = self.Epoch[start:end]
+        store.SymbolId = self.SymbolId[start:end]
+        store.Direction = self.Direction[start:end]
+        store.FilledQuantity = self.FilledQuantity[start:end]
+        store.AveragePrice = self.AveragePrice[start:end]
+        store.Status = self.Status[start:end]
+        store.Tag = self.Tag[start:end]
+        store.OrderId = self.OrderId[start:end]
+        store.Open = dict(self.Open)
+        return store
+
+    # NumPy copy of a numeric column
+    def column(self, name: str) -> numpy.ndarray:
+        return numpy.array(getattr(self, name))
+
+    # Rows of the ticker (all when None) in the status (any when None) among the first `end` rows
+    def mask(self, ticker: str = None, status: str = None, end: int = None):
+        end = len(self) if end is None else end
+        mask = numpy.ones(end, dtype=bool)
+
+        if ticker is not None:
+            symbol_id = compact_tick.SYMBOLS.Ids.get(ticker)
+
+            if symbol_id is None:
+                return numpy.zeros(end, dtype=bool)
+
+            mask &= numpy.frombuffer(self.SymbolId, dtype=numpy.int32)[:end] == symbol_id
+
+        if status is not None:
+            mask &= numpy.frombuffer(self.Status, dtype=numpy.int8)[:end] == TERMINAL_STATUSES.index(status)
+
+        return mask
+
+    # Number of rows of the ticker and status; filled True or False counts only the rows that did or did not fill
+    def count(self, ticker: str = None, status: str = None, filled: bool = None, end: int = None) -> int:
+        mask = self.mask(ticker, status, end)
+
+        if filled is not None:
+            mask &= (numpy.frombuffer(self.FilledQuantity, dtype=numpy.float64)[:len(mask)] > 0) == filled
+
+        return int(numpy.count_nonzero(mask))
+
+    # Returns (buy value, buy quantity, sell value, sell quantity) of the fills of the ticker among the first `end` rows
+    def totals(self, ticker: str = None, end: int = None):
+        mask = self.mask(ticker, None, end)
+        quantity = numpy.frombuffer(self.FilledQuantity, dtype=numpy.float64)[:len(mask)][mask]
+        value = quantity * numpy.frombuffer(self.AveragePrice, dtype=numpy.float64)[:len(mask)][mask]
+        buy = numpy.frombuffer(self.Direction, dtype=numpy.int8)[:len(mask)][mask] == 0
+        return (float(value[buy].sum()), float(quantity[buy].sum()), float(value[~buy].sum()),
+                float(quantity[~buy].sum()))
+
+    def position(self, ticker: str, end: int = None) -> float:
+        (buy_value, buy_quantity, sell_value, sell_quantity) = self.totals(ticker, end)
+        return buy_quantity - sell_quantity
+
+    def tickers(self):
+        return [compact_tick.SYMBOLS.ticker(int(symbol_id))
+                for symbol_id in numpy.unique(numpy.frombuffer(self.SymbolId, dtype=numpy.int32))]
+
+    # Number of leading rows after which the filled position of every ticker was last flat, 0 when it never was
+    def flat_rows(self) -> int:
+        if len(self) == 0:
+            return 0
+
+        symbol_ids = numpy.frombuffer(self.SymbolId, dtype=numpy.int32)
+        quantity = numpy.frombuffer(self.FilledQuantity, dtype=numpy.float64)
+        signed = numpy.where(numpy.frombuffer(self.Direction, dtype=numpy.int8) == 0, quantity, -quantity)
+        flat = numpy.ones(len(self), dtype=bool)
+
+        for symbol_id in numpy.unique(symbol_ids):
+            symbol_signed = numpy.where(symbol_ids == symbol_id, signed, 0.0)
+            flat &= numpy.abs(numpy.cumsum(symbol_signed)) <= 1e-9 * numpy.cumsum(numpy.abs(symbol_signed))
+
+        rows = numpy.flatnonzero(flat)
+        return int(rows[-1]) + 1 if len(rows) > 0 else 0
+
+    def __getstate__(self):
+        symbol_ids = sorted(set(self.SymbolId))
+        symbol_index = {symbol_id: index for index, symbol_id in enumerate(symbol_ids)}
+
+        return {
+            'Tickers': [compact_tick.SYMBOLS.ticker(symbol_id) for symbol_id in symbol_ids],
+            'Epoch': self.Epoch.tolist(),
+            'SymbolIndex': [symbol_index[symbol_id] for symbol_id in self.SymbolId],
+            'Direction': self.Direction.tolist(),
+            'FilledQuantity': self.FilledQuantity.tolist(),
+            'AveragePrice': self.AveragePrice.tolist(),
+            'Status': self.Status.tolist(),
+            'Tag': self.Tag,
+            'OrderId': self.OrderId,
+            'Open': list(self.Open.values())
+        }
+
+    def __setstate__(self, state):
+        symbol_ids = [compact_tick.SYMBOLS.intern_ticker(ticker) for ticker in state['Tickers']]
+        self.Epoch = array.array('q', state['Epoch'])
+        self.SymbolId = array.array('i', [symbol_ids[index] for index in state['SymbolIndex']])
+        self.Direction = array.array('b', state['Direction'])
+        self.FilledQuantity = array.array('d', state['FilledQuantity'])
+        self.AveragePrice = array.array('d', state['AveragePrice'])
+        self.Status = array.array('b', state['Status'])
+        self.Tag = list(state['Tag'])
+        self.OrderId = list(state['OrderId'])
+        self.Open = {order.OrderId: order for order in state['Open']}
+        self.OpenVersion = 0
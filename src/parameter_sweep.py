@@ -0,0 +1,79 @@
+import concurrent.futures
+import itertools
+import os
+import traceback
+
+import local_backtest_engine
+
+# Ticks of the sweep, installed once per worker process by the pool initializer so that every parameter combination
+# replays the same loaded market data instead of reloading it
+_worker_ticks = None
+
+
+def _init_worker(ticks):
+    global _worker_ticks
+    _worker_ticks = ticks
+
+
+class SweepResult(object):
+    def __init__(self, parameters, stats, order_count, elapsed_seconds, error=None):
+        self.Parameters = parameters
+        self.Stats = stats
+        self.OrderCount = order_count
+        self.ElapsedSeconds = elapsed_seconds
+        self.Error = error
+
+
+def expand_grid(strategy_class, parameter_grid):
+    for name in parameter_grid:
+        if not hasattr(strategy_class, name):
+            raise Exception(strategy_class.__name__ + ' has no parameter ' + name)
+
+    names = list(parameter_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(parameter_grid[n] for n in names))]
+
+
+def run_combination(strategy_class, evaluator_factory, parameters, slippage_bps=0.0):
+    try:
+        swept_class = type(strategy_class.__name__, (strategy_class,), dict(parameters))
+        engine = local_backtest_engine.LocalBacktestEngine(swept_class, _worker_ticks, evaluator_factory,
+                                                           slippage_bps)
+        result = engine.run()
+        return SweepResult(parameters, result.Stats, len(result.Orders), result.ElapsedSeconds)
+    except Exception:
+        return SweepResult(parameters, None, 0, 0.0, traceback.format_exc())
+
+
+# Backtests every combination of parameter_grid (parameter name -> list of values, names being the class constants of
+# strategy_class such as RsiThreshold or TakeProfitPercent) over the same ticks on a process pool, and returns the
+# results ranked by rank_key of the final stats, best first. Failed combinations are returned last with their error.
+def sweep(strategy_class, ticks, evaluator_factory, parameter_grid, rank_key='PL', processes=None,
+          slippage_bps=0.0):
+    combinations = expand_grid(strategy_class, parameter_grid)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes or os.cpu_count(),
+                                                initializer=_init_worker,
+                                                initargs=(ticks,)) as executor:
+        futures = [executor.submit(run_combination, strategy_class, evaluator_factory, parameters, slippage_bps)
+                   for parameters in combinations]
+        results = [future.result() for future in futures]
+
+    succeeded = [r for r in results if r.Error is None]
+    failed = [r for r in results if r.Error is not None]
+    succeeded.sort(key=lambda r: r.Stats[rank_key], reverse=True)
+    return succeeded + failed
+
+
+def format_table(results, rank_key='PL'):
+    lines = []
+
+    for rank, result in enumerate(results, 1):
+        params = ', '.join(str(k) + '=' + str(v) for k, v in result.Parameters.items())
+
+        if result.Error is None:
+            lines.append(str(rank) + '. ' + params + ' -> ' + rank_key + ' ' + str(result.Stats[rank_key]) +
+                         ', orders ' + str(result.OrderCount))
+        else:
+            lines.append(str(rank) + '. ' + params + ' -> failed: ' + result.Error.strip().splitlines()[-1])
+
+    return '\n'.join(lines)
@@ -0,0 +1,68 @@
+import time
+
+import AlgorumQuantClient.algorum_types
+import jsonpickle
+
+import tick_timestamp
+
+
+# Coalesces backtest progress. update() is called on every tick in place of send_progress_async and costs a little
+# arithmetic and a clock read; progress (with the stats of the strategy) is published only when the tick time has
+# moved another percent_step percent through the backtest range or interval seconds of wall time have passed since
+# the last report, whichever comes first. Either cadence can be turned off with 0. The last tick always goes to the
+# client's own send_progress_async, which reports 100% and ends the backtest as before. As that closes the connection,
+# the log sink of the client is flushed first and ships the final records (the stats logged on the way) itself.
+class ProgressReporter(object):
+    def __init__(self, client, percent_step: float = 1.0, interval: float = 1.0):
+        self.Client = client
+        self.PercentStep = percent_step
+        self.Interval = interval
+        self.StartEpoch = None
+        self.PercentScale = 0.0
+        self.NextPercent = 0.0
+        self.NextTime = 0.0
+        self.Reports = 0
+
+    def start(self):
+        self.StartEpoch = tick_timestamp.to_epoch(self.Client.BacktestStartDate)
+        span = tick_timestamp.to_epoch(self.Client.BacktestEndDate) - self.StartEpoch
+        self.PercentScale = 100.0 / span if span > 0 else 0.0
+        self.NextPercent = self.PercentStep if self.PercentStep > 0 else float('inf')
+        self.NextTime = time.monotonic() + self.Interval if self.Interval > 0 else float('inf')
+
+    def update(self, tick_data: AlgorumQuantClient.algorum_types.TickData):
+        if tick_data.LastTick:
+            log_sink = getattr(self.Client, 'LogSink', None)
+
+            if log_sink is not None:
+                log_sink.ship_inline()
+
+            self.Reports += 1
+            self.Client.send_progress_async(tick_data)
+            return
+
+        if self.StartEpoch is None:
+            self.start()
+
+        percent = (tick_timestamp.stamp(tick_data).Epoch - self.StartEpoch) * self.PercentScale
+
+        if percent >= self.NextPercent or time.monotonic() >= self.NextTime:
+            self.report(min(max(percent, 0.0), 99.9), tick_data)
+
+    def report(self, percent: float, tick_data: AlgorumQuantClient.algorum_types.TickData):
+        if self.PercentStep > 0:
+            self.NextPercent = (percent // self.PercentStep + 1) * self.PercentStep
+
+        if self.Interval > 0:
+            self.NextTime = time.monotonic() + self.Interval
+
+        self.Reports += 1
+        self.Client.ProgressPercent = percent
+        self.Client.send_async(AlgorumQuantClient.algorum_types.AlgorumWebsocketMessage(
+            'publish_progress',
+            AlgorumQuantClient.algorum_types.AlgorumMessageType.Oneway,
+            self.Client.CorIdCounter.increment(),
+            jsonpickle.encode(percent, False), None))
+        self.Client.publish_stats(self.Client.get_stats(tick_data))
+
+        print('>>>>>>>>> Progress: %.1f' % percent)
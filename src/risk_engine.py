@@ -0,0 +1,270 @@
+import threading
+
+import AlgorumQuantClient.algorum_types
+
+# Environment variables read by RiskLimits.from_environ, by limit
+LIMIT_VARIABLES = {
+    'MaxGrossExposure': 'maxGrossExposure',
+    'MaxNetExposure': 'maxNetExposure',
+    'MaxSymbolPosition': 'maxSymbolPosition',
+    'MaxOrderValue': 'maxOrderValue',
+    'MaxOpenOrders': 'maxOpenOrders',
+    'MaxOrders': 'maxOrders'
+}
+
+
+# Limits of a RiskEngine, None leaving a limit off. Exposures and order values are quantity times the last known price
+# of a symbol, positions are in units and apply to each symbol on its own.
+class RiskLimits(object):
+    def __init__(self, max_gross_exposure: float = None, max_net_exposure: float = None,
+                 max_symbol_position: float = None, max_order_value: float = None, max_open_orders: int = None,
+                 max_orders: int = None, min_quantity: float = 0.0):
+        self.MaxGrossExposure = max_gross_exposure
+        self.MaxNetExposure = max_net_exposure
+        self.MaxSymbolPosition = max_symbol_position
+        self.MaxOrderValue = max_order_value
+        self.MaxOpenOrders = max_open_orders
+        self.MaxOrders = max_orders
+        self.MinQuantity = min_quantity
+
+    @staticmethod
+    def from_environ(environ):
+        limits = RiskLimits()
+
+        for name, variable in LIMIT_VARIABLES.items():
+            value = environ.get(variable)
+
+            if value is not None and value != '':
+                setattr(limits, name, int(value) if name in ('MaxOpenOrders', 'MaxOrders') else float(value))
+
+        return limits
+
+
+class SymbolExposure(object):
+    def __init__(self):
+        self.Position = 0.0
+        self.PendingBuy = 0.0
+        self.PendingSell = 0.0
+        self.Price = 0.0
+        self.Gross = 0.0
+        self.Net = 0.0
+
+
+class PendingOrder(object):
+    def __init__(self, ticker: str, buy: bool, quantity: float):
+        self.Ticker = ticker
+        self.Buy = buy
+        self.Remaining = quantity
+        self.Filled = 0.0
+
+
+# Pre-trade checks of the orders of every strategy that shares the engine, kept in memory and updated incrementally:
+# a check or an order update touches one symbol and adjusts the totals by its change, so neither depends on the number
+# of symbols or orders.
+#
+#     check(request)           called before place_order; returns None when the order may go out, with its Quantity
+#                              trimmed to what the limits leave room for, or the reason it is rejected
+#     on_order_update(order)   called with every order update; moves filled quantity from pending to position and
+#                              releases what is left of an order once it is completed, cancelled or rejected
+#     release(tag)             releases an order that was checked but never placed
+#
+# Pending orders count against the limits from the moment they pass a check, so strategies on other threads can't
+# jointly overshoot them before the fills come back. A symbol is valued at the price of its last checked order or
+# fill, and its gross exposure is that of the larger of its long (position plus pending buys) and short (position
+# minus pending sells) worst cases. Orders that only bring the worst case position of their side back towards zero
+# always pass, so exits are never blocked.
+class RiskEngine(object):
+    def __init__(self, limits: RiskLimits = None):
+        self.Limits = limits if limits is not None else RiskLimits()
+        self.Symbols = {}
+        self.Pending = {}
+        self.Gross = 0.0
+        self.Net = 0.0
+        self.OrderCount = 0
+        self.Trims = 0
+        self.Rejections = 0
+        self.Lock = threading.Lock()
+
+    def exposure(self, ticker: str) -> SymbolExposure:
+        exposure = self.Symbols.get(ticker)
+
+        if exposure is None:
+            exposure = SymbolExposure()
+            self.Symbols[ticker] = exposure
+
+        return exposure
+
+    # Adjusts the totals after the position, pending quantities or price of a symbol changed
+    def revalue(self, exposure: SymbolExposure):
+        long = exposure.Position + exposure.PendingBuy
+        short = exposure.Position - exposure.PendingSell
+        gross = max(abs(long), abs(short)) * exposure.Price
+        net = (long - exposure.PendingSell) * exposure.Price
+        self.Gross += gross - exposure.Gross
+        self.Net += net - exposure.Net
+        exposure.Gross = gross
+        exposure.Net = net
+
+    def check(self, request: AlgorumQuantClient.algorum_types.PlaceOrderRequest):
+        buy = request.OrderDirection == AlgorumQuantClient.algorum_types.OrderDirection.Buy
+        quantity = request.Quantity
+        price = request.Price
+
+        with self.Lock:
+            exposure = self.exposure(request.Symbol.Ticker)
+
+            if price > 0 and price != exposure.Price:
+                exposure.Price = price
+                self.revalue(exposure)
+
+            # Worst case position of the side of the order, signed so that the order moves it up
+            base = exposure.Position + exposure.PendingBuy if buy else exposure.PendingSell - exposure.Position
+
+            if base < 0 and quantity <= -base:
+                reason = None
+            else:
+                (quantity, reason) = self.room(exposure, buy, base, quantity, price)
+
+            if reason is not None:
+                self.Rejections += 1
+                return reason
+
+            if quantity < request.Quantity:
+                self.Trims += 1
+                request.Quantity = quantity
+
+            self.Pending[request.Tag] = PendingOrder(request.Symbol.Ticker, buy, quantity)
+            self.OrderCount += 1
+
+            if buy:
+                exposure.PendingBuy += quantity
+            else:
+                exposure.PendingSell += quantity
+
+            self.revalue(exposure)
+
+        return None
+
+    # Quantity the limits leave room for, and the reason when that is none
+    def room(self, exposure: SymbolExposure, buy: bool, base: float, quantity: float, price: float):
+        limits = self.Limits
+
+        if limits.MaxOrders is not None and self.OrderCount >= limits.MaxOrders:
+            return 0.0, 'order count at limit %d' % limits.MaxOrders
+
+        if limits.MaxOpenOrders is not None and len(self.Pending) >= limits.MaxOpenOrders:
+            return 0.0, 'open orders at limit %d' % limits.MaxOpenOrders
+
+        allowed = quantity
+        binding = None
+
+        if limits.MaxSymbolPosition is not None and limits.MaxSymbolPosition - base < allowed:
+            allowed = limits.MaxSymbolPosition - base
+            binding = 'position %s at limit %s' % (exposure.Position, limits.MaxSymbolPosition)
+
+        if price > 0:
+            if limits.MaxOrderValue is not None and limits.MaxOrderValue / price < allowed:
+                allowed = limits.MaxOrderValue / price
+                binding = 'order value at limit %s' % limits.MaxOrderValue
+
+            if limits.MaxGrossExposure is not None:
+                room = (limits.MaxGrossExposure - self.Gross + exposure.Gross) / price - base
+
+                if room < allowed:
+                    allowed = room
+                    binding = 'gross exposure %s at limit %s' % (self.Gross, limits.MaxGrossExposure)
+
+            if limits.MaxNetExposure is not None:
+                room = (limits.MaxNetExposure - (self.Net if buy else -self.Net)) / price
+
+                if room < allowed:
+                    allowed = room
+                    binding = 'net exposure %s at limit %s' % (self.Net, limits.MaxNetExposure)
+
+        if allowed <= 0 or (allowed < quantity and allowed < limits.MinQuantity):
+            return 0.0, binding if binding is not None else 'quantity %s' % quantity
+
+        return allowed, None
+
+    def on_order_update(self, order: AlgorumQuantClient.algorum_types.Order):
+        with self.Lock:
+            pending = self.Pending.get(order.Tag)
+
+            if pending is None:
+                return
+
+            exposure = self.Symbols[pending.Ticker]
+            filled = order.FilledQuantity or 0.0
+
+            if filled > pending.Filled:
+                delta = filled - pending.Filled
+                released = min(delta, pending.Remaining)
+                pending.Filled = filled
+                pending.Remaining -= released
+
+                if pending.Buy:
+                    exposure.Position += delta
+                    exposure.PendingBuy -= released
+                else:
+                    exposure.Position -= delta
+                    exposure.PendingSell -= released
+
+                if order.AveragePrice:
+                    exposure.Price = order.AveragePrice
+
+            if order.Status in (AlgorumQuantClient.algorum_types.OrderStatus.Completed,
+                                AlgorumQuantClient.algorum_types.OrderStatus.Cancelled,
+                                AlgorumQuantClient.algorum_types.OrderStatus.Rejected):
+                self.unreserve(order.Tag, exposure)
+            else:
+                self.revalue(exposure)
+
+    def release(self, tag: str):
+        with self.Lock:
+            pending = self.Pending.get(tag)
+
+            if pending is not None:
+                self.unreserve(tag, self.Symbols[pending.Ticker])
+
+    def unreserve(self, tag: str, exposure: SymbolExposure):
+        pending = self.Pending.pop(tag)
+
+        if pending.Buy:
+            exposure.PendingBuy -= pending.Remaining
+        else:
+            exposure.PendingSell -= pending.Remaining
+
+        self.revalue(exposure)
+
+    def snapshot(self):
+        with self.Lock:
+            return {
+                'Gross Exposure': self.Gross,
+                'Net Exposure': self.Net,
+                'Open Orders': len(self.Pending),
+                'Order Count': self.OrderCount,
+                'Trims': self.Trims,
+                'Rejections': self.Rejections,
+                'Positions': dict((ticker, exposure.Position) for ticker, exposure in self.Symbols.items())
+            }
+
+
+# The engine shared by the live strategies of this process
+_shared = RiskEngine()
+
+
+def configure(limits: RiskLimits):
+    _shared.Limits = limits
+
+
+def shared() -> RiskEngine:
+    return _shared
+
+
+# Live strategies share one engine, as they trade the same account; a backtest replays its own market and gets an
+# engine of its own with the shared limits
+def for_client(client) -> RiskEngine:
+    if client.LaunchMode == AlgorumQuantClient.algorum_types.StrategyLaunchMode.Backtesting:
+        return RiskEngine(_shared.Limits)
+
+    return _shared
@@ -0,0 +1,208 @@
+import datetime
+import traceback
+
+import AlgorumQuantClient.algorum_types
+import tick_timestamp
+
+# NSE cash and F&O session
+SESSION_OPEN = datetime.time(9, 15)
+SESSION_CLOSE = datetime.time(15, 30)
+SESSION_SECONDS = (SESSION_CLOSE.hour * 60 + SESSION_CLOSE.minute - SESSION_OPEN.hour * 60 - SESSION_OPEN.minute) * 60
+
+
+def time_seconds(t: datetime.time) -> int:
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+# Holidays come from the engine as dates, datetimes, ISO strings or objects with a Date field
+def holiday_date(holiday):
+    if isinstance(holiday, dict):
+        holiday = holiday.get('Date', holiday.get('date', holiday.get('HolidayDate')))
+
+    if isinstance(holiday, datetime.datetime):
+        return holiday.date()
+
+    if isinstance(holiday, datetime.date):
+        return holiday
+
+    if isinstance(holiday, str) and len(holiday) >= 10:
+        try:
+            return datetime.date.fromisoformat(holiday[:10])
+        except ValueError:
+            return None
+
+    return None
+
+
+class Session(object):
+    def __init__(self, day: datetime.date, day_epoch: int, open_epoch: int, close_epoch: int, trading: bool):
+        self.Day = day
+        self.DayEpoch = day_epoch
+        self.Open = open_epoch
+        self.Close = close_epoch
+        self.NextDay = day_epoch + tick_timestamp.SECONDS_PER_DAY
+        self.Trading = trading
+
+
+# Trading days and session times of an exchange: weekdays that are not holidays, open from session_open to
+# session_close. Sessions are built once per day, for a whole backtest range by precompute() or on the first tick of a
+# day otherwise, and looked up by day epoch. A day without a session (a weekend or holiday) still gets a Session with
+# Trading False, so that ticks the exchange does send on such a day (e.g. a special session) are classified as well.
+class SessionCalendar(object):
+    def __init__(self, holidays=(), session_open: datetime.time = SESSION_OPEN,
+                 session_close: datetime.time = SESSION_CLOSE):
+        self.Holidays = set(day for day in (holiday_date(holiday) for holiday in holidays) if day is not None)
+        self.OpenSeconds = time_seconds(session_open)
+        self.CloseSeconds = time_seconds(session_close)
+        self.Sessions = {}
+
+    def is_trading_day(self, day: datetime.date) -> bool:
+        return day.weekday() < 5 and day not in self.Holidays
+
+    def day_session(self, day: datetime.date) -> Session:
+        day_epoch = tick_timestamp.to_epoch(datetime.datetime.combine(day, datetime.time()))
+        session = self.Sessions.get(day_epoch)
+
+        if session is None:
+            session = Session(day, day_epoch, day_epoch + self.OpenSeconds, day_epoch + self.CloseSeconds,
+                              self.is_trading_day(day))
+            self.Sessions[day_epoch] = session
+
+        return session
+
+    def session(self, epoch: int) -> Session:
+        session = self.Sessions.get(epoch - epoch % tick_timestamp.SECONDS_PER_DAY)
+
+        if session is None:
+            session = self.day_session(tick_timestamp.from_epoch(epoch).date())
+
+        return session
+
+    def precompute(self, start_date: datetime.datetime, end_date: datetime.datetime):
+        day = start_date.date()
+
+        while day <= end_date.date():
+            self.day_session(day)
+            day += datetime.timedelta(days=1)
+
+    def session_days(self, start: datetime.date, end: datetime.date):
+        days = []
+        day = start
+
+        while day <= end:
+            if self.is_trading_day(day):
+                days.append(day)
+
+            day += datetime.timedelta(days=1)
+
+        return days
+
+    # The trading day count trading days before day
+    def sessions_before(self, day: datetime.date, count: int) -> datetime.date:
+        while count > 0:
+            day -= datetime.timedelta(days=1)
+
+            if self.is_trading_day(day):
+                count -= 1
+
+        return day
+
+    def clock(self, window_start: datetime.time = None, window_end: datetime.time = None):
+        return SessionClock(self, window_start, window_end)
+
+
+# Classifies the ticks of one stream against a SessionCalendar. update() compares the tick epoch with the next
+# boundary (the session open or close, a window edge or the next midnight) and does nothing else until a tick crosses
+# it; then the session state is recomputed and the hooks of the crossed boundaries run, each with the tick that
+# crossed it:
+#
+#     on_day_change(tick_data, session, previous)   first tick of a day; previous is None for the first tick seen
+#     on_session_open(tick_data, session)           first tick at or after the open
+#     on_session_close(tick_data, session)          first tick at or after the close
+#
+# InSession and InWindow tell whether the last tick was inside the session and inside the window_start to window_end
+# part of it (the whole session by default; a window may also reach outside the session).
+class SessionClock(object):
+    def __init__(self, calendar: SessionCalendar, window_start: datetime.time = None,
+                 window_end: datetime.time = None):
+        self.Calendar = calendar
+        self.WindowStart = time_seconds(window_start) if window_start is not None else calendar.OpenSeconds
+        self.WindowEnd = time_seconds(window_end) if window_end is not None else calendar.CloseSeconds
+        self.Session = None
+        self.Opened = False
+        self.Closed = False
+        self.InSession = False
+        self.InWindow = False
+        self.NextBoundary = -1
+        self.DayChangeListeners = []
+        self.SessionOpenListeners = []
+        self.SessionCloseListeners = []
+
+    def on_day_change(self, listener):
+        self.DayChangeListeners.append(listener)
+
+    def on_session_open(self, listener):
+        self.SessionOpenListeners.append(listener)
+
+    def on_session_close(self, listener):
+        self.SessionCloseListeners.append(listener)
+
+    def update(self, tick_data: AlgorumQuantClient.algorum_types.TickData):
+        epoch = tick_data.Epoch
+
+        if epoch >= self.NextBoundary:
+            self.advance(tick_data, epoch)
+
+    # Picks up from the last tick of a restored state without running any hooks
+    def resume(self, epoch: int):
+        self.Session = self.Calendar.session(epoch)
+        self.Opened = epoch >= self.Session.Open
+        self.Closed = epoch >= self.Session.Close
+        self.classify(epoch)
+
+    def advance(self, tick_data: AlgorumQuantClient.algorum_types.TickData, epoch: int):
+        session = self.Session
+
+        if session is None or epoch >= session.NextDay:
+            previous = session
+            session = self.Calendar.session(epoch)
+            self.Session = session
+            self.Opened = False
+            self.Closed = False
+
+            for listener in self.DayChangeListeners:
+                listener(tick_data, session, previous)
+
+        if not self.Opened and epoch >= session.Open:
+            self.Opened = True
+
+            for listener in self.SessionOpenListeners:
+                listener(tick_data, session)
+
+        if not self.Closed and epoch >= session.Close:
+            self.Closed = True
+
+            for listener in self.SessionCloseListeners:
+                listener(tick_data, session)
+
+        self.classify(epoch)
+
+    def classify(self, epoch: int):
+        session = self.Session
+        window_start = session.DayEpoch + self.WindowStart
+        window_end = session.DayEpoch + self.WindowEnd
+        self.InSession = session.Open <= epoch < session.Close
+        self.InWindow = window_start <= epoch < window_end
+        self.NextBoundary = min([boundary for boundary in (session.Open, session.Close, window_start, window_end)
+                                 if boundary > epoch] + [session.NextDay])
+
+
+# Calendar of the holidays the engine reports for exchange; without them every weekday is a trading day
+def for_client(client, exchange: str = AlgorumQuantClient.algorum_types.TradeExchange.NSE) -> SessionCalendar:
+    try:
+        holidays = client.get_holidays(exchange) or []
+    except Exception:
+        client.log(AlgorumQuantClient.algorum_types.LogLevel.Error, traceback.format_exc())
+        holidays = []
+
+    return SessionCalendar(holidays)
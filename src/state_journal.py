@@ -0,0 +1,139 @@
+import threading
+import uuid
+
+import jsonpickle
+
+
+# Persists a strategy State through the engine key/value store as a snapshot plus an append-only series of deltas.
+#
+# The snapshot lives under `key` and every delta under `key.<seq>`. A delta carries only the State fields whose
+# encoding changed since the last write and the orders appended to State.Orders since then (a slice of State.Orders,
+# which for an order_store.OrderStore also carries its open orders), so the cost of a save no longer grows with the
+# order history. Once the deltas of a generation add up to compact_ratio times the size of its snapshot (or max_deltas
+# deltas, or when Orders is replaced) a fresh snapshot is written under a new journal id, which keeps the amortized
+# cost of compaction constant per write. Deltas left over from an older generation carry the old id and stop the
+# replay.
+class StateJournal(object):
+    def __init__(self, client, key: str = 'state', compact_ratio: float = 1.0, max_deltas: int = 1000):
+        self.Client = client
+        self.Key = key
+        self.CompactRatio = compact_ratio
+        self.MaxDeltas = max_deltas
+        self.JournalId = None
+        self.Seq = 0
+        self.SnapshotSize = 0
+        self.JournalSize = 0
+        self.PersistedFields = {}
+        self.PersistedOrderCount = 0
+        self.PersistedOrders = None
+        self.PersistedOpenVersion = None
+        self.Lock = threading.Lock()
+
+    def load(self):
+        snapshot_str = self.Client.get_data(self.Key)
+
+        if snapshot_str is None:
+            return None
+
+        snapshot = jsonpickle.decode(snapshot_str)
+
+        # State saved before the journal existed was encoded without type information and cannot be restored
+        if not isinstance(snapshot, dict) or 'JournalId' not in snapshot:
+            return None
+
+        state = snapshot['State']
+        seq = snapshot['Seq']
+        journal_size = 0
+
+        while True:
+            delta_str = self.Client.get_data(self.Key + '.' + str(seq + 1))
+
+            if delta_str is None:
+                break
+
+            delta = jsonpickle.decode(delta_str)
+            journal_size += len(delta_str)
+
+            if delta['JournalId'] != snapshot['JournalId'] or delta['Seq'] != seq + 1:
+                break
+
+            for name, value_str in delta['Fields'].items():
+                setattr(state, name, jsonpickle.decode(value_str))
+
+            state.Orders.extend(delta['Orders'])
+            seq += 1
+
+        self.JournalId = snapshot['JournalId']
+        self.Seq = seq
+        self.SnapshotSize = len(snapshot_str)
+        self.JournalSize = journal_size
+        self.remember(state)
+        return state
+
+    # A save that finds nothing changed since the last one writes nothing
+    def save(self, state):
+        with self.Lock:
+            self.write(state)
+
+    def write(self, state):
+        if self.JournalId is None or \
+                state.Orders is not self.PersistedOrders or \
+                len(state.Orders) < self.PersistedOrderCount or \
+                self.Seq >= self.MaxDeltas or \
+                self.JournalSize > self.SnapshotSize * self.CompactRatio:
+            self.compact(state)
+            return
+
+        fields = {}
+
+        for name, value in vars(state).items():
+            if name == 'Orders':
+                continue
+
+            value_str = jsonpickle.encode(value)
+
+            if self.PersistedFields.get(name) != value_str:
+                fields[name] = value_str
+
+        new_orders = state.Orders[self.PersistedOrderCount:]
+        open_version = getattr(state.Orders, 'OpenVersion', None)
+
+        if len(fields) == 0 and len(new_orders) == 0 and open_version == self.PersistedOpenVersion:
+            return
+
+        seq = self.Seq + 1
+        delta_str = jsonpickle.encode({
+            'JournalId': self.JournalId,
+            'Seq': seq,
+            'Fields': fields,
+            'Orders': new_orders
+        })
+        self.Client.set_data(self.Key + '.' + str(seq), delta_str)
+
+        self.Seq = seq
+        self.JournalSize += len(delta_str)
+        self.PersistedFields.update(fields)
+        self.PersistedOrderCount = len(state.Orders)
+        self.PersistedOpenVersion = open_version
+
+    def compact(self, state):
+        journal_id = uuid.uuid4().hex
+        snapshot_str = jsonpickle.encode({
+            'JournalId': journal_id,
+            'Seq': 0,
+            'State': state
+        })
+        self.Client.set_data(self.Key, snapshot_str)
+
+        self.JournalId = journal_id
+        self.Seq = 0
+        self.SnapshotSize = len(snapshot_str)
+        self.JournalSize = 0
+        self.remember(state)
+
+    def remember(self, state):
+        self.PersistedFields = {name: jsonpickle.encode(value) for name, value in vars(state).items()
+                                if name != 'Orders'}
+        self.PersistedOrders = state.Orders
+        self.PersistedOrderCount = len(state.Orders)
+        self.PersistedOpenVersion = getattr(state.Orders, 'OpenVersion', None)
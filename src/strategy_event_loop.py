@@ -0,0 +1,130 @@
+import collections
+import threading
+import time
+import traceback
+
+import AlgorumQuantClient.algorum_types
+
+TICK = 'tick'
+ORDER_UPDATE = 'order_update'
+
+# Seconds between checks that the worker is still alive while a tick post waits for on_tick
+TICK_WAIT = 1.0
+
+
+# Single writer for the State of a strategy: on_tick and on_order_update, which the client calls from its tick and
+# message threads, are posted to one queue and run one at a time by one worker thread, so handlers read and change the
+# State without locks. The queue is a deque, which the worker pops without a lock of ours; posts take a lock only to
+# append against close(). The worker only waits on an event while the queue is empty.
+#
+# A tick post returns once on_tick has run, so the client still acknowledges a tick after handling it and the flow
+# control of the engine is unchanged. An order update post returns at once; the update runs after the tick in hand.
+#
+# depth() and MaxDepth are the current and largest number of queued events, Handled the number run. The strategy's
+# LatencyRecorder gets the time events wait in the queue (loop.wait) and the time their handlers take (loop.tick,
+# loop.order_update).
+#
+# close() queues a stop behind what is already posted and waits for the worker to run it. Events posted once close()
+# has started are dropped and counted in Dropped, as nothing is left to run them; a tick post returns as well when the
+# worker is gone.
+#
+# Clients with InlineEvents set (the local backtest engine, which calls both handlers from its replay thread) keep
+# their handlers as they are and get no worker.
+class StrategyEventLoop(object):
+    def __init__(self, client, name: str = None):
+        self.Client = client
+        self.Latency = client.Latency
+        self.Inline = getattr(client, 'InlineEvents', False)
+        self.Queue = collections.deque()
+        self.Wakeup = threading.Event()
+        self.TickDone = threading.Event()
+        self.MaxDepth = 0
+        self.Handled = 0
+        self.Dropped = 0
+        self.Closing = False
+        self.Lock = threading.Lock()
+        self.Handlers = {TICK: client.on_tick, ORDER_UPDATE: client.on_order_update}
+        self.Thread = None
+
+        if not self.Inline:
+            client.on_tick = self.post_tick
+            client.on_order_update = self.post_order_update
+            self.Thread = threading.Thread(target=self.run, name=name or type(client).__name__ + '-events',
+                                           daemon=True)
+            self.Thread.start()
+
+    def depth(self) -> int:
+        return len(self.Queue)
+
+    # Returns whether the event was queued for the worker
+    def post(self, kind: str, argument) -> bool:
+        if self.Thread is None:
+            self.Handlers[kind](argument)
+            return False
+
+        with self.Lock:
+            if self.Closing:
+                self.Dropped += 1
+                return False
+
+            self.Queue.append((kind, argument, time.perf_counter_ns()))
+
+        self.Wakeup.set()
+        return True
+
+    # Ticks only come from the client's tick thread, so one event is enough to wait on
+    def post_tick(self, tick_data: AlgorumQuantClient.algorum_types.TickData):
+        self.TickDone.clear()
+
+        if not self.post(TICK, tick_data):
+            return
+
+        while not self.TickDone.wait(TICK_WAIT):
+            if not self.Thread.is_alive():
+                break
+
+    def post_order_update(self, order: AlgorumQuantClient.algorum_types.Order):
+        self.post(ORDER_UPDATE, order)
+
+    def run(self):
+        while True:
+            try:
+                (kind, argument, posted) = self.Queue.popleft()
+            except IndexError:
+                self.Wakeup.wait()
+                self.Wakeup.clear()
+                continue
+
+            if kind is None:
+                break
+
+            self.MaxDepth = max(self.MaxDepth, len(self.Queue) + 1)
+            started = time.perf_counter_ns()
+            self.Latency.record('loop.wait', started - posted)
+
+            try:
+                self.Handlers[kind](argument)
+            except Exception:
+                self.Client.log(AlgorumQuantClient.algorum_types.LogLevel.Error, traceback.format_exc())
+
+            self.Latency.lap('loop.' + kind, started)
+            self.Handled += 1
+
+            if kind == TICK:
+                self.TickDone.set()
+
+    # Runs what is already queued and stops the worker
+    def close(self, timeout: float = 5.0):
+        if self.Thread is None:
+            return
+
+        with self.Lock:
+            if not self.Closing:
+                self.Closing = True
+                self.Queue.append((None, None, 0))
+
+        self.Wakeup.set()
+        self.Thread.join(timeout)
+
+    def stats(self):
+        return {'Depth': self.depth(), 'Max Depth': self.MaxDepth, 'Handled': self.Handled, 'Dropped': self.Dropped}
@@ -0,0 +1,89 @@
+import threading
+import time
+import traceback
+
+
+class StrategyStatus:
+    Running = 'Running'
+    Restarting = 'Restarting'
+    Completed = 'Completed'
+    Failed = 'Failed'
+
+
+# Lets run_strategy tell a stop sent by the engine from a dropped connection, as both end client.wait(): the stop
+# handler of the client is wrapped to set client.StopRequested first
+def watch_stop(client):
+    stop_handler = client.MessageHandlerMap['stop']
+    client.StopRequested = False
+
+    def on_stop(algorum_websocket_message):
+        client.StopRequested = True
+        stop_handler(algorum_websocket_message)
+
+    client.add_message_handler('stop', on_stop)
+
+
+class SupervisedStrategy(object):
+    def __init__(self, name, launcher):
+        self.Name = name
+        self.Launcher = launcher
+        self.Status = None
+        self.Restarts = 0
+        self.LastError = None
+        self.Thread = None
+
+
+# Runs several strategies side by side, each on its own thread. A launcher is a callable that starts one strategy and
+# blocks until it exits; a launcher that raises is restarted up to max_restarts times, restart_delay seconds apart.
+class StrategySupervisor(object):
+    def __init__(self, max_restarts: int = 3, restart_delay: float = 5.0):
+        self.MaxRestarts = max_restarts
+        self.RestartDelay = restart_delay
+        self.Strategies = []
+        self.Lock = threading.Lock()
+
+    def add(self, name, launcher):
+        self.Strategies.append(SupervisedStrategy(name, launcher))
+
+    def supervise(self, strategy: SupervisedStrategy):
+        while True:
+            self.set_status(strategy, StrategyStatus.Running)
+
+            try:
+                strategy.Launcher()
+                self.set_status(strategy, StrategyStatus.Completed)
+                return
+            except Exception:
+                strategy.LastError = traceback.format_exc()
+                print('Strategy ' + strategy.Name + ' failed')
+                print(strategy.LastError)
+
+            if strategy.Restarts >= self.MaxRestarts:
+                self.set_status(strategy, StrategyStatus.Failed)
+                return
+
+            strategy.Restarts += 1
+            self.set_status(strategy, StrategyStatus.Restarting)
+            time.sleep(self.RestartDelay)
+
+    def set_status(self, strategy: SupervisedStrategy, status: str):
+        with self.Lock:
+            strategy.Status = status
+
+        print('Strategy ' + strategy.Name + ': ' + status + ' (restarts ' + str(strategy.Restarts) + ')')
+
+    # Starts every strategy and waits for all of them, returning name -> final status
+    def run(self):
+        for strategy in self.Strategies:
+            strategy.Thread = threading.Thread(target=self.supervise, args=(strategy,), name=strategy.Name,
+                                               daemon=True)
+            strategy.Thread.start()
+
+        for strategy in self.Strategies:
+            strategy.Thread.join()
+
+        return self.statuses()
+
+    def statuses(self):
+        with self.Lock:
+            return {strategy.Name: strategy.Status for strategy in self.Strategies}
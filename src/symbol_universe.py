@@ -0,0 +1,49 @@
+import order_manager
+
+# Per-symbol slots of a strategy trading a basket of symbols from a single instance. Every slot owns the State,
+# indicator evaluator, state journal, order manager and (when the strategy uses them) session clock and bar scheduler
+# of one symbol, and ticks and order updates are routed to the slot of their symbol by ticker. The order manager is
+# not part of the persisted State and is rebuilt from its orders.
+
+
+class SymbolSlot(object):
+    def __init__(self, symbol, state, evaluator, state_journal, clock=None, scheduler=None):
+        self.Symbol = symbol
+        self.State = state
+        self.OrderManager = order_manager.OrderManager.from_orders(state.Orders)
+        self.Evaluator = evaluator
+        self.StateJournal = state_journal
+        self.Clock = clock
+        self.Scheduler = scheduler
+
+
+class SymbolUniverse(object):
+    def __init__(self):
+        self.Slots = {}
+        self.Primary = None
+
+    def add(self, slot: SymbolSlot):
+        self.Slots[slot.Symbol.Ticker] = slot
+
+        if self.Primary is None:
+            self.Primary = slot
+
+    def get(self, ticker: str) -> SymbolSlot:
+        return self.Slots.get(ticker)
+
+    def symbols(self):
+        return [slot.Symbol for slot in self.Slots.values()]
+
+    def __iter__(self):
+        return iter(self.Slots.values())
+
+    def __len__(self):
+        return len(self.Slots)
+
+
+# A single-symbol strategy keeps persisting under the original 'state' key
+def state_key(ticker: str, symbol_count: int) -> str:
+    if symbol_count == 1:
+        return 'state'
+
+    return 'state.' + ticker
@@ -0,0 +1,169 @@
+import datetime
+import heapq
+import math
+import random
+
+import AlgorumQuantClient.algorum_types
+import candle_aggregator
+import local_indicator_evaluator
+import tick_timestamp
+
+SESSION_OPEN = candle_aggregator.SESSION_OPEN
+SESSION_CLOSE = candle_aggregator.SESSION_CLOSE
+SESSION_SECONDS = candle_aggregator.SESSION_SECONDS
+
+
+# Price shapes that exercise the entry logic of the sample strategies
+class MarketScenario:
+    RandomWalk = 'random_walk'
+    Trend = 'trend'  # Alternating up and down legs, for the EMA crossover and trend strategies
+    GapUp = 'gap_up'  # Every session opens above the previous session high and fades
+    SupportBounce = 'support_bounce'  # Oscillates inside a band, turning at support and resistance
+    RsiDip = 'rsi_dip'  # Random walk with regular sharp sell-offs and recoveries
+
+
+# Deterministic generator of NSE-session ticks (09:15 to 15:30, weekdays) for one symbol. The same seed and arguments
+# always produce the same ticks, so benchmark runs and backtests over synthetic data are comparable between versions.
+class SyntheticMarket(object):
+    def __init__(self, scenario: str = MarketScenario.RandomWalk, price: float = 400.0, volatility: float = 0.0008,
+                 tick_seconds: int = 15, seed: int = 1):
+        self.Scenario = scenario
+        self.Price = price
+        self.Volatility = volatility
+        self.TickSeconds = tick_seconds
+        self.Seed = seed
+
+    def session_days(self, start_date: datetime.date, days: int):
+        day = start_date
+
+        while days > 0:
+            if day.weekday() < 5:
+                yield day
+                days -= 1
+
+            day += datetime.timedelta(days=1)
+
+    # Returns (datetime, price) pairs
+    def prices(self, start_date: datetime.date, days: int):
+        rng = random.Random(self.Seed)
+        vol = self.Volatility
+        price = self.Price
+        session_ticks = SESSION_SECONDS // self.TickSeconds
+        prev_high = None
+        tick_index = 0
+
+        for day in self.session_days(start_date, days):
+            session_open = datetime.datetime.combine(day, SESSION_OPEN)
+
+            if self.Scenario == MarketScenario.GapUp and prev_high is not None:
+                price = max(price * 1.01, prev_high * 1.005)
+
+            center = price
+            day_high = price
+
+            for i in range(session_ticks):
+                noise = rng.gauss(0.0, vol)
+
+                if self.Scenario == MarketScenario.Trend:
+                    # Legs of 500 ticks (a little over 2 hours at 15 second ticks)
+                    drift = vol * 0.4 if (tick_index // 500) % 2 == 0 else -vol * 0.4
+                    price *= math.exp(drift + noise)
+                elif self.Scenario == MarketScenario.GapUp:
+                    price *= math.exp(-vol * 0.05 + noise)
+                elif self.Scenario == MarketScenario.SupportBounce:
+                    target = center * (1.0 + 0.008 * math.sin(2 * math.pi * 3 * i / session_ticks))
+                    price += 0.05 * (target - price) + price * noise * 0.5
+                elif self.Scenario == MarketScenario.RsiDip:
+                    phase = tick_index % 400
+                    drift = -vol * 3 if phase < 40 else (vol * 3 if phase < 80 else 0.0)
+                    price *= math.exp(drift + noise)
+                else:
+                    price *= math.exp(noise)
+
+                day_high = max(day_high, price)
+                tick_index += 1
+                yield session_open + datetime.timedelta(seconds=i * self.TickSeconds), price
+
+            prev_high = day_high
+
+    def ticks(self, symbol: AlgorumQuantClient.algorum_types.TradeSymbol, start_date: datetime.date, days: int):
+        ticks = []
+
+        for (dt, price) in self.prices(start_date, days):
+            timestamp = dt.strftime('%Y-%m-%dT%H:%M:%S')
+            ltp = round(price, 2)
+            ticks.append(AlgorumQuantClient.algorum_types.TickData(
+                symbol, timestamp[0:10], timestamp, ltp, 100.0, round(ltp - 0.05, 2), round(ltp + 0.05, 2), False,
+                0.0))
+
+        return ticks
+
+    # Completed (open, high, low, close) candles of candle_seconds, in time order
+    def candles(self, start_date: datetime.date, days: int, candle_seconds: int, end: datetime.datetime = None):
+        candles = []
+        bucket = None
+
+        for (dt, price) in self.prices(start_date, days):
+            if end is not None and dt >= end:
+                break
+
+            current_bucket = tick_timestamp.to_epoch(dt) // candle_seconds
+
+            if current_bucket != bucket:
+                bucket = current_bucket
+                candles.append([price, price, price, price])
+            else:
+                candle = candles[-1]
+                candle[1] = max(candle[1], price)
+                candle[2] = min(candle[2], price)
+                candle[3] = price
+
+        return [tuple(candle) for candle in candles]
+
+    # A candle_loader for LocalIndicatorEvaluator: serves preload_candles from sessions generated to end at
+    # preload_end_time. They are a separate path of the same scenario, not the history leading into ticks().
+    def candle_loader(self, symbol, candle_period, period_span, candle_count, preload_end_time):
+        candle_seconds = local_indicator_evaluator.CANDLE_SECONDS[candle_period] * period_span
+        candles_per_day = max(1, SESSION_SECONDS // candle_seconds)
+        days = candle_count // candles_per_day + 2
+        start_date = preload_end_time.date() - datetime.timedelta(days=days * 7 // 5 + 3)
+        candles = self.candles(start_date, days * 2 + 3, candle_seconds, preload_end_time)
+        return candles[-candle_count:]
+
+    # A candle fetcher for candle_cache: (epoch, open, high, low, close, volume) rows for start <= time < end. Every
+    # session is generated on its own, opening at the base price with a seed derived from its date, so the candles of
+    # a day do not depend on how a range is split into fetches.
+    def candle_range(self, symbol, candle_period, period_span, start: datetime.datetime, end: datetime.datetime):
+        rows = []
+        start_epoch = tick_timestamp.to_epoch(start)
+        end_epoch = tick_timestamp.to_epoch(end)
+        day = start.date()
+
+        while day <= end.date():
+            if day.weekday() < 5:
+                session = SyntheticMarket(self.Scenario, self.Price, self.Volatility, self.TickSeconds,
+                                          self.Seed * 1000003 + day.toordinal())
+                timeframe = candle_aggregator.Timeframe(candle_period, period_span, history=None)
+
+                for (dt, price) in session.prices(day, 1):
+                    epoch = tick_timestamp.to_epoch(dt)
+
+                    if start_epoch <= epoch < end_epoch:
+                        timeframe.add(epoch, price)
+
+                candles = list(timeframe.History)
+
+                if timeframe.Current is not None:
+                    candles.append(timeframe.Current)
+
+                rows.extend((candle.Bucket, candle.Open, candle.High, candle.Low, candle.Close, candle.Volume)
+                            for candle in candles)
+
+            day += datetime.timedelta(days=1)
+
+        return rows
+
+
+# Merges the tick lists of several symbols into one time ordered stream
+def merge_ticks(*tick_lists):
+    return list(heapq.merge(*tick_lists, key=lambda tick_data: tick_data.Timestamp))
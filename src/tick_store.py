@@ -0,0 +1,337 @@
+import argparse
+import csv
+import datetime
+import os
+import tempfile
+
+import jsonpickle
+import numpy
+
+import AlgorumQuantClient.algorum_types
+import candle_cache
+import tick_timestamp
+
+TICK_DTYPE = numpy.dtype([
+    ('Epoch', '<i8'),
+    ('LTP', '<f8'),
+    ('LTQ', '<f8'),
+    ('Bid', '<f8'),
+    ('Ask', '<f8'),
+    ('OpenInterest', '<f8')
+])
+
+MINUTES_PER_DAY = tick_timestamp.SECONDS_PER_DAY // 60
+
+
+def day_epoch(day: datetime.date) -> int:
+    return tick_timestamp.to_epoch(datetime.datetime.combine(day, datetime.time()))
+
+
+def write_atomic(path: str, array: numpy.ndarray):
+    (fd, temp_path) = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            numpy.save(f, array)
+
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        raise
+
+
+# Ticks of one or more symbols in time order, backed by NumPy arrays (memory-mapped store files when it holds a
+# single symbol-day). TickData objects are only created as ticks are indexed or iterated, with Epoch, DateTime and
+# TickDate already set, so a replay does no timestamp parsing. It can be passed to LocalBacktestEngine in place of a
+# list of ticks, and arrays() hands the epoch and LTP columns to vectorized_backtest without creating any objects.
+class TickSequence(object):
+    ChunkSize = 4096
+
+    def __init__(self, rows: numpy.ndarray, symbols, symbol_index: numpy.ndarray = None):
+        self.Rows = rows
+        self.Symbols = symbols
+        self.SymbolIndex = symbol_index
+        self.Days = {}
+
+    def __len__(self):
+        return len(self.Rows)
+
+    def arrays(self):
+        return self.Rows['Epoch'], self.Rows['LTP']
+
+    def slice(self, start: int, end: int):
+        symbol_index = self.SymbolIndex[start:end] if self.SymbolIndex is not None else None
+        return TickSequence(self.Rows[start:end], self.Symbols, symbol_index)
+
+    # Ticks from start_epoch up to and including end_epoch (either may be None)
+    def between(self, start_epoch: int = None, end_epoch: int = None):
+        epochs = self.Rows['Epoch']
+        start = int(numpy.searchsorted(epochs, start_epoch, 'left')) if start_epoch is not None else 0
+        end = int(numpy.searchsorted(epochs, end_epoch, 'right')) if end_epoch is not None else len(epochs)
+        return self.slice(start, end)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.slice(*index.indices(len(self))[:2])
+
+        if index < 0:
+            index += len(self)
+
+        if index < 0 or index >= len(self):
+            raise IndexError('tick index out of range')
+
+        symbol = self.Symbols[int(self.SymbolIndex[index]) if self.SymbolIndex is not None else 0]
+        return self.tick(symbol, self.Rows[index].tolist())
+
+    def __iter__(self):
+        for start in range(0, len(self.Rows), self.ChunkSize):
+            rows = self.Rows[start:start + self.ChunkSize].tolist()
+
+            if self.SymbolIndex is None:
+                symbol = self.Symbols[0]
+
+                for row in rows:
+                    yield self.tick(symbol, row)
+            else:
+                for (row, index) in zip(rows, self.SymbolIndex[start:start + self.ChunkSize].tolist()):
+                    yield self.tick(self.Symbols[index], row)
+
+    def tick(self, symbol, row) -> AlgorumQuantClient.algorum_types.TickData:
+        (epoch, ltp, ltq, bid, ask, open_interest) = row
+        seconds = epoch % tick_timestamp.SECONDS_PER_DAY
+        day = self.Days.get(epoch - seconds)
+
+        if day is None:
+            tick_date = tick_timestamp.from_epoch(epoch - seconds).date()
+            day = (tick_date, tick_date.isoformat())
+            self.Days[epoch - seconds] = day
+
+        (tick_date, date_str) = day
+        hour = seconds // 3600
+        minute = seconds // 60 % 60
+        second = seconds % 60
+
+        tick_data = AlgorumQuantClient.algorum_types.TickData(
+            symbol, date_str, '%sT%02d:%02d:%02d' % (date_str, hour, minute, second), ltp, ltq, bid, ask, False,
+            open_interest)
+        tick_data.Epoch = epoch
+        tick_data.DateTime = datetime.datetime(tick_date.year, tick_date.month, tick_date.day, hour, minute, second)
+        tick_data.TickDate = tick_date
+        return tick_data
+
+
+# Historical ticks on disk, one file per symbol and day: <directory>/<symbol>/<YYYY-MM-DD>.npy holds the ticks of the
+# day as fixed-width TICK_DTYPE rows sorted by time, and <YYYY-MM-DD>.idx.npy the offset of the first tick of every
+# minute of the day (MINUTES_PER_DAY + 1 entries), which locates any time range with one lookup and a short binary
+# search. Day files are opened with mmap, so reading a day is a zero-copy view whose pages load on first access.
+# Files are replaced atomically, and the symbol itself is kept in <directory>/<symbol>/symbol.json.
+class TickStore(object):
+    def __init__(self, directory: str):
+        self.Directory = directory
+
+    def symbol_directory(self, symbol) -> str:
+        return os.path.join(self.Directory, candle_cache.symbol_key(symbol))
+
+    def day_path(self, symbol, day: datetime.date) -> str:
+        return os.path.join(self.symbol_directory(symbol), day.isoformat() + '.npy')
+
+    def index_path(self, symbol, day: datetime.date) -> str:
+        return os.path.join(self.symbol_directory(symbol), day.isoformat() + '.idx.npy')
+
+    def symbols(self):
+        symbols = []
+
+        if not os.path.isdir(self.Directory):
+            return symbols
+
+        for name in sorted(os.listdir(self.Directory)):
+            path = os.path.join(self.Directory, name, 'symbol.json')
+
+            if os.path.exists(path):
+                with open(path) as f:
+                    symbols.append(jsonpickle.decode(f.read()))
+
+        return symbols
+
+    def days(self, symbol):
+        directory = self.symbol_directory(symbol)
+
+        if not os.path.isdir(directory):
+            return []
+
+        return sorted(datetime.date.fromisoformat(name[:10]) for name in os.listdir(directory)
+                      if name.endswith('.npy') and not name.endswith('.idx.npy'))
+
+    # Adds ticks (a TICK_DTYPE array, in any order) to the day file, merging with what is already stored
+    def write_day(self, symbol, day: datetime.date, rows: numpy.ndarray):
+        directory = self.symbol_directory(symbol)
+        os.makedirs(directory, exist_ok=True)
+        symbol_path = os.path.join(directory, 'symbol.json')
+
+        if not os.path.exists(symbol_path):
+            with open(symbol_path, 'w') as f:
+                f.write(jsonpickle.encode(symbol))
+
+        path = self.day_path(symbol, day)
+
+        if os.path.exists(path):
+            rows = numpy.concatenate((numpy.load(path), rows))
+
+        rows = rows[numpy.argsort(rows['Epoch'], kind='stable')]
+        minute_starts = day_epoch(day) + numpy.arange(MINUTES_PER_DAY + 1, dtype=numpy.int64) * 60
+        index = numpy.searchsorted(rows['Epoch'], minute_starts, 'left').astype(numpy.int64)
+
+        write_atomic(path, rows)
+        write_atomic(self.index_path(symbol, day), index)
+
+    def day(self, symbol, day: datetime.date) -> numpy.ndarray:
+        path = self.day_path(symbol, day)
+
+        if not os.path.exists(path):
+            return numpy.zeros(0, dtype=TICK_DTYPE)
+
+        return numpy.load(path, mmap_mode='r')
+
+    # Rows of the day from start_epoch up to and including end_epoch, as a view of the mapped file
+    def day_range(self, symbol, day: datetime.date, start_epoch: int = None, end_epoch: int = None):
+        rows = self.day(symbol, day)
+
+        if len(rows) == 0 or (start_epoch is None and end_epoch is None):
+            return rows
+
+        index = numpy.load(self.index_path(symbol, day), mmap_mode='r')
+        epochs = rows['Epoch']
+        first_epoch = day_epoch(day)
+        start = 0
+        end = len(rows)
+
+        if start_epoch is not None and start_epoch > first_epoch:
+            minute = min((start_epoch - first_epoch) // 60, MINUTES_PER_DAY)
+            (low, high) = (int(index[minute]), int(index[min(minute + 1, MINUTES_PER_DAY)]))
+            start = low + int(numpy.searchsorted(epochs[low:high], start_epoch, 'left'))
+
+        if end_epoch is not None and end_epoch < first_epoch + tick_timestamp.SECONDS_PER_DAY:
+            if end_epoch < first_epoch:
+                return rows[0:0]
+
+            minute = (end_epoch - first_epoch) // 60
+            (low, high) = (int(index[minute]), int(index[min(minute + 1, MINUTES_PER_DAY)]))
+            end = low + int(numpy.searchsorted(epochs[low:high], end_epoch, 'right'))
+
+        return rows[start:max(start, end)]
+
+    def views(self, symbol, start: datetime.datetime = None, end: datetime.datetime = None):
+        start_epoch = tick_timestamp.to_epoch(start) if start is not None else None
+        end_epoch = tick_timestamp.to_epoch(end) if end is not None else None
+
+        for day in self.days(symbol):
+            if (start is not None and day < start.date()) or (end is not None and day > end.date()):
+                continue
+
+            rows = self.day_range(symbol, day, start_epoch, end_epoch)
+
+            if len(rows) > 0:
+                yield rows
+
+    # Epoch and LTP columns of one symbol from start to end (inclusive), e.g. for vectorized_backtest
+    def arrays(self, symbol, start: datetime.datetime = None, end: datetime.datetime = None):
+        return self.ticks([symbol], start, end).arrays()
+
+    # TickSequence of the symbols from start to end (inclusive), merged in time order
+    def ticks(self, symbols, start: datetime.datetime = None, end: datetime.datetime = None) -> TickSequence:
+        if not isinstance(symbols, (list, tuple)):
+            symbols = [symbols]
+
+        parts = []
+        indexes = []
+
+        for (position, symbol) in enumerate(symbols):
+            for rows in self.views(symbol, start, end):
+                parts.append(rows)
+                indexes.append(numpy.full(len(rows), position, dtype=numpy.int32))
+
+        if len(parts) == 0:
+            return TickSequence(numpy.zeros(0, dtype=TICK_DTYPE), symbols)
+
+        if len(parts) == 1:
+            return TickSequence(parts[0], symbols, indexes[0] if len(symbols) > 1 else None)
+
+        rows = numpy.concatenate(parts)
+
+        if len(symbols) == 1:
+            return TickSequence(rows, symbols)
+
+        order = numpy.argsort(rows['Epoch'], kind='stable')
+        return TickSequence(rows[order], symbols, numpy.concatenate(indexes)[order])
+
+    # Imports ticks from a CSV file with the columns load_ticks reads (Timestamp and LTP, optionally LTQ, Bid, Ask,
+    # OpenInterest and Ticker). symbols is a TradeSymbol or a dict of Ticker -> TradeSymbol. Rows are buffered per
+    # symbol-day and written every chunk_size rows, so files larger than memory can be imported. Rows inside the time
+    # range a day already held before the import are skipped, so importing the same file again adds nothing. Returns
+    # the number of rows added.
+    def import_csv(self, path: str, symbols, chunk_size: int = 1000000) -> int:
+        buffers = {}
+        buffered = 0
+        count = 0
+        stored = {}
+
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                symbol = symbols[row['Ticker']] if isinstance(symbols, dict) else symbols
+                (epoch, dt, tick_date) = tick_timestamp.parse(row['Timestamp'])
+                buffers.setdefault((symbol.Ticker, tick_date), (symbol, []))[1].append((
+                    epoch,
+                    float(row['LTP']),
+                    float(row.get('LTQ') or 0),
+                    float(row.get('Bid') or 0),
+                    float(row.get('Ask') or 0),
+                    float(row.get('OpenInterest') or 0)))
+                buffered += 1
+
+                if buffered >= chunk_size:
+                    count += self.flush(buffers, stored)
+                    buffers = {}
+                    buffered = 0
+
+        count += self.flush(buffers, stored)
+        return count
+
+    # Writes the buffered rows, skipping those inside the epoch range each day held before the import started (stored
+    # maps (ticker, day) to that range, or None for a day that was empty). Returns the number of rows written.
+    def flush(self, buffers, stored) -> int:
+        count = 0
+
+        for ((ticker, day), (symbol, rows)) in buffers.items():
+            if (ticker, day) not in stored:
+                epochs = self.day(symbol, day)['Epoch']
+                stored[(ticker, day)] = (int(epochs[0]), int(epochs[-1])) if len(epochs) > 0 else None
+                del epochs
+
+            rows = numpy.array(rows, dtype=TICK_DTYPE)
+
+            if stored[(ticker, day)] is not None:
+                (first, last) = stored[(ticker, day)]
+                rows = rows[(rows['Epoch'] < first) | (rows['Epoch'] > last)]
+
+            if len(rows) > 0:
+                self.write_day(symbol, day, rows)
+                count += len(rows)
+
+        return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Imports CSV ticks into a tick store')
+    parser.add_argument('store', help='tick store directory')
+    parser.add_argument('csv', nargs='+', help='CSV files with Timestamp and LTP columns')
+    parser.add_argument('--ticker', required=True)
+    parser.add_argument('--symbol-type', default=AlgorumQuantClient.algorum_types.SymbolType.Stock)
+    args = parser.parse_args()
+
+    tick_store = TickStore(args.store)
+    trade_symbol = AlgorumQuantClient.algorum_types.TradeSymbol(args.symbol_type, args.ticker)
+
+    for csv_path in args.csv:
+        print('Imported %d ticks from %s' % (tick_store.import_csv(csv_path, trade_symbol), csv_path))
@@ -0,0 +1,77 @@
+import calendar
+import datetime
+
+import AlgorumQuantClient.quant_client
+
+# Tick timestamps are parsed once, when the tick enters on_tick, and the result is kept on the tick itself as
+# Epoch (int seconds), DateTime (naive datetime) and TickDate (date). Everything downstream (throttles, day change,
+# session windows) then works on the cached integers instead of calling strptime again.
+
+SECONDS_PER_DAY = 86400
+EPOCH_ORIGIN = datetime.datetime(1970, 1, 1)
+
+_day_cache = {}
+_parsers = {}
+
+
+def _day_info(day_str: str):
+    info = _day_cache.get(day_str)
+
+    if info is None:
+        tick_date = datetime.date(int(day_str[0:4]), int(day_str[5:7]), int(day_str[8:10]))
+        info = (tick_date, calendar.timegm(tick_date.timetuple()))
+        _day_cache[day_str] = info
+
+    return info
+
+
+def _parse_iso_seconds(timestamp: str):
+    # Fast path for '%Y-%m-%dT%H:%M:%S' with or without a trailing 'Z'; the date part is memoized per day
+    tick_date, day_epoch = _day_info(timestamp[0:10])
+    hour = int(timestamp[11:13])
+    minute = int(timestamp[14:16])
+    second = int(timestamp[17:19])
+    epoch = day_epoch + hour * 3600 + minute * 60 + second
+    dt = datetime.datetime(tick_date.year, tick_date.month, tick_date.day, hour, minute, second)
+    return epoch, dt, tick_date
+
+
+def _strptime_parser(date_format: str):
+    def parse(timestamp: str):
+        dt = datetime.datetime.strptime(timestamp, date_format)
+        return calendar.timegm(dt.timetuple()), dt, dt.date()
+
+    return parse
+
+
+def get_parser(date_format: str):
+    parser = _parsers.get(date_format)
+
+    if parser is None:
+        if date_format in ('%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S'):
+            parser = _parse_iso_seconds
+        else:
+            parser = _strptime_parser(date_format)
+
+        _parsers[date_format] = parser
+
+    return parser
+
+
+def parse(timestamp: str):
+    return get_parser(AlgorumQuantClient.quant_client.QuantEngineClient.get_date_format(timestamp))(timestamp)
+
+
+def stamp(tick_data):
+    if getattr(tick_data, 'Epoch', None) is None:
+        tick_data.Epoch, tick_data.DateTime, tick_data.TickDate = parse(tick_data.Timestamp)
+
+    return tick_data
+
+
+def to_epoch(dt: datetime.datetime) -> int:
+    return calendar.timegm(dt.timetuple())
+
+
+def from_epoch(epoch: int) -> datetime.datetime:
+    return EPOCH_ORIGIN + datetime.timedelta(seconds=epoch)
@@ -0,0 +1,186 @@
+import math
+
+import numpy
+
+import golden_crossover_quant_strategy
+import tick_timestamp
+
+# Ticks scanned first when looking for the exit of a position; every further window is twice the size of the last
+EXIT_WINDOW = 256
+
+
+# Indicator semantics used here (and by the local evaluators): indicators are computed on completed candle closes,
+# a candle completes when the first tick of a later candle arrives, and an EMA reads 0 until `period` candles have
+# completed, being seeded with the simple average of the first `period` closes.
+
+def ticks_to_arrays(ticks):
+    epochs = numpy.fromiter((tick_timestamp.stamp(t).Epoch for t in ticks), dtype=numpy.int64, count=len(ticks))
+    ltp = numpy.fromiter((t.LTP for t in ticks), dtype=numpy.float64, count=len(ticks))
+    return epochs, ltp
+
+
+# Groups ticks into candles of candle_seconds. Returns the candle index of every tick and the close of every candle.
+def candles_from_ticks(epochs, ltp, candle_seconds: int = 60):
+    buckets = epochs // candle_seconds
+    starts = numpy.empty(len(buckets), dtype=bool)
+    starts[0] = True
+    numpy.not_equal(buckets[1:], buckets[:-1], out=starts[1:])
+    candle_index = numpy.cumsum(starts) - 1
+    last_in_candle = numpy.append(numpy.flatnonzero(starts)[1:] - 1, len(ltp) - 1)
+    return candle_index, ltp[last_in_candle]
+
+
+def ema(values, period: int):
+    values = numpy.asarray(values, dtype=numpy.float64)
+    result = numpy.zeros(len(values))
+
+    if len(values) < period:
+        return result
+
+    alpha = 2.0 / (period + 1)
+    decay = 1.0 - alpha
+    result[period - 1] = values[:period].mean()
+    rest = values[period:]
+
+    if len(rest) == 0:
+        return result
+
+    # The recursion is evaluated in blocks: inside a block it is a scaled cumulative sum, and only the carry between
+    # blocks is sequential. The block length bounds decay ** -block to keep the scaled sums well conditioned.
+    block = max(1, min(len(rest), int(math.log(1e4) / -math.log(decay)) if decay > 0 else 1))
+    block_count = -(-len(rest) // block)
+    padded = numpy.zeros(block_count * block)
+    padded[:len(rest)] = rest
+    padded = padded.reshape(block_count, block)
+
+    steps = numpy.arange(block)
+    local = alpha * numpy.cumsum(padded * decay ** -steps, axis=1) * decay ** steps
+    carry_weights = decay ** (steps + 1)
+    block_decay = decay ** block
+
+    carry = result[period - 1]
+    filtered = numpy.empty_like(padded)
+
+    for b in range(block_count):
+        filtered[b] = local[b] + carry_weights * carry
+        carry = local[b, -1] + block_decay * carry
+
+    result[period:] = filtered.reshape(-1)[:len(rest)]
+    return result
+
+
+# Same state machine as AlgorumQuantClient CrossAbove.evaluate applied to a whole series: it fires where left is
+# above right and the previous unequal observation had left below right.
+def cross_above(left, right):
+    direction = numpy.sign(numpy.asarray(left) - numpy.asarray(right))
+    fired = numpy.zeros(len(direction), dtype=bool)
+    unequal = numpy.flatnonzero(direction)
+
+    if len(unequal) > 1:
+        current = direction[unequal[1:]]
+        previous = direction[unequal[:-1]]
+        fired[unequal[1:][(current > 0) & (previous < 0)]] = True
+
+    return fired
+
+
+# Index of the first tick after entry at which the price is take_profit_percent above or stop_loss_percent below
+# average_price, or -1 when there is none. The ticks are scanned in windows that double from the entry, so finding an
+# exit costs about the length of the position rather than the whole rest of the history.
+def first_exit(ltp, entry: int, average_price: float, take_profit_percent: float, stop_loss_percent: float) -> int:
+    take_profit = average_price * (take_profit_percent / 100)
+    stop_loss = average_price * (stop_loss_percent / 100)
+    start = entry + 1
+    window = EXIT_WINDOW
+
+    while start < len(ltp):
+        following = ltp[start:start + window]
+        hit = (following - average_price >= take_profit) | (average_price - following >= stop_loss)
+        first = int(numpy.argmax(hit))
+
+        if hit[first]:
+            return start + first
+
+        start += window
+        window *= 2
+
+    return -1
+
+
+class VectorizedBacktestResult(object):
+    def __init__(self, entry_index, exit_index, entry_price, exit_price, quantity, stats):
+        self.EntryIndex = entry_index
+        self.ExitIndex = exit_index
+        self.EntryPrice = entry_price
+        self.ExitPrice = exit_price
+        self.Quantity = quantity
+        self.Stats = stats
+
+
+# Batch version of GoldenCrossoverQuantStrategy over a tick history for one symbol: buy on a fast/slow EMA cross
+# above, sell when the price moves TakeProfitPercent above or StopLossPercent below the fill price. Parameters are read
+# from strategy_class, so a subclass with overridden constants is screened the same way it would trade. Produces the
+# same trades as the tick-driven strategy run through the local backtest engine with market fills at LTP.
+def golden_crossover(epochs, ltp, warmup_closes=None,
+                     strategy_class=golden_crossover_quant_strategy.GoldenCrossoverQuantStrategy,
+                     candle_seconds: int = 60):
+    take_profit_percent = strategy_class.TakeProfitPercent
+    stop_loss_percent = strategy_class.StopLossPercent
+    capital = strategy_class.Capital
+    leverage = strategy_class.Leverage
+    epochs = numpy.asarray(epochs, dtype=numpy.int64)
+    ltp = numpy.asarray(ltp, dtype=numpy.float64)
+    candle_index, closes = candles_from_ticks(epochs, ltp, candle_seconds)
+    warmup = 0
+
+    if warmup_closes is not None and len(warmup_closes) > 0:
+        warmup = len(warmup_closes)
+        closes = numpy.concatenate((numpy.asarray(warmup_closes, dtype=numpy.float64), closes))
+
+    # Ticks of candle c see the indicators of the candles completed before it
+    fast = numpy.concatenate(([0.0], ema(closes, strategy_class.FastEmaPeriod)))
+    slow = numpy.concatenate(([0.0], ema(closes, strategy_class.SlowEmaPeriod)))
+    visible = candle_index + warmup
+    fast = fast[visible]
+    slow = slow[visible]
+
+    evaluated = numpy.flatnonzero((fast > 0) & (slow > 0))
+    signal_ticks = evaluated[cross_above(fast[evaluated], slow[evaluated])]
+
+    entries = []
+    exits = []
+    next_signal = 0
+
+    # Signals while a position is open are ignored, so the next entry is the first signal after the exit
+    while next_signal < len(signal_ticks):
+        entry = int(signal_ticks[next_signal])
+        position_end = first_exit(ltp, entry, ltp[entry], take_profit_percent, stop_loss_percent)
+        entries.append(entry)
+        exits.append(position_end)
+
+        if position_end < 0:
+            break
+
+        next_signal = int(numpy.searchsorted(signal_ticks, position_end, 'right'))
+
+    entry_index = numpy.asarray(entries, dtype=numpy.int64)
+    exit_index = numpy.asarray(exits, dtype=numpy.int64)
+    entry_price = ltp[entry_index]
+    exit_price = numpy.where(exit_index >= 0, ltp[exit_index], ltp[-1])
+    quantity = (capital / entry_price) * leverage
+
+    # Same figures as get_stats: open positions are valued at the last traded price
+    pl = float(numpy.sum(quantity * exit_price) - numpy.sum(quantity * entry_price))
+    stats = {
+        "Capital": capital,
+        "Order Count": len(entry_index) + int(numpy.count_nonzero(exit_index >= 0)),
+        "PL": pl,
+        "Portfolio Value": capital + pl
+    }
+
+    return VectorizedBacktestResult(entry_index, exit_index, entry_price, exit_price, quantity, stats)
+
+
+# Screens many symbols in one pass; histories maps a ticker to its (epochs, ltp) arrays
+def screen_golden_crossover(histories, **kwargs):
+    return {ticker: golden_crossover(epochs, ltp, **kwargs) for ticker, (epochs, ltp) in histories.items()}
@@ -0,0 +1,367 @@
+import concurrent.futures
+import datetime
+import os
+import time
+import traceback
+
+import AlgorumQuantClient.algorum_types
+import candle_aggregator
+import local_backtest_engine
+import order_store
+import parameter_sweep
+import session_calendar
+import tick_timestamp
+
+# Ticks of the backtest, installed once per worker process by the pool initializer so that every chunk replays the
+# same loaded market data instead of reloading it
+_worker_ticks = None
+
+
+def _init_worker(ticks):
+    global _worker_ticks
+    _worker_ticks = ticks
+
+
+# A slice of the backtest range. The strategy is replayed from WarmupStart, so that its indicators and state have
+# settled by Start, and only the trades from Start to End (inclusive) belong to the chunk.
+class Chunk(object):
+    def __init__(self, warmup_start: datetime.datetime, start: datetime.datetime, end: datetime.datetime):
+        self.WarmupStart = warmup_start
+        self.Start = start
+        self.End = end
+
+
+class Trade(object):
+    def __init__(self, epoch, ticker, direction, quantity, price, order_id, tag):
+        self.Epoch = epoch
+        self.Ticker = ticker
+        self.Direction = direction
+        self.Quantity = quantity
+        self.Price = price
+        self.OrderId = order_id
+        self.Tag = tag
+
+    @staticmethod
+    def from_order(order: AlgorumQuantClient.algorum_types.Order):
+        return Trade(order_store.order_epoch(order.OrderTimestamp), order.Symbol.Ticker, order.OrderDirection,
+                     order.FilledQuantity, order.AveragePrice, order.OrderId, order.Tag)
+
+    @property
+    def SignedQuantity(self):
+        if self.Direction == AlgorumQuantClient.algorum_types.OrderDirection.Buy:
+            return self.Quantity
+
+        return -self.Quantity
+
+
+# Outcome of one chunk: its own trades, the positions left over from the warm-up with the prices they are valued at
+# when the chunk starts, and the last prices when it ends
+class ChunkResult(object):
+    def __init__(self, chunk, parameters, trades=None, start_positions=None, start_prices=None, end_prices=None,
+                 stats=None, tick_count=0, elapsed_seconds=0.0, error=None):
+        self.Chunk = chunk
+        self.Parameters = parameters
+        self.Trades = trades
+        self.StartPositions = start_positions
+        self.StartPrices = start_prices
+        self.EndPrices = end_prices
+        self.Stats = stats
+        self.TickCount = tick_count
+        self.ElapsedSeconds = elapsed_seconds
+        self.Error = error
+
+
+class WalkForwardResult(object):
+    def __init__(self, chunks, trades, equity_curve, stats, divergences, elapsed_seconds, windows=None):
+        self.Chunks = chunks
+        self.Trades = trades
+        self.EquityCurve = equity_curve
+        self.Stats = stats
+        self.Divergences = divergences
+        self.ElapsedSeconds = elapsed_seconds
+        self.Windows = windows
+
+
+# A train / test window of a walk-forward run and the parameters picked on its train range
+class Window(object):
+    def __init__(self, train: Chunk, test: Chunk):
+        self.Train = train
+        self.Test = test
+        self.Parameters = None
+        self.TrainStats = None
+
+
+def day_start(day: datetime.date) -> datetime.datetime:
+    return datetime.datetime.combine(day, datetime.time())
+
+
+def warmed_chunk(start: datetime.datetime, end: datetime.datetime, warmup_days: int,
+                 calendar: session_calendar.SessionCalendar, first: bool = False) -> Chunk:
+    return Chunk(start if first else day_start(calendar.sessions_before(start.date(), warmup_days)), start, end)
+
+
+# Splits start_date to end_date into chunks of chunk_days trading days of calendar, each warmed up over the
+# warmup_days trading days before it. The first chunk starts cold, as the serial backtest of the whole range does.
+def split_range(start_date: datetime.datetime, end_date: datetime.datetime, chunk_days: int, warmup_days: int,
+                calendar: session_calendar.SessionCalendar):
+    days = calendar.session_days(start_date.date(), end_date.date())
+    chunks = []
+
+    for i in range(0, len(days), chunk_days):
+        start = start_date if i == 0 else day_start(days[i])
+
+        if i + chunk_days < len(days):
+            end = day_start(days[i + chunk_days]) - datetime.timedelta(seconds=1)
+        else:
+            end = end_date
+
+        chunks.append(warmed_chunk(start, end, warmup_days, calendar, i == 0))
+
+    return chunks
+
+
+# Rolling train / test windows: every test range of test_days sessions follows the train range of train_days sessions
+# before it, and the windows advance by test_days, so that the test ranges tile the rest of the range
+def split_windows(start_date: datetime.datetime, end_date: datetime.datetime, train_days: int, test_days: int,
+                  warmup_days: int, calendar: session_calendar.SessionCalendar):
+    days = calendar.session_days(start_date.date(), end_date.date())
+    windows = []
+
+    for i in range(train_days, len(days), test_days):
+        train_start = start_date if i == train_days else day_start(days[i - train_days])
+        test_start = day_start(days[i])
+
+        if i + test_days < len(days):
+            test_end = day_start(days[i + test_days]) - datetime.timedelta(seconds=1)
+        else:
+            test_end = end_date
+
+        train = warmed_chunk(train_start, test_start - datetime.timedelta(seconds=1), warmup_days, calendar,
+                             i == train_days)
+        windows.append(Window(train, warmed_chunk(test_start, test_end, warmup_days, calendar)))
+
+    return windows
+
+
+# Session days of ticks a strategy needs before its indicators are warm: the largest preload_candles request its
+# backtest() makes, converted to sessions (at least one)
+def preload_warmup_days(strategy_class, start_date: datetime.datetime, end_date: datetime.datetime) -> int:
+    preloads = []
+
+    def record(symbol, candle_period, period_span, candle_count, preload_end_time):
+        preloads.append((candle_period, period_span, candle_count))
+        return []
+
+    engine = local_backtest_engine.LocalBacktestEngine(strategy_class, [], candle_loader=record)
+    strategy = engine.create_strategy()
+    strategy.backtest(engine.backtest_request(start_date, end_date))
+
+    log_sink = getattr(strategy, 'LogSink', None)
+
+    if log_sink is not None:
+        log_sink.close()
+
+    warmup_days = 1
+
+    for (candle_period, period_span, candle_count) in preloads:
+        if candle_period == AlgorumQuantClient.algorum_types.CandlePeriod.Day:
+            days = candle_count * period_span
+        else:
+            candle_seconds = candle_aggregator.CANDLE_SECONDS[candle_period] * period_span
+            candles_per_day = max(1, candle_aggregator.SESSION_SECONDS // candle_seconds)
+            days = -(-candle_count // candles_per_day)
+
+        warmup_days = max(warmup_days, days)
+
+    return warmup_days
+
+
+def last_prices(ticks, start_date: datetime.datetime, end_date: datetime.datetime):
+    prices = {}
+
+    for tick_data in local_backtest_engine.select_ticks(ticks, start_date, end_date):
+        prices[tick_data.Symbol.Ticker] = tick_data.LTP
+
+    return prices
+
+
+def run_chunk(strategy_class, chunk: Chunk, parameters=None, evaluator_factory=None, candle_loader=None,
+              slippage_bps=0.0):
+    try:
+        if parameters:
+            strategy_class = type(strategy_class.__name__, (strategy_class,), dict(parameters))
+
+        engine = local_backtest_engine.LocalBacktestEngine(strategy_class, _worker_ticks, evaluator_factory,
+                                                           slippage_bps, candle_loader=candle_loader)
+        result = engine.run(chunk.WarmupStart, chunk.End)
+        start_epoch = tick_timestamp.to_epoch(chunk.Start)
+        trades = []
+        start_positions = {}
+
+        for order in result.Orders:
+            trade = Trade.from_order(order)
+
+            if trade.Epoch >= start_epoch:
+                trades.append(trade)
+            else:
+                start_positions[trade.Ticker] = start_positions.get(trade.Ticker, 0.0) + trade.SignedQuantity
+
+        start_positions = dict((ticker, quantity) for (ticker, quantity) in start_positions.items() if quantity != 0)
+        start_prices = {}
+
+        if len(start_positions) > 0:
+            start_prices = last_prices(_worker_ticks, chunk.WarmupStart, chunk.Start - datetime.timedelta(seconds=1))
+
+        return ChunkResult(chunk, parameters, trades, start_positions, start_prices,
+                           dict(result.Strategy.LocalLastPrices), result.Stats, result.TickCount,
+                           result.ElapsedSeconds)
+    except Exception:
+        return ChunkResult(chunk, parameters, error=traceback.format_exc())
+
+
+# Joins chunk results (in time order) into one backtest. Every chunk is valued mark to market from its Start to its End,
+# starting from the positions its warm-up left open, so the equity carries over from chunk to chunk. When the warm-up
+# was long enough for the strategy to reach the state the previous chunk ended in, the stitched trades and PL are those
+# of a serial run; boundaries where the positions disagree are reported as (epoch, ticker, previous chunk position,
+# next chunk position) in Divergences, a sign that warmup_days should be raised.
+def stitch(chunk_results, capital: float, elapsed_seconds: float = 0.0, windows=None) -> WalkForwardResult:
+    equity = capital
+    equity_curve = []
+    trades = []
+    divergences = []
+    previous_positions = None
+
+    for result in chunk_results:
+        if result.Error is not None:
+            raise Exception('Backtest of ' + str(result.Chunk.Start) + ' to ' + str(result.Chunk.End) + ' failed\n' +
+                            result.Error)
+
+        positions = dict(result.StartPositions)
+        prices = dict(result.StartPrices)
+        start_epoch = tick_timestamp.to_epoch(result.Chunk.Start)
+
+        if previous_positions is not None:
+            for ticker in sorted(set(previous_positions) | set(positions)):
+                if previous_positions.get(ticker, 0.0) != positions.get(ticker, 0.0):
+                    divergences.append((start_epoch, ticker, previous_positions.get(ticker, 0.0),
+                                        positions.get(ticker, 0.0)))
+
+        cash = equity - sum(quantity * prices.get(ticker, 0.0) for (ticker, quantity) in positions.items())
+
+        for trade in result.Trades:
+            cash -= trade.SignedQuantity * trade.Price
+            positions[trade.Ticker] = positions.get(trade.Ticker, 0.0) + trade.SignedQuantity
+            prices[trade.Ticker] = trade.Price
+            equity_curve.append((trade.Epoch, cash + sum(quantity * prices.get(ticker, 0.0)
+                                                         for (ticker, quantity) in positions.items())))
+
+        prices.update(result.EndPrices)
+        equity = cash + sum(quantity * prices.get(ticker, 0.0) for (ticker, quantity) in positions.items())
+        equity_curve.append((tick_timestamp.to_epoch(result.Chunk.End), equity))
+        trades.extend(result.Trades)
+        previous_positions = dict((ticker, quantity) for (ticker, quantity) in positions.items() if quantity != 0)
+
+    stats = dict(chunk_results[-1].Stats or {}) if len(chunk_results) > 0 else {}
+    stats['Capital'] = capital
+    stats['Order Count'] = len(trades)
+    stats['PL'] = equity - capital
+    stats['Portfolio Value'] = equity
+
+    return WalkForwardResult(chunk_results, trades, equity_curve, stats, divergences, elapsed_seconds, windows)
+
+
+def tick_range(ticks):
+    if len(ticks) == 0:
+        raise Exception('No ticks to replay')
+
+    return tick_timestamp.stamp(ticks[0]).DateTime, tick_timestamp.stamp(ticks[-1]).DateTime
+
+
+# Backtests start_date to end_date (by default the whole of ticks) as chunks of chunk_days sessions replayed in
+# parallel on a process pool, and stitches them into one result. By default the range is split evenly over the
+# processes and every chunk is warmed up over the sessions the preload_candles requests of the strategy cover.
+def backtest(strategy_class, ticks, start_date: datetime.datetime = None, end_date: datetime.datetime = None,
+             chunk_days: int = None, warmup_days: int = None, processes: int = None, parameters=None,
+             evaluator_factory=None, candle_loader=None, slippage_bps=0.0,
+             calendar: session_calendar.SessionCalendar = None) -> WalkForwardResult:
+    (first_date, last_date) = tick_range(ticks)
+    start_date = start_date or first_date
+    end_date = end_date or last_date
+    processes = processes or os.cpu_count()
+    calendar = calendar or session_calendar.SessionCalendar()
+
+    if warmup_days is None:
+        warmup_days = preload_warmup_days(strategy_class, start_date, end_date)
+
+    if chunk_days is None:
+        chunk_days = max(1, -(-len(calendar.session_days(start_date.date(), end_date.date())) // processes))
+
+    started = time.perf_counter()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                                initargs=(ticks,)) as executor:
+        futures = [executor.submit(run_chunk, strategy_class, c, parameters, evaluator_factory, candle_loader,
+                                   slippage_bps)
+                   for c in split_range(start_date, end_date, chunk_days, warmup_days, calendar)]
+        results = [future.result() for future in futures]
+
+    return stitch(results, strategy_class.Capital, time.perf_counter() - started)
+
+
+# Walk-forward optimization: for every train / test window the combinations of parameter_grid (see
+# parameter_sweep.sweep) are backtested over the train range, and the one with the best rank_key is backtested over
+# the test range that follows. All train runs go to the process pool at once, then all test runs. The result stitches
+# the test ranges only, i.e. the out-of-sample performance, and its Windows hold the parameters picked for each.
+def walk_forward(strategy_class, ticks, parameter_grid, train_days: int, test_days: int, rank_key='PL',
+                 start_date: datetime.datetime = None, end_date: datetime.datetime = None, warmup_days: int = None,
+                 processes: int = None, evaluator_factory=None, candle_loader=None,
+                 slippage_bps=0.0, calendar: session_calendar.SessionCalendar = None) -> WalkForwardResult:
+    (first_date, last_date) = tick_range(ticks)
+    start_date = start_date or first_date
+    end_date = end_date or last_date
+    calendar = calendar or session_calendar.SessionCalendar()
+    combinations = parameter_sweep.expand_grid(strategy_class, parameter_grid)
+
+    if warmup_days is None:
+        warmup_days = preload_warmup_days(strategy_class, start_date, end_date)
+
+    windows = split_windows(start_date, end_date, train_days, test_days, warmup_days, calendar)
+
+    if len(windows) == 0:
+        raise Exception('Range has no session after the first ' + str(train_days) + ' train sessions')
+
+    started = time.perf_counter()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes or os.cpu_count(), initializer=_init_worker,
+                                                initargs=(ticks,)) as executor:
+        train_futures = [[executor.submit(run_chunk, strategy_class, window.Train, parameters, evaluator_factory,
+                                          candle_loader, slippage_bps)
+                          for parameters in combinations]
+                         for window in windows]
+
+        for (window, futures) in zip(windows, train_futures):
+            best = None
+
+            for future in futures:
+                result = future.result()
+
+                if result.Error is not None:
+                    continue
+
+                stats = stitch([result], strategy_class.Capital).Stats
+
+                if best is None or stats[rank_key] > best[1][rank_key]:
+                    best = (result.Parameters, stats)
+
+            if best is None:
+                raise Exception('Every combination failed on the train range ' + str(window.Train.Start) + ' to ' +
+                                str(window.Train.End))
+
+            (window.Parameters, window.TrainStats) = best
+
+        test_futures = [executor.submit(run_chunk, strategy_class, window.Test, window.Parameters, evaluator_factory,
+                                        candle_loader, slippage_bps)
+                        for window in windows]
+        results = [future.result() for future in test_futures]
+
+    return stitch(results, strategy_class.Capital, time.perf_counter() - started, windows)
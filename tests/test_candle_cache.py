@@ -0,0 +1,28 @@
+import os
+
+import numpy
+
+import candle_cache
+
+
+def cached_rows(count: int):
+    return numpy.zeros((count, 6))
+
+
+def test_rewriting_a_day_counts_only_the_size_change(tmp_path):
+    cache = candle_cache.CandleCache(None, str(tmp_path))
+    path = os.path.join(str(tmp_path), 'AAA', 'min-1', '2021-03-01.npy')
+    cache.write(path, cached_rows(10))
+
+    for count in (10, 10, 20, 5):
+        cache.write(path, cached_rows(count))
+
+    assert cache.Size == os.path.getsize(path) == cache.scan_size()
+
+
+def test_new_days_add_to_the_size(tmp_path):
+    cache = candle_cache.CandleCache(None, str(tmp_path))
+    cache.write(os.path.join(str(tmp_path), 'AAA', 'min-1', '2021-03-01.npy'), cached_rows(10))
+    cache.write(os.path.join(str(tmp_path), 'AAA', 'min-1', '2021-03-02.npy'), cached_rows(20))
+
+    assert cache.Size == cache.scan_size()
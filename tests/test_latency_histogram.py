@@ -0,0 +1,44 @@
+import latency_histogram
+
+
+def test_small_values_get_a_bucket_each():
+    for value in range(latency_histogram.SUB_BUCKET_COUNT):
+        assert latency_histogram.bucket_value(latency_histogram.bucket_index(value)) == value
+
+
+def test_bucket_bounds_hold_the_value_within_the_precision():
+    precision = 1.0 / latency_histogram.SUB_BUCKET_HALF
+    value = latency_histogram.SUB_BUCKET_COUNT
+
+    while value < 1 << latency_histogram.MAX_VALUE_BITS:
+        for candidate in (value - 1, value, value + 1, value * 3 // 2):
+            index = latency_histogram.bucket_index(candidate)
+            upper = latency_histogram.bucket_value(index)
+            lower = latency_histogram.bucket_value(index - 1) + 1
+
+            assert lower <= candidate <= upper
+            assert upper - lower < candidate * precision
+
+        value <<= 1
+
+
+def test_bucket_indexes_are_monotonic_and_capped():
+    previous = 0
+
+    for bits in range(latency_histogram.MAX_VALUE_BITS + 4):
+        index = latency_histogram.bucket_index(1 << bits)
+        assert previous <= index < latency_histogram.BUCKET_COUNT
+        previous = index
+
+    assert latency_histogram.bucket_index(1 << 60) == latency_histogram.BUCKET_COUNT - 1
+
+
+def test_percentiles_are_capped_at_the_max():
+    histogram = latency_histogram.LatencyHistogram()
+
+    for value in range(1, 1001):
+        histogram.record(value * 1000)
+
+    assert abs(histogram.percentile(50) - 500000) <= 500000 / latency_histogram.SUB_BUCKET_HALF
+    assert histogram.percentile(100) == histogram.Max == 1000000
+    assert histogram.Min == 1000
@@ -0,0 +1,114 @@
+import AlgorumQuantClient.algorum_types
+import order_manager
+import order_store
+
+SYMBOL = AlgorumQuantClient.algorum_types.TradeSymbol(AlgorumQuantClient.algorum_types.SymbolType.Stock, 'AAA')
+BUY = AlgorumQuantClient.algorum_types.OrderDirection.Buy
+SELL = AlgorumQuantClient.algorum_types.OrderDirection.Sell
+PENDING = AlgorumQuantClient.algorum_types.OrderStatus.Pending
+COMPLETED = AlgorumQuantClient.algorum_types.OrderStatus.Completed
+CANCELLED = AlgorumQuantClient.algorum_types.OrderStatus.Cancelled
+REJECTED = AlgorumQuantClient.algorum_types.OrderStatus.Rejected
+
+
+def request(tag: str, direction: str, quantity: float, price: float):
+    place_order_request = AlgorumQuantClient.algorum_types.PlaceOrderRequest()
+    place_order_request.Tag = tag
+    place_order_request.Symbol = SYMBOL
+    place_order_request.OrderDirection = direction
+    place_order_request.Quantity = quantity
+    place_order_request.Price = price
+    return place_order_request
+
+
+def update(tag: str, direction: str, quantity: float, filled: float, price: float, status: str):
+    return AlgorumQuantClient.algorum_types.Order(
+        OrderId='id-' + tag, Tag=tag, Symbol=SYMBOL, OrderDirection=direction, Status=status, Quantity=quantity,
+        FilledQuantity=filled, PendingQuantity=quantity - filled, AveragePrice=price if filled else 0.0,
+        Price=price, OrderTimestamp='2021-03-01T09:30:00')
+
+
+def test_partial_fills_move_the_position_as_they_arrive():
+    manager = order_manager.OrderManager()
+    manager.track(request('a', BUY, 10.0, 100.0))
+
+    assert manager.open_quantity('AAA') == (10.0, 0.0)
+
+    managed = manager.update(update('a', BUY, 10.0, 4.0, 100.0, PENDING))
+
+    assert managed.LastFill == 4.0
+    assert manager.position('AAA') == 4.0
+    assert manager.open_quantity('AAA') == (6.0, 0.0)
+    assert manager.has_open_orders('AAA')
+
+    # The average price of an update covers all fills so far
+    managed = manager.update(update('a', BUY, 10.0, 10.0, 103.0, COMPLETED))
+
+    assert managed.LastFill == 6.0
+    assert manager.position('AAA') == 10.0
+    assert abs(manager.average_price('AAA') - 103.0) < 1e-9
+    assert manager.open_quantity('AAA') == (0.0, 0.0)
+    assert not manager.has_open_orders('AAA')
+    assert manager.order_counts('AAA') == (1, 0)
+
+
+def test_cancel_after_a_partial_fill_releases_the_rest():
+    manager = order_manager.OrderManager()
+    manager.track(request('a', BUY, 10.0, 100.0))
+    manager.update(update('a', BUY, 10.0, 10.0, 100.0, COMPLETED))
+    manager.track(request('b', SELL, 10.0, 110.0))
+    manager.update(update('b', SELL, 10.0, 4.0, 110.0, PENDING))
+    managed = manager.update(update('b', SELL, 10.0, 4.0, 110.0, CANCELLED))
+
+    assert managed.LastFill == 0.0
+    assert managed.Remaining == 0.0
+    assert manager.position('AAA') == 6.0
+    assert manager.open_quantity('AAA') == (0.0, 0.0)
+    assert manager.order_counts('AAA') == (2, 0)
+    assert abs(manager.profit('AAA', 105.0) - (4 * 10.0 + 6 * 5.0)) < 1e-9
+    assert manager.get('b') is None
+
+
+def test_reject_closes_the_order_without_a_fill():
+    manager = order_manager.OrderManager()
+    manager.track(request('a', BUY, 10.0, 100.0))
+    managed = manager.update(update('a', BUY, 10.0, 0.0, 100.0, REJECTED))
+
+    assert managed.Status == REJECTED
+    assert manager.position('AAA') == 0.0
+    assert not manager.has_open_orders('AAA')
+    assert manager.order_counts('AAA') == (0, 1)
+
+    # A repeated update of a closed order is recognised and ignored
+    assert manager.update(update('a', BUY, 10.0, 0.0, 100.0, REJECTED)) is None
+
+
+def test_discard_forgets_an_order_that_was_never_placed():
+    manager = order_manager.OrderManager()
+    manager.track(request('a', BUY, 10.0, 100.0))
+    manager.discard('a')
+
+    assert manager.get('a') is None
+    assert not manager.has_open_orders('AAA')
+    assert manager.open_quantity('AAA') == (0.0, 0.0)
+
+
+def test_from_orders_rebuilds_closed_and_open_orders():
+    manager = order_manager.OrderManager()
+    orders = order_store.OrderStore()
+    updates = [update('a', BUY, 10.0, 10.0, 100.0, COMPLETED),
+               update('b', SELL, 10.0, 4.0, 110.0, PENDING),
+               update('c', BUY, 5.0, 0.0, 100.0, REJECTED)]
+
+    for order in updates:
+        manager.update(order)
+        orders.append(order)
+
+    rebuilt = order_manager.OrderManager.from_orders(orders)
+
+    assert rebuilt.position('AAA') == manager.position('AAA') == 6.0
+    assert rebuilt.profit('AAA', 105.0) == manager.profit('AAA', 105.0)
+    assert rebuilt.order_counts('AAA') == (1, 1)
+    assert rebuilt.open_quantity('AAA') == (0.0, 6.0)
+    assert rebuilt.update(update('a', BUY, 10.0, 10.0, 100.0, COMPLETED)) is None
+    assert rebuilt.update(update('b', SELL, 10.0, 10.0, 110.0, COMPLETED)).LastFill == 6.0
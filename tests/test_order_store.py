@@ -0,0 +1,74 @@
+import AlgorumQuantClient.algorum_types
+import order_manager
+import order_store
+
+AAA = AlgorumQuantClient.algorum_types.TradeSymbol(AlgorumQuantClient.algorum_types.SymbolType.Stock, 'AAA')
+BBB = AlgorumQuantClient.algorum_types.TradeSymbol(AlgorumQuantClient.algorum_types.SymbolType.Stock, 'BBB')
+BUY = AlgorumQuantClient.algorum_types.OrderDirection.Buy
+SELL = AlgorumQuantClient.algorum_types.OrderDirection.Sell
+COMPLETED = AlgorumQuantClient.algorum_types.OrderStatus.Completed
+CANCELLED = AlgorumQuantClient.algorum_types.OrderStatus.Cancelled
+REJECTED = AlgorumQuantClient.algorum_types.OrderStatus.Rejected
+
+
+def order(tag: str, symbol, direction: str, filled: float, price: float, status: str = COMPLETED):
+    return AlgorumQuantClient.algorum_types.Order(
+        OrderId='id-' + tag, Tag=tag, Symbol=symbol, OrderDirection=direction, Status=status, Quantity=filled,
+        FilledQuantity=filled, AveragePrice=price, OrderTimestamp='2021-03-01T09:30:00')
+
+
+def history():
+    return [order('a', AAA, BUY, 10.0, 100.0),
+            order('b', BBB, BUY, 5.0, 50.0),
+            order('c', AAA, SELL, 10.0, 110.0),
+            order('d', AAA, BUY, 0.0, 0.0, REJECTED),
+            order('e', BBB, SELL, 5.0, 40.0),
+            order('f', AAA, BUY, 6.0, 120.0),
+            order('g', AAA, SELL, 2.0, 125.0, CANCELLED)]
+
+
+def test_aggregates_by_ticker_and_status():
+    orders = order_store.OrderStore(history())
+
+    assert orders.totals('AAA') == (10.0 * 100.0 + 6.0 * 120.0, 16.0, 10.0 * 110.0 + 2.0 * 125.0, 12.0)
+    assert orders.totals('BBB', end=2) == (250.0, 5.0, 0.0, 0.0)
+    assert orders.position('AAA') == 4.0
+    assert orders.position('CCC') == 0.0
+    assert orders.count('AAA') == 5
+    assert orders.count('AAA', REJECTED) == 1
+    assert orders.count('AAA', filled=False) == 1
+    assert orders.count(status=COMPLETED) == 5
+    assert sorted(orders.tickers()) == ['AAA', 'BBB']
+
+
+def test_flat_rows_is_the_last_point_every_position_was_flat():
+    orders = order_store.OrderStore()
+
+    assert orders.flat_rows() == 0
+
+    orders.extend(history())
+
+    assert orders.flat_rows() == 5
+
+    orders.append(order('h', AAA, SELL, 4.0, 118.0))
+
+    assert orders.flat_rows() == 8
+
+
+def test_from_orders_seeds_the_flat_history_and_replays_the_rest():
+    orders = order_store.OrderStore(history())
+    replayed = order_manager.OrderManager()
+
+    for closed in orders:
+        replayed.update(closed)
+
+    rebuilt = order_manager.OrderManager.from_orders(orders)
+
+    for ticker in ('AAA', 'BBB'):
+        assert rebuilt.position(ticker) == replayed.position(ticker)
+        assert rebuilt.average_price(ticker) == replayed.average_price(ticker)
+        assert abs(rebuilt.profit(ticker, 130.0) - replayed.profit(ticker, 130.0)) < 1e-9
+        assert rebuilt.order_counts(ticker) == replayed.order_counts(ticker)
+
+    assert list(rebuilt.Closed) == list(replayed.Closed)
+    assert rebuilt.update(order('a', AAA, BUY, 10.0, 100.0)) is None
@@ -0,0 +1,79 @@
+import AlgorumQuantClient.algorum_types
+import risk_engine
+
+SYMBOL = AlgorumQuantClient.algorum_types.TradeSymbol(AlgorumQuantClient.algorum_types.SymbolType.Stock, 'AAA')
+BUY = AlgorumQuantClient.algorum_types.OrderDirection.Buy
+SELL = AlgorumQuantClient.algorum_types.OrderDirection.Sell
+
+
+def request(tag: str, direction: str, quantity: float, price: float = 100.0):
+    place_order_request = AlgorumQuantClient.algorum_types.PlaceOrderRequest()
+    place_order_request.Tag = tag
+    place_order_request.Symbol = SYMBOL
+    place_order_request.OrderDirection = direction
+    place_order_request.Quantity = quantity
+    place_order_request.Price = price
+    return place_order_request
+
+
+def fill(tag: str, direction: str, quantity: float, price: float = 100.0):
+    return AlgorumQuantClient.algorum_types.Order(
+        Tag=tag, Symbol=SYMBOL, OrderDirection=direction, Quantity=quantity, FilledQuantity=quantity,
+        AveragePrice=price, Status=AlgorumQuantClient.algorum_types.OrderStatus.Completed)
+
+
+def test_order_is_trimmed_to_the_room_left():
+    engine = risk_engine.RiskEngine(risk_engine.RiskLimits(max_symbol_position=15.0))
+    engine.check(request('a', BUY, 10.0))
+    second = request('b', BUY, 10.0)
+
+    assert engine.check(second) is None
+    assert second.Quantity == 5.0
+    assert engine.Trims == 1
+    assert engine.Gross == 1500.0
+
+
+def test_order_below_the_minimum_quantity_is_rejected():
+    engine = risk_engine.RiskEngine(risk_engine.RiskLimits(max_order_value=250.0, min_quantity=5.0))
+
+    assert engine.check(request('a', BUY, 10.0)) == 'order value at limit 250.0'
+    assert engine.Rejections == 1
+    assert engine.snapshot()['Open Orders'] == 0
+
+
+def test_open_order_limit_rejects_until_an_order_closes():
+    engine = risk_engine.RiskEngine(risk_engine.RiskLimits(max_open_orders=1))
+
+    assert engine.check(request('a', BUY, 10.0)) is None
+    assert engine.check(request('b', BUY, 10.0)) == 'open orders at limit 1'
+
+    engine.on_order_update(fill('a', BUY, 10.0))
+
+    assert engine.check(request('c', BUY, 10.0)) is None
+
+
+def test_release_frees_what_a_check_reserved():
+    engine = risk_engine.RiskEngine(risk_engine.RiskLimits(max_gross_exposure=1000.0))
+
+    assert engine.check(request('a', BUY, 10.0)) is None
+    assert engine.check(request('b', BUY, 10.0)) is not None
+
+    engine.release('a')
+
+    assert engine.Gross == 0.0
+    assert engine.snapshot()['Open Orders'] == 0
+    assert engine.check(request('c', BUY, 10.0)) is None
+
+    # Releasing an unknown or already released tag does nothing
+    engine.release('a')
+    engine.release('unknown')
+    assert engine.Gross == 1000.0
+
+
+def test_exits_pass_at_the_limit():
+    engine = risk_engine.RiskEngine(risk_engine.RiskLimits(max_gross_exposure=1000.0))
+    engine.check(request('a', BUY, 10.0))
+    engine.on_order_update(fill('a', BUY, 10.0))
+
+    assert engine.check(request('b', BUY, 1.0)) is not None
+    assert engine.check(request('c', SELL, 10.0)) is None
@@ -0,0 +1,40 @@
+import datetime
+
+import session_calendar
+import tick_timestamp
+
+
+class Tick(object):
+    def __init__(self, dt: datetime.datetime):
+        self.Epoch = tick_timestamp.to_epoch(dt)
+
+
+def test_day_change_across_a_month_boundary():
+    calendar = session_calendar.SessionCalendar(holidays=['2021-04-02'])
+    clock = calendar.clock(datetime.time(9, 30), datetime.time(15, 0))
+    changes = []
+    clock.on_day_change(lambda tick_data, session, previous: changes.append(
+        (session.Day, previous.Day if previous is not None else None)))
+
+    clock.update(Tick(datetime.datetime(2021, 3, 31, 15, 29)))
+    assert clock.InSession and not clock.InWindow
+
+    clock.update(Tick(datetime.datetime(2021, 4, 1, 9, 20)))
+    assert clock.InSession and not clock.InWindow
+
+    clock.update(Tick(datetime.datetime(2021, 4, 1, 9, 30)))
+    assert clock.InWindow
+
+    assert changes == [(datetime.date(2021, 3, 31), None), (datetime.date(2021, 4, 1), datetime.date(2021, 3, 31))]
+    assert clock.Session.Trading
+    assert not calendar.session(Tick(datetime.datetime(2021, 4, 2, 10, 0)).Epoch).Trading
+
+
+def test_trading_days_across_a_month_boundary():
+    calendar = session_calendar.SessionCalendar(holidays=[{'Date': '2021-04-02T00:00:00'}])
+
+    assert calendar.session_days(datetime.date(2021, 3, 30), datetime.date(2021, 4, 6)) == [
+        datetime.date(2021, 3, 30), datetime.date(2021, 3, 31), datetime.date(2021, 4, 1), datetime.date(2021, 4, 5),
+        datetime.date(2021, 4, 6)]
+    assert calendar.sessions_before(datetime.date(2021, 4, 5), 2) == datetime.date(2021, 3, 31)
+    assert calendar.sessions_before(datetime.date(2021, 3, 1), 1) == datetime.date(2021, 2, 26)
@@ -0,0 +1,114 @@
+import AlgorumQuantClient.algorum_types
+import order_store
+import state_journal
+
+SYMBOL = AlgorumQuantClient.algorum_types.TradeSymbol(AlgorumQuantClient.algorum_types.SymbolType.Stock, 'AAA')
+
+
+class State(object):
+    def __init__(self):
+        self.Bought = False
+        self.Counter = 0
+        self.Orders = order_store.OrderStore()
+
+
+# Engine key/value store of the client
+class DataClient(object):
+    def __init__(self):
+        self.Data = {}
+
+    def get_data(self, key: str):
+        return self.Data.get(key)
+
+    def set_data(self, key: str, value: str):
+        self.Data[key] = value
+
+
+def completed_order(index: int):
+    return AlgorumQuantClient.algorum_types.Order(
+        OrderId=str(index), Tag='tag' + str(index), Symbol=SYMBOL,
+        OrderDirection=AlgorumQuantClient.algorum_types.OrderDirection.Buy,
+        Status=AlgorumQuantClient.algorum_types.OrderStatus.Completed,
+        Quantity=10.0, FilledQuantity=10.0, AveragePrice=100.0 + index, OrderTimestamp='2021-03-01T09:30:00')
+
+
+def test_round_trip_of_snapshot_and_deltas():
+    client = DataClient()
+    journal = state_journal.StateJournal(client, compact_ratio=100.0)
+    state = State()
+
+    for index in range(5):
+        state.Counter = index
+        state.Orders.append(completed_order(index))
+        journal.save(state)
+
+    assert client.get_data('state.4') is not None
+
+    loaded = state_journal.StateJournal(client).load()
+
+    assert loaded.Counter == 4
+    assert loaded.Bought is False
+    assert [order.OrderId for order in loaded.Orders] == ['0', '1', '2', '3', '4']
+    assert [order.AveragePrice for order in loaded.Orders] == [100.0, 101.0, 102.0, 103.0, 104.0]
+
+
+def test_delta_carries_only_changed_fields_and_new_orders():
+    client = DataClient()
+    journal = state_journal.StateJournal(client, compact_ratio=100.0)
+    state = State()
+    journal.save(state)
+
+    state.Counter = 1
+    state.Orders.append(completed_order(1))
+    journal.save(state)
+
+    delta = state_journal.jsonpickle.decode(client.get_data('state.1'))
+
+    assert list(delta['Fields']) == ['Counter']
+    assert len(delta['Orders']) == 1
+
+    # Nothing changed, nothing written
+    journal.save(state)
+    assert client.get_data('state.2') is None
+
+
+def test_compaction_starts_a_new_generation():
+    client = DataClient()
+    journal = state_journal.StateJournal(client, compact_ratio=100.0, max_deltas=2)
+    state = State()
+
+    # Snapshot, two deltas, then a fresh snapshot and a delta of the new generation
+    for index in range(5):
+        state.Counter = index
+        journal.save(state)
+
+    assert journal.Seq == 1
+
+    # The second delta of the first generation is still stored but must not be replayed
+    assert client.get_data('state.2') is not None
+    loaded_journal = state_journal.StateJournal(client)
+    loaded = loaded_journal.load()
+
+    assert loaded.Counter == 4
+    assert loaded_journal.Seq == 1
+
+
+def test_deltas_outgrowing_the_snapshot_compact():
+    client = DataClient()
+    journal = state_journal.StateJournal(client, compact_ratio=1.0)
+    state = State()
+    journal.save(state)
+    first_id = journal.JournalId
+
+    for index in range(20):
+        state.Counter = index
+        state.Orders.append(completed_order(index))
+        journal.save(state)
+
+    assert journal.JournalId != first_id
+
+    loaded = state_journal.StateJournal(client).load()
+
+    assert loaded.Counter == 19
+    assert len(loaded.Orders) == 20
+
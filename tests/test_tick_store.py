@@ -0,0 +1,81 @@
+import datetime
+
+import numpy
+
+import AlgorumQuantClient.algorum_types
+import tick_store
+import tick_timestamp
+
+DAY = datetime.date(2021, 3, 1)
+AAA = AlgorumQuantClient.algorum_types.TradeSymbol(AlgorumQuantClient.algorum_types.SymbolType.Stock, 'AAA')
+BBB = AlgorumQuantClient.algorum_types.TradeSymbol(AlgorumQuantClient.algorum_types.SymbolType.Stock, 'BBB')
+
+
+def rows(day: datetime.date, seconds, ltp: float):
+    start = tick_store.day_epoch(day)
+    return numpy.array([(start + second, ltp, 1.0, 0.0, 0.0, 0.0) for second in seconds], dtype=tick_store.TICK_DTYPE)
+
+
+def test_one_symbol_with_data_keeps_its_labels(tmp_path):
+    store = tick_store.TickStore(str(tmp_path))
+    store.write_day(BBB, DAY, rows(DAY, range(34200, 34260, 10), 200.0))
+
+    ticks = store.ticks([AAA, BBB])
+
+    assert len(ticks) == 6
+    assert [tick_data.Symbol.Ticker for tick_data in ticks] == ['BBB'] * 6
+    assert ticks[0].Symbol.Ticker == 'BBB'
+
+
+def test_symbols_are_merged_in_time_order(tmp_path):
+    store = tick_store.TickStore(str(tmp_path))
+    store.write_day(AAA, DAY, rows(DAY, range(34200, 34260, 20), 100.0))
+    store.write_day(BBB, DAY, rows(DAY, range(34210, 34270, 20), 200.0))
+
+    ticks = list(store.ticks([AAA, BBB]))
+
+    assert [tick_data.Epoch for tick_data in ticks] == sorted(tick_data.Epoch for tick_data in ticks)
+    assert [tick_data.Symbol.Ticker for tick_data in ticks] == ['AAA', 'BBB'] * 3
+    assert [tick_data.LTP for tick_data in ticks] == [100.0, 200.0] * 3
+
+
+def test_range_within_a_day(tmp_path):
+    store = tick_store.TickStore(str(tmp_path))
+    store.write_day(AAA, DAY, rows(DAY, range(34200, 36000, 60), 100.0))
+    start = datetime.datetime(2021, 3, 1, 9, 35)
+    end = datetime.datetime(2021, 3, 1, 9, 40)
+
+    ticks = store.ticks(AAA, start, end)
+
+    assert [tick_data.DateTime.minute for tick_data in ticks] == [35, 36, 37, 38, 39, 40]
+    assert ticks[0].Epoch == tick_timestamp.to_epoch(start)
+
+
+def write_csv(path, seconds, ltp: float):
+    with open(path, 'w') as f:
+        f.write('Timestamp,LTP\n')
+
+        for second in seconds:
+            f.write('2021-03-01T%02d:%02d:%02d,%s\n' % (second // 3600, second // 60 % 60, second % 60, ltp))
+
+
+def test_importing_a_file_again_adds_nothing(tmp_path):
+    store = tick_store.TickStore(str(tmp_path / 'store'))
+    csv_path = str(tmp_path / 'ticks.csv')
+    write_csv(csv_path, range(34200, 34800, 5), 100.0)
+
+    assert store.import_csv(csv_path, AAA, chunk_size=7) == 120
+    assert store.import_csv(csv_path, AAA, chunk_size=7) == 0
+    assert len(store.day(AAA, DAY)) == 120
+
+
+def test_import_adds_ticks_outside_the_stored_range(tmp_path):
+    store = tick_store.TickStore(str(tmp_path / 'store'))
+    first_path = str(tmp_path / 'first.csv')
+    second_path = str(tmp_path / 'second.csv')
+    write_csv(first_path, range(34200, 34500, 10), 100.0)
+    write_csv(second_path, range(34400, 34800, 10), 200.0)
+    store.import_csv(first_path, AAA)
+
+    assert store.import_csv(second_path, AAA) == 30
+    assert list(store.day(AAA, DAY)['Epoch']) == list(tick_store.day_epoch(DAY) + numpy.arange(34200, 34800, 10))